@@ -141,6 +141,15 @@ class AdminClient:
         self.print_response(response, "Создание цены")
         return response.status_code == 200
     
+    def batch(self, operations):
+        """Пакетные операции: одна транзакция и один запрос на весь список"""
+        response = self.session.post(
+            f"{BASE_URL}/api/v1/batch",
+            json={"operations": operations},
+            headers=self.get_headers()
+        )
+        return response
+    
     def get_bookings(self):
         """Получение броней администратором"""
         print(f"\nПолучаем все брони")
@@ -0,0 +1,31 @@
+"""add seance start time indexes
+
+Revision ID: 11830b6e5d8e
+Revises: 1221549077ac
+Create Date: 2026-10-19 13:00:16.482414
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '11830b6e5d8e'
+down_revision: Union[str, Sequence[str], None] = '1221549077ac'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # расписание по диапазону дат и проверка пересечений сеансов в зале
+    op.create_index(op.f('ix_seances_start_time'), 'seances', ['start_time'], unique=False)
+    op.create_index('ix_seances_hall_id_start_time', 'seances', ['hall_id', 'start_time'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_seances_hall_id_start_time', table_name='seances')
+    op.drop_index(op.f('ix_seances_start_time'), table_name='seances')
@@ -0,0 +1,31 @@
+"""add token indexes
+
+Revision ID: 1221549077ac
+Revises: 87fafb031fd4
+Create Date: 2026-10-19 12:53:55.747988
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1221549077ac'
+down_revision: Union[str, Sequence[str], None] = '87fafb031fd4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # очистка просроченных токенов и поиск последнего токена пользователя при входе
+    op.create_index(op.f('ix_tokens_creation_time'), 'tokens', ['creation_time'], unique=False)
+    op.create_index('ix_tokens_user_id_creation_time', 'tokens', ['user_id', 'creation_time'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tokens_user_id_creation_time', table_name='tokens')
+    op.drop_index(op.f('ix_tokens_creation_time'), table_name='tokens')
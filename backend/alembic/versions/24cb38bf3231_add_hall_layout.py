@@ -0,0 +1,30 @@
+"""add hall layout
+
+Revision ID: 24cb38bf3231
+Revises: 9c8453db959a
+Create Date: 2026-10-19 13:11:51.429068
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '24cb38bf3231'
+down_revision: Union[str, Sequence[str], None] = '9c8453db959a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('halls', sa.Column('layout', sa.Text(), nullable=True))
+    op.add_column('halls', sa.Column('layout_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('halls', 'layout_version')
+    op.drop_column('halls', 'layout')
@@ -0,0 +1,48 @@
+"""add ticket events outbox
+
+Revision ID: 91410bbd6347
+Revises: 11830b6e5d8e
+Create Date: 2026-10-19 13:06:31.125080
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '91410bbd6347'
+down_revision: Union[str, Sequence[str], None] = '11830b6e5d8e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('ticket_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('ticket_id', sa.Integer(), nullable=False),
+        sa.Column('event_type', sa.String(length=50), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('available_at', sa.DateTime(), nullable=False),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(['ticket_id'], ['tickets.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_ticket_events_ticket_id'), 'ticket_events', ['ticket_id'], unique=False)
+    op.create_index(op.f('ix_ticket_events_processed_at'), 'ticket_events', ['processed_at'], unique=False)
+    # очередь необработанных событий: частичный индекс остаётся маленьким
+    op.create_index('ix_ticket_events_pending', 'ticket_events', ['available_at'], unique=False,
+                    postgresql_where=sa.text('processed_at IS NULL'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_ticket_events_pending', table_name='ticket_events')
+    op.drop_index(op.f('ix_ticket_events_processed_at'), table_name='ticket_events')
+    op.drop_index(op.f('ix_ticket_events_ticket_id'), table_name='ticket_events')
+    op.drop_table('ticket_events')
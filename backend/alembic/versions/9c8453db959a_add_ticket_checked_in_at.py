@@ -0,0 +1,28 @@
+"""add ticket checked_in_at
+
+Revision ID: 9c8453db959a
+Revises: 91410bbd6347
+Create Date: 2026-10-19 13:10:16.274938
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c8453db959a'
+down_revision: Union[str, Sequence[str], None] = '91410bbd6347'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('tickets', sa.Column('checked_in_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('tickets', 'checked_in_at')
@@ -0,0 +1,210 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict
+
+from fastapi.responses import JSONResponse
+
+from . import config
+from .logger import get_logger
+
+logger = get_logger('admission')
+
+BOOKING_PATH = '/api/v1/ticket/booking'
+
+
+# Хранилище token bucket'ов. take() списывает токен и возвращает 0,
+# если запрос пропущен, иначе — через сколько секунд появится следующий токен.
+class RateLimitBackend:
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        raise NotImplementedError
+
+
+class LocalRateLimitBackend(RateLimitBackend):
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        # key -> [токены, время обновления, скорость пополнения, ёмкость]; порядок — от давно не
+        # использованных к недавним, при переполнении вытесняются самые старые корзины
+        self._buckets: OrderedDict[str, list[float]] = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            while len(self._buckets) >= self.max_keys:
+                self._buckets.popitem(last=False)
+            bucket = self._buckets[key] = [float(burst), now, rate, burst]
+        else:
+            self._buckets.move_to_end(key)
+        tokens = min(float(burst), bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return 0
+        bucket[0] = tokens
+        return (1 - tokens) / rate
+
+
+class RateRule:
+    __slots__ = ('name', 'rate', 'burst')
+
+    def __init__(self, name: str, rate: float, burst: int):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0 and self.burst > 0
+
+
+# Ограничение одновременных бронирований размером пула: лишние запросы сразу получают 503,
+# а в режиме зала ожидания ждут свободного слота в очереди ограниченной длины
+class ConcurrencyLimiter:
+    def __init__(self, limit: int, queue_size: int = 0, timeout_sec: float = 5):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout_sec = timeout_sec
+        self._semaphore = asyncio.Semaphore(limit)
+        self.active = 0
+        self.waiting = 0
+        self.peak_active = 0
+        self.queued = 0
+        self.timeouts = 0
+
+    async def acquire(self) -> bool:
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+        else:
+            if self.waiting >= self.queue_size:
+                return False
+            self.waiting += 1
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.timeout_sec)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                return False
+            finally:
+                self.waiting -= 1
+        self.active += 1
+        self.peak_active = max(self.peak_active, self.active)
+        return True
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+
+class Admission:
+    def __init__(self, backend: RateLimitBackend, default_rule: RateRule, booking_rule: RateRule, user_rule: RateRule, booking_limiter: ConcurrencyLimiter):
+        self.backend = backend
+        self.default_rule = default_rule
+        self.booking_rule = booking_rule
+        self.user_rule = user_rule
+        self.booking_limiter = booking_limiter
+        self.counters = {'allowed': 0, 'rate_limited': 0, 'booking_rate_limited': 0, 'booking_rejected': 0, 'user_rate_limited': 0}
+
+    async def check_rate(self, rule: RateRule, client: str) -> float:
+        if not rule.enabled:
+            return 0
+        try:
+            return await self.backend.take(f'{rule.name}:{client}', rule.rate, rule.burst)
+        except Exception as e:
+            # Недоступное хранилище лимитов не должно останавливать продажи
+            logger.warning('Не удалось проверить лимит запросов', extra={'fields': {'rule': rule.name, 'error': str(e)}})
+            return 0
+
+    @property
+    def stats(self) -> dict:
+        limiter = self.booking_limiter
+        return {
+            **self.counters,
+            'booking_active': limiter.active,
+            'booking_waiting': limiter.waiting,
+            'booking_peak_active': limiter.peak_active,
+            'booking_queued': limiter.queued,
+            'booking_queue_timeouts': limiter.timeouts,
+            'booking_limit': limiter.limit,
+            'waiting_room_size': limiter.queue_size,
+        }
+
+
+def client_key(scope) -> str:
+    # До проверки токена клиент известен только по IP: заголовок X-Token клиент выбирает сам,
+    # и ключ по нему позволял обходить лимиты, присылая каждый раз новый токен.
+    # Лимит по пользователю применяется после проверки токена (dependancy.get_token)
+    forwarded = None
+    for name, value in scope['headers']:
+        if name == b'x-forwarded-for':
+            forwarded = value.decode('latin-1')
+    if forwarded and config.TRUST_FORWARDED_FOR:
+        return 'ip:' + forwarded.split(',')[0].strip()
+    client = scope.get('client')
+    return 'ip:' + (client[0] if client else 'unknown')
+
+
+def reject(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={'detail': detail},
+        headers={'Retry-After': str(max(1, math.ceil(retry_after)))},
+    )
+
+
+# Контроль входа перед обработчиками API: лимиты на клиента и ограничение одновременных бронирований.
+# Отказ отдаётся сразу (429/503 с Retry-After), а не ожиданием соединения из пула.
+class AdmissionMiddleware:
+    def __init__(self, app, control: Admission | None = None):
+        self.app = app
+        self.control = control or admission
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get('path', '') if scope['type'] == 'http' else ''
+        if not path.startswith('/api/'):
+            await self.app(scope, receive, send)
+            return
+
+        control = self.control
+        client = client_key(scope)
+        retry_after = await control.check_rate(control.default_rule, client)
+        if retry_after:
+            control.counters['rate_limited'] += 1
+            await reject(429, 'Too many requests', retry_after)(scope, receive, send)
+            return
+
+        if scope['method'] != 'POST' or path != BOOKING_PATH:
+            control.counters['allowed'] += 1
+            await self.app(scope, receive, send)
+            return
+
+        retry_after = await control.check_rate(control.booking_rule, client)
+        if retry_after:
+            control.counters['booking_rate_limited'] += 1
+            await reject(429, 'Too many booking attempts', retry_after)(scope, receive, send)
+            return
+
+        limiter = control.booking_limiter
+        if not await limiter.acquire():
+            control.counters['booking_rejected'] += 1
+            await reject(503, 'Booking is busy, please retry', limiter.timeout_sec if limiter.queue_size else 1)(scope, receive, send)
+            return
+        control.counters['allowed'] += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+
+
+# Общее для воркеров хранилище подключается здесь, реализовав RateLimitBackend
+def create_backend() -> RateLimitBackend:
+    return LocalRateLimitBackend()
+
+
+admission = Admission(
+    backend=create_backend(),
+    default_rule=RateRule('api', config.RATE_LIMIT_PER_SEC, config.RATE_LIMIT_BURST),
+    booking_rule=RateRule('booking', config.BOOKING_RATE_LIMIT_PER_SEC, config.BOOKING_RATE_LIMIT_BURST),
+    user_rule=RateRule('user', config.RATE_LIMIT_PER_SEC, config.RATE_LIMIT_BURST),
+    booking_limiter=ConcurrencyLimiter(config.BOOKING_CONCURRENCY, config.WAITING_ROOM_SIZE, config.WAITING_ROOM_TIMEOUT_SEC),
+)
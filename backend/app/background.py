@@ -0,0 +1,52 @@
+import asyncio
+import os
+
+from .logger import get_logger
+
+logger = get_logger('background')
+
+
+# Периодические фоновые задачи процесса (запускаются и останавливаются в lifespan).
+# wakeup позволяет запустить задачу раньше, не дожидаясь конца интервала.
+async def run_periodic(name: str, interval_sec: float, job, wakeup: asyncio.Event | None = None):
+    while True:
+        try:
+            await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.warning('Фоновая задача завершилась с ошибкой', exc_info=True, extra={'fields': {'task': name}})
+        if wakeup is None:
+            await asyncio.sleep(interval_sec)
+            continue
+        try:
+            await asyncio.wait_for(wakeup.wait(), timeout=interval_sec)
+        except asyncio.TimeoutError:
+            pass
+        wakeup.clear()
+
+
+# Номер воркера выставляет gunicorn.conf.py после fork; без gunicorn процесс один и он нулевой
+def worker_id() -> int:
+    return int(os.getenv('WORKER_ID', '0'))
+
+
+def is_primary_worker() -> bool:
+    return worker_id() == 0
+
+
+class BackgroundTasks:
+    def __init__(self):
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self, name: str, interval_sec: float, job, wakeup: asyncio.Event | None = None):
+        self._tasks.append(asyncio.create_task(run_periodic(name, interval_sec, job, wakeup), name=name))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+
+background_tasks = BackgroundTasks()
@@ -0,0 +1,176 @@
+from datetime import timedelta
+from itertools import groupby
+from fastapi import HTTPException
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import select, insert, update, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .schema import (BatchOperation, CreateHallRequest, UpdateHallRequest, CreateSeatRequest, UpdateSeatRequest,
+                     CreateFilmRequest, UpdateFilmRequest, CreateSeanceRequest, UpdateSeanceRequest,
+                     CreatePriceRequest, UpdatePriceRequest)
+from .scheduling import normalize_datetime, ensure_no_overlapping_seances, find_overlaps
+from .pricing import pricing
+from .hall_layout import bump_layout_version
+from .schedule import schedule_cache
+from .singleflight import hot_reads
+from .deletion import delete_cascade
+
+
+ENTITIES: dict[str, tuple[type[models.Base], type[BaseModel], type[BaseModel]]] = {
+    'hall': (models.Hall, CreateHallRequest, UpdateHallRequest),
+    'seat': (models.Seat, CreateSeatRequest, UpdateSeatRequest),
+    'film': (models.Film, CreateFilmRequest, UpdateFilmRequest),
+    'seance': (models.Seance, CreateSeanceRequest, UpdateSeanceRequest),
+    'price': (models.Price, CreatePriceRequest, UpdatePriceRequest),
+}
+
+STATUS = {'create': 'created', 'update': 'updated', 'delete': 'deleted'}
+
+
+class BatchError(HTTPException):
+    def __init__(self, status_code: int, index: int, detail: str):
+        super().__init__(status_code, {'index': index, 'error': detail})
+
+
+def validate_operations(operations: list[BatchOperation]) -> list[dict]:
+    # Проверяем все операции до первого обращения к БД
+    payloads = []
+    for index, operation in enumerate(operations):
+        _, create_schema, update_schema = ENTITIES[operation.entity]
+        if operation.op != 'create' and operation.id is None:
+            raise BatchError(400, index, 'id is required')
+        if operation.op == 'delete':
+            payloads.append({})
+            continue
+        schema = create_schema if operation.op == 'create' else update_schema
+        try:
+            payload = schema.model_validate(operation.data or {}).model_dump(exclude_unset=True)
+        except ValidationError as err:
+            raise BatchError(400, index, str(err))
+        if 'start_time' in payload:
+            payload['start_time'] = normalize_datetime(payload['start_time'])
+        if 'grid' in payload:
+            # Схема зала выводит места отдельным запросом: PUT /api/v1/hall/{hall_id}/layout
+            raise BatchError(400, index, 'grid is not supported in batch')
+        payloads.append(payload)
+    return payloads
+
+
+async def ensure_ids_exist(session: AsyncSession, orm_cls, run: list[tuple[int, BatchOperation, dict]]):
+    ids = {operation.id for _, operation, _ in run}
+    result = await session.execute(select(orm_cls.id).where(orm_cls.id.in_(ids)))
+    found = set(result.scalars().all())
+    for index, operation, _ in run:
+        if operation.id not in found:
+            raise BatchError(404, index, 'Item not found')
+
+
+async def check_seances(session: AsyncSession, run: list[tuple[int, dict, int | None]]):
+    # run: (index, итоговые поля сеанса, id обновляемого сеанса)
+    film_ids = {fields['film_id'] for _, fields, _ in run}
+    result = await session.execute(select(models.Film.id, models.Film.duration).where(models.Film.id.in_(film_ids)))
+    durations = dict(result.all())
+
+    intervals = []
+    for index, fields, seance_id in run:
+        duration = durations.get(fields['film_id'])
+        if duration is None:
+            raise BatchError(404, index, 'Film not found')
+        try:
+            await ensure_no_overlapping_seances(
+                session=session,
+                hall_id=fields['hall_id'],
+                start_time=fields['start_time'],
+                duration_minutes=duration,
+                exclude_seance_id=seance_id,
+            )
+        except HTTPException as err:
+            raise BatchError(err.status_code, index, err.detail)
+        start = normalize_datetime(fields['start_time'])
+        intervals.append((fields['hall_id'], start, start + timedelta(minutes=duration), index))
+
+    # Пересечения между сеансами внутри одного пакета
+    for previous, current in find_overlaps(intervals)[:1]:
+        raise BatchError(400, current[3], f'Сеанс пересекается с сеансом из операции {previous[3]}')
+
+
+async def run_create(session: AsyncSession, orm_cls, run) -> list[int]:
+    if orm_cls is models.Seance:
+        await check_seances(session, [(index, payload, None) for index, _, payload in run])
+    result = await session.execute(
+        insert(orm_cls).returning(orm_cls.id, sort_by_parameter_order=True),
+        [payload for _, _, payload in run],
+    )
+    return list(result.scalars().all())
+
+
+async def run_update(session: AsyncSession, orm_cls, run) -> list[int]:
+    await ensure_ids_exist(session, orm_cls, run)
+    if orm_cls is models.Seance:
+        ids = [operation.id for _, operation, _ in run]
+        result = await session.execute(
+            select(models.Seance.id, models.Seance.hall_id, models.Seance.film_id, models.Seance.start_time)
+            .where(models.Seance.id.in_(ids))
+        )
+        current = {row.id: row._asdict() for row in result.all()}
+        await check_seances(
+            session,
+            [(index, {**current[operation.id], **payload}, operation.id) for index, operation, payload in run],
+        )
+    rows = [{'id': operation.id, **payload} for _, operation, payload in run if payload]
+    if rows:
+        # ORM bulk UPDATE по первичному ключу: один executemany на набор одинаковых полей
+        await session.execute(update(orm_cls), rows)
+    return [operation.id for _, operation, _ in run]
+
+
+async def run_delete(session: AsyncSession, orm_cls, run) -> list[int]:
+    await ensure_ids_exist(session, orm_cls, run)
+    ids = [operation.id for _, operation, _ in run]
+    if orm_cls in (models.Hall, models.Film, models.Seance):
+        # Зависимые строки удаляются так же, как в одиночных DELETE, — одним набором запросов на группу
+        try:
+            await delete_cascade(session, orm_cls, ids)
+        except HTTPException as err:
+            raise BatchError(err.status_code, run[0][0], err.detail)
+    else:
+        await session.execute(delete(orm_cls).where(orm_cls.id.in_(ids)))
+    return ids
+
+
+RUNNERS = {'create': run_create, 'update': run_update, 'delete': run_delete}
+
+
+async def execute_batch(session: AsyncSession, operations: list[BatchOperation]) -> list[dict]:
+    payloads = validate_operations(operations)
+    items = list(zip(range(len(operations)), operations, payloads))
+    results = []
+    try:
+        # Подряд идущие операции одного типа выполняются одним запросом
+        for (op, entity), group in groupby(items, key=lambda item: (item[1].op, item[1].entity)):
+            run = list(group)
+            orm_cls = ENTITIES[entity][0]
+            try:
+                ids = await RUNNERS[op](session, orm_cls, run)
+            except IntegrityError as err:
+                raise BatchError(409, run[0][0], f'Conflict: {err.orig}')
+            for (index, _, _), item_id in zip(run, ids):
+                results.append({'index': index, 'op': op, 'entity': entity, 'id': item_id, 'status': STATUS[op]})
+        # Места могли поменяться в любых залах: сбрасываем версии схем всех залов
+        if any(operation.entity in ('seat', 'hall') for operation in operations):
+            await bump_layout_version(session)
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+
+    # Кэш цен зависит от цен, сеансов и мест
+    if any(operation.entity != 'film' for operation in operations):
+        pricing.invalidate()
+    # Расписание показывает сеансы с названиями фильмов и залов
+    if any(operation.entity in ('seance', 'film', 'hall') for operation in operations):
+        schedule_cache.invalidate()
+        hot_reads.clear()
+    return results
@@ -0,0 +1,125 @@
+import time
+
+from . import config
+from .background import worker_id
+
+# Код брони в духе Snowflake: миллисекунды от эпохи сервиса, номер воркера и счётчик внутри
+# миллисекунды. Коды разных воркеров не пересекаются по построению, поэтому ни проверки в БД,
+# ни повторов при конфликте уникального индекса не нужно.
+#
+#   41 бит — миллисекунды с EPOCH_MS (хватит на ~69 лет)
+#   10 бит — воркер: 5 бит узла (BOOKING_CODE_NODE_ID) + 5 бит воркера gunicorn
+#   12 бит — счётчик (4096 кодов в миллисекунду на воркер)
+#
+# 63 бита кодируются 13 символами Crockford base32 и одним контрольным символом (Luhn mod 32).
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+# Crockford: при вводе путают I/L с единицей и O с нулём
+DECODE = {char: value for value, char in enumerate(ALPHABET)} | {'I': 1, 'L': 1, 'O': 0}
+
+EPOCH_MS = 1735689600000  # 2025-01-01T00:00:00Z
+NODE_BITS = 5
+WORKER_BITS = 5
+SEQUENCE_BITS = 12
+BODY_LENGTH = 13
+CODE_LENGTH = BODY_LENGTH + 1
+
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+
+def _luhn_addend(value: int, factor: int) -> int:
+    addend = factor * value
+    return addend // 32 + addend % 32
+
+
+def check_symbol(body: str) -> str:
+    # Luhn mod N: ловит любую замену одного символа и большинство перестановок соседних
+    total = 0
+    factor = 2
+    for char in reversed(body):
+        total += _luhn_addend(DECODE[char], factor)
+        factor = 1 if factor == 2 else 2
+    return ALPHABET[-total % 32]
+
+
+# Таблицы на пары символов (10 бит): кодирование и контрольная сумма за 7 шагов вместо 13
+PAIRS = [ALPHABET[pair >> 5] + ALPHABET[pair & 31] for pair in range(1024)]
+PAIR_CHECKSUM = [_luhn_addend(pair & 31, 2) + _luhn_addend(pair >> 5, 1) for pair in range(1024)]
+PAIR_SHIFTS = (60, 50, 40, 30, 20, 10, 0)
+
+
+def encode(value: int) -> str:
+    pairs = [(value >> shift) & 1023 for shift in PAIR_SHIFTS]
+    # Старшая пара содержит один значащий символ
+    body = ''.join([PAIRS[pair] for pair in pairs])[1:]
+    return body + ALPHABET[-sum([PAIR_CHECKSUM[pair] for pair in pairs]) % 32]
+
+
+def normalize(code: str) -> str:
+    return code.strip().upper().replace('-', '')
+
+
+def is_valid(code: str) -> bool:
+    code = normalize(code)
+    if len(code) != CODE_LENGTH or any(char not in DECODE for char in code):
+        return False
+    body = ''.join(ALPHABET[DECODE[char]] for char in code[:-1])
+    return check_symbol(body) == ALPHABET[DECODE[code[-1]]]
+
+
+def decode(code: str) -> dict:
+    code = normalize(code)
+    value = 0
+    for char in code[:BODY_LENGTH]:
+        value = (value << 5) | DECODE[char]
+    return {
+        'timestamp_ms': (value >> (NODE_BITS + WORKER_BITS + SEQUENCE_BITS)) + EPOCH_MS,
+        'node_id': (value >> (WORKER_BITS + SEQUENCE_BITS)) & ((1 << NODE_BITS) - 1),
+        'worker_id': (value >> SEQUENCE_BITS) & ((1 << WORKER_BITS) - 1),
+        'sequence': value & MAX_SEQUENCE,
+    }
+
+
+class BookingCodeGenerator:
+    # Вызывается только из event loop процесса, между чтением и записью состояния нет await —
+    # блокировка не нужна. Номер воркера читается при первом коде: при preload генератор
+    # создаётся в мастере gunicorn, а WORKER_ID появляется уже после fork.
+    # Состояние не переживает перезапуск: воркер, занявший слот предшественника, начинает
+    # счётчик заново. Коды не повторятся, пока часы не отведены назад дальше момента последнего
+    # кода предшественника — время перезапуска (секунды) покрывает обычную подстройку NTP,
+    # но ручной перевод часов назад на работающем узле может дать дубль (его отклонит
+    # уникальный индекс tickets.booking_code).
+    def __init__(self, node_id: int, worker: int | None = None, clock=time.time):
+        if not 0 <= node_id < 1 << NODE_BITS:
+            raise ValueError(f'node_id must be in [0, {(1 << NODE_BITS) - 1}]')
+        self.node_id = node_id
+        self.worker = worker
+        self.clock = clock
+        self._prefix = None
+        self._last_ms = -1
+        self._sequence = 0
+
+    def _worker_prefix(self) -> int:
+        worker = worker_id() if self.worker is None else self.worker
+        if not 0 <= worker < 1 << WORKER_BITS:
+            raise ValueError(f'worker id must be in [0, {(1 << WORKER_BITS) - 1}]')
+        return ((self.node_id << WORKER_BITS) | worker) << SEQUENCE_BITS
+
+    def next(self) -> str:
+        if self._prefix is None:
+            self._prefix = self._worker_prefix()
+        now_ms = int(self.clock() * 1000) - EPOCH_MS
+        if now_ms > self._last_ms:
+            self._last_ms = now_ms
+            self._sequence = 0
+        elif self._sequence < MAX_SEQUENCE:
+            # Та же миллисекунда или часы ушли назад: продолжаем счётчик последней
+            self._sequence += 1
+        else:
+            # Счётчик исчерпан: берём следующую миллисекунду вперёд, а не ждём часов
+            self._last_ms += 1
+            self._sequence = 0
+        return encode((self._last_ms << (NODE_BITS + WORKER_BITS + SEQUENCE_BITS)) | self._prefix | self._sequence)
+
+
+booking_codes = BookingCodeGenerator(node_id=config.BOOKING_CODE_NODE_ID)
@@ -0,0 +1,170 @@
+import asyncio
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import config
+from . import models
+from .booking_code import CODE_LENGTH, is_valid, normalize
+from .logger import get_logger
+
+logger = get_logger('checkin')
+
+# Текст QR-кода билета: 'Booking_code: ..., Seance_id: ..., Seat_id: ...'
+QR_CODE_RE = re.compile(r'Booking_code:\s*([^,\s]+)')
+
+
+def extract_code(scanned: str) -> str:
+    # Сканер может передать как сам код, так и весь текст QR
+    match = QR_CODE_RE.search(scanned)
+    return normalize(match.group(1) if match else scanned)
+
+
+def is_plausible(code: str) -> bool:
+    # Новые коды проверяются контрольным символом без обращения к БД; старые форматы — только по БД
+    return len(code) != CODE_LENGTH or is_valid(code)
+
+
+def ticket_query():
+    return (
+        select(
+            models.Ticket.id,
+            models.Ticket.booking_code,
+            models.Ticket.seance_id,
+            models.Ticket.seat_id,
+            models.Seat.row_number,
+            models.Seat.seat_number,
+            models.Seat.seat_type,
+            models.Ticket.user_name,
+            models.Ticket.booked,
+            models.Ticket.archived,
+            models.Ticket.checked_in_at,
+        )
+        .join(models.Seat, models.Seat.id == models.Ticket.seat_id)
+    )
+
+
+def ticket_entry(row) -> dict:
+    return {
+        'id': row['id'],
+        'booking_code': row['booking_code'],
+        'seance_id': row['seance_id'],
+        'seat_id': row['seat_id'],
+        'row_number': row['row_number'],
+        'seat_number': row['seat_number'],
+        'seat_type': row['seat_type'],
+        'user_name': row['user_name'],
+        'booked': row['booked'],
+        'archived': row['archived'],
+        'checked_in_at': row['checked_in_at'],
+    }
+
+
+async def load_ticket_by_code(session: AsyncSession, code: str) -> dict | None:
+    # Уникальный индекс ix_tickets_booking_code
+    result = await session.execute(ticket_query().where(models.Ticket.booking_code == code))
+    row = result.mappings().first()
+    return ticket_entry(row) if row is not None else None
+
+
+# Билеты ближайших сеансов держим в памяти: сканы на входе проверяются без запросов к БД,
+# а отметки о проходе пишутся пачками (один UPDATE на всех, кто пришёл за CHECKIN_FLUSH_MS).
+# Решение о проходе принимает UPDATE ... WHERE checked_in_at IS NULL, поэтому один билет
+# не пройдёт дважды и через разные воркеры.
+class CheckInCache:
+    def __init__(self, preload_sec: float, late_sec: float, flush_ms: float):
+        self.preload_sec = preload_sec
+        self.late_sec = late_sec
+        self.flush_ms = flush_ms
+        self._tickets: dict[str, dict] = {}
+        self._seance_ids: set[int] = set()
+        self._pending: dict[int, list[asyncio.Future]] = {}
+        self._flush_task: asyncio.Task | None = None
+
+    async def refresh(self):
+        now = datetime.utcnow()
+        async with models.Session() as session:
+            seances = select(models.Seance.id).where(
+                models.Seance.start_time >= now - timedelta(seconds=self.late_sec),
+                models.Seance.start_time <= now + timedelta(seconds=self.preload_sec),
+            )
+            result = await session.execute(ticket_query().where(models.Ticket.seance_id.in_(seances)))
+            tickets = {row['booking_code']: ticket_entry(row) for row in result.mappings()}
+        # Отметки, сделанные этим воркером после начала загрузки, не теряем
+        for code, entry in tickets.items():
+            cached = self._tickets.get(code)
+            if cached is not None and cached['checked_in_at'] and not entry['checked_in_at']:
+                entry['checked_in_at'] = cached['checked_in_at']
+        self._tickets = tickets
+        self._seance_ids = {entry['seance_id'] for entry in tickets.values()}
+
+    async def lookup(self, session: AsyncSession, code: str) -> dict | None:
+        entry = self._tickets.get(code)
+        if entry is not None:
+            return entry
+        if not is_plausible(code):
+            return None
+        entry = await load_ticket_by_code(session, code)
+        if entry is not None and entry['seance_id'] in self._seance_ids:
+            # Билет куплен после загрузки кэша
+            self._tickets[code] = entry
+        return entry
+
+    def update(self, code: str, **fields):
+        entry = self._tickets.get(code)
+        if entry is not None:
+            entry.update(fields)
+
+    def discard(self, code: str):
+        self._tickets.pop(code, None)
+
+    async def check_in(self, ticket_id: int) -> datetime | None:
+        # Возвращает время прохода или None, если билет уже отмечен или недействителен
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(ticket_id, []).append(future)
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+        return await future
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_ms / 1000)
+        pending, self._pending = self._pending, {}
+        self._flush_task = None
+        try:
+            checked_in_at = datetime.utcnow()
+            async with models.Session() as session:
+                result = await session.execute(
+                    update(models.Ticket)
+                    .where(
+                        models.Ticket.id.in_(list(pending)),
+                        models.Ticket.checked_in_at.is_(None),
+                        models.Ticket.booked == True,
+                        models.Ticket.archived == False,
+                    )
+                    .values(checked_in_at=checked_in_at)
+                    .returning(models.Ticket.id)
+                    .execution_options(synchronize_session=False)
+                )
+                accepted = set(result.scalars().all())
+                await session.commit()
+        except Exception as err:
+            logger.warning('Не удалось записать отметки о проходе', exc_info=True, extra={'fields': {'tickets': len(pending)}})
+            for futures in pending.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(err)
+            return
+        for ticket_id, futures in pending.items():
+            # Повторный скан того же билета в одной пачке проходит только один раз
+            for index, future in enumerate(futures):
+                if not future.done():
+                    future.set_result(checked_in_at if ticket_id in accepted and index == 0 else None)
+
+
+checkins = CheckInCache(
+    preload_sec=config.CHECKIN_PRELOAD_SEC,
+    late_sec=config.CHECKIN_LATE_SEC,
+    flush_ms=config.CHECKIN_FLUSH_MS,
+)
@@ -1,4 +1,5 @@
 import os
+from pathlib import Path
 
 POSTGRES_DB = os.getenv('POSTGRES_DB', 'cinema')
 POSTGRES_HOST = os.getenv('POSTGRES_HOST', 'localhost')
@@ -8,4 +9,122 @@ POSTGRES_PASSWORD = os.getenv('POSTGRES_PASSWORD', 'password')
 
 PG_DSN = f'postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}'
 
-TOKEN_TTL_SEC = 60 * 60 * 72
\ No newline at end of file
+TOKEN_TTL_SEC = 60 * 60 * 72
+# Вход в течение этого времени после предыдущего возвращает тот же токен
+TOKEN_REUSE_SEC = int(os.getenv('TOKEN_REUSE_SEC', str(60 * 60)))
+MAX_TOKENS_PER_USER = int(os.getenv('MAX_TOKENS_PER_USER', '10'))
+# Фоновая очистка просроченных токенов
+TOKEN_PURGE_INTERVAL_SEC = float(os.getenv('TOKEN_PURGE_INTERVAL_SEC', '3600'))
+TOKEN_PURGE_BATCH = int(os.getenv('TOKEN_PURGE_BATCH', '5000'))
+
+# Число воркеров (gunicorn.conf.py выставляет его до импорта приложения)
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+
+# Живые обновления схемы зала: 'local' (один процесс) или 'postgres' (LISTEN/NOTIFY между воркерами).
+# При нескольких воркерах 'local' теряет события между ними, поэтому по умолчанию 'postgres', а явный 'local' — ошибка
+SEAT_EVENTS_BACKEND = os.getenv('SEAT_EVENTS_BACKEND', 'postgres' if WEB_CONCURRENCY > 1 else 'local')
+if SEAT_EVENTS_BACKEND == 'local' and WEB_CONCURRENCY > 1:
+    raise ValueError(f'SEAT_EVENTS_BACKEND=local does not deliver seat events across {WEB_CONCURRENCY} workers, use postgres')
+SEAT_EVENTS_HEARTBEAT_SEC = float(os.getenv('SEAT_EVENTS_HEARTBEAT_SEC', '15'))
+# Предельная пауза между попытками переподключить слушателя LISTEN/NOTIFY
+SEAT_EVENTS_RECONNECT_MAX_SEC = float(os.getenv('SEAT_EVENTS_RECONNECT_MAX_SEC', '30'))
+PG_NOTIFY_DSN = f'postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}'
+
+# Время жизни закэшированной таблицы цен сеанса
+PRICE_TABLE_TTL_SEC = float(os.getenv('PRICE_TABLE_TTL_SEC', '60'))
+
+# Логирование: уровень, формат ('json' или 'text'), размер очереди и доля записей горячего пути
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+LOG_PERF_SAMPLE_RATE = float(os.getenv('LOG_PERF_SAMPLE_RATE', '0.01'))
+
+# Idempotency-Key: сколько хранить ответы и сколько держать в памяти процесса
+IDEMPOTENCY_TTL_SEC = int(os.getenv('IDEMPOTENCY_TTL_SEC', str(60 * 60 * 24)))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv('IDEMPOTENCY_CACHE_SIZE', '10000'))
+IDEMPOTENCY_CLEANUP_SEC = float(os.getenv('IDEMPOTENCY_CLEANUP_SEC', '600'))
+# Срок гостевой куки, по которой различаются ключи гостевых бронирований
+GUEST_COOKIE_MAX_AGE_SEC = int(os.getenv('GUEST_COOKIE_MAX_AGE_SEC', str(60 * 60 * 24 * 365)))
+
+# Склейка одинаковых одновременных чтений (singleflight): сколько миллисекунд ещё отдавать
+# готовый результат новым запросам; 0 — только запросы, пришедшие во время загрузки
+SINGLEFLIGHT_TTL_MS = float(os.getenv('SINGLEFLIGHT_TTL_MS', '0'))
+
+# Пул соединений с БД. Общий бюджет соединений всех воркеров DB_POOL_BUDGET делится между
+# WEB_CONCURRENCY воркерами (2/3 пул, остальное overflow), но одному процессу больше 15 не нужно.
+# Бюджет по умолчанию оставляет запас до max_connections=100 для LISTEN, миграций и админки
+DB_POOL_BUDGET = int(os.getenv('DB_POOL_BUDGET', '60'))
+_worker_connections = max(min(DB_POOL_BUDGET // WEB_CONCURRENCY, 15), 2)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', str(max(_worker_connections * 2 // 3, 1))))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', str(max(_worker_connections - DB_POOL_SIZE, 0))))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+
+# Контроль входа: лимиты запросов на клиента (token bucket, 0 — без лимита). По умолчанию выключены:
+# клиенты за NAT делят один IP, фронтенд бронирует каждое место группы отдельным POST, а админка
+# сохраняет цены всех сеансов зала циклом PATCH. Ёмкость брони рассчитана на заказ целым рядом
+RATE_LIMIT_PER_SEC = float(os.getenv('RATE_LIMIT_PER_SEC', '0'))
+RATE_LIMIT_BURST = int(os.getenv('RATE_LIMIT_BURST', '200'))
+BOOKING_RATE_LIMIT_PER_SEC = float(os.getenv('BOOKING_RATE_LIMIT_PER_SEC', '0'))
+BOOKING_RATE_LIMIT_BURST = int(os.getenv('BOOKING_RATE_LIMIT_BURST', '30'))
+# Доверять X-Forwarded-For при определении IP клиента (только за своим прокси)
+TRUST_FORWARDED_FOR = os.getenv('TRUST_FORWARDED_FOR', 'false').lower() == 'true'
+# Одновременных бронирований на процесс; по умолчанию — размер пула
+BOOKING_CONCURRENCY = int(os.getenv('BOOKING_CONCURRENCY', str(DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+# Зал ожидания: сколько бронирований может ждать свободного слота и как долго. Очередь нужна и без
+# премьер: групповой заказ приходит пачкой одновременных POST, и без неё часть мест получала бы 503
+WAITING_ROOM_SIZE = int(os.getenv('WAITING_ROOM_SIZE', '100'))
+WAITING_ROOM_TIMEOUT_SEC = float(os.getenv('WAITING_ROOM_TIMEOUT_SEC', '5'))
+
+# Служебный пользователь для билетов, купленных гостями
+GUEST_USER_EMAIL = os.getenv('GUEST_USER_EMAIL', 'guest@cinema-booking.local')
+GUEST_USER_NAME = os.getenv('GUEST_USER_NAME', 'Гость')
+GUEST_USER_PHONE = os.getenv('GUEST_USER_PHONE', '+70000000000')
+GUEST_USER_PASSWORD = os.getenv('GUEST_USER_PASSWORD', 'guest-temp')
+
+# Директория для QR-кодов билетов (создаётся при старте в lifespan)
+QR_CODES_DIR = Path(os.getenv('QR_CODES_DIR', str(Path(__file__).resolve().parent.parent / 'qr_codes')))
+
+# Расписание сеансов: сколько секунд держать в памяти сеансы одного дня
+SCHEDULE_CACHE_TTL_SEC = float(os.getenv('SCHEDULE_CACHE_TTL_SEC', '30'))
+
+# Outbox побочных эффектов брони (QR, письмо): опрос очереди, размер пачки, число попыток
+# сколько хранить обработанные события и на сколько секунд воркер забирает пачку себе (аренда)
+OUTBOX_POLL_SEC = float(os.getenv('OUTBOX_POLL_SEC', '1'))
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '100'))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '10'))
+OUTBOX_RETENTION_SEC = float(os.getenv('OUTBOX_RETENTION_SEC', '86400'))
+OUTBOX_LEASE_SEC = float(os.getenv('OUTBOX_LEASE_SEC', '300'))
+OUTBOX_CLEANUP_SEC = float(os.getenv('OUTBOX_CLEANUP_SEC', '3600'))
+
+# Коды брони: номер узла (0..31), если приложение запущено на нескольких машинах или контейнерах.
+# Внутри узла воркеры различаются по WORKER_ID, поэтому коды не пересекаются без проверки в БД
+BOOKING_CODE_NODE_ID = int(os.getenv('BOOKING_CODE_NODE_ID', '0'))
+
+# Проход по билетам: за сколько секунд до начала сеанса и сколько после начала держать его билеты
+# в памяти воркера, как часто перечитывать их и сколько миллисекунд копить отметки перед записью в БД
+CHECKIN_PRELOAD_SEC = float(os.getenv('CHECKIN_PRELOAD_SEC', '1800'))
+CHECKIN_LATE_SEC = float(os.getenv('CHECKIN_LATE_SEC', '3600'))
+CHECKIN_REFRESH_SEC = float(os.getenv('CHECKIN_REFRESH_SEC', '60'))
+CHECKIN_FLUSH_MS = float(os.getenv('CHECKIN_FLUSH_MS', '20'))
+
+# Ограничение времени SQL-запросов: общий statement_timeout соединений пула (мс, 0 — без ограничения)
+# и отдельные значения для маршрутов в виде '/api/v1/export/tickets=120000,/api/v1/ticket=5000'
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '30000'))
+ROUTE_STATEMENT_TIMEOUTS_MS = {
+    path.strip(): int(timeout_ms)
+    for path, _, timeout_ms in (item.rpartition('=') for item in os.getenv('ROUTE_STATEMENT_TIMEOUTS', '').split(',') if item.strip())
+}
+# Запросы дольше SLOW_QUERY_MS попадают в лог и в список самых медленных (по процессу)
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '500'))
+SLOW_QUERY_TOP_N = int(os.getenv('SLOW_QUERY_TOP_N', '50'))
+SLOW_QUERY_SQL_LENGTH = int(os.getenv('SLOW_QUERY_SQL_LENGTH', '1000'))
+
+# Проба готовности (/health/ready): сколько секунд отдавать прошлый результат, таймаут одной проверки,
+# сколько сбоев подряд снимают готовность, доля занятых соединений пула и просрочка очереди QR
+# (обе только в отчёте), свободное место под QR-коды
+HEALTH_CACHE_SEC = float(os.getenv('HEALTH_CACHE_SEC', '2'))
+HEALTH_CHECK_TIMEOUT_SEC = float(os.getenv('HEALTH_CHECK_TIMEOUT_SEC', '1'))
+HEALTH_FAILURES_TO_UNREADY = int(os.getenv('HEALTH_FAILURES_TO_UNREADY', '3'))
+HEALTH_POOL_MAX_USAGE = float(os.getenv('HEALTH_POOL_MAX_USAGE', '1'))
+HEALTH_QR_QUEUE_MAX_OVERDUE_SEC = float(os.getenv('HEALTH_QR_QUEUE_MAX_OVERDUE_SEC', '60'))
+HEALTH_MIN_FREE_MB = float(os.getenv('HEALTH_MIN_FREE_MB', '100'))
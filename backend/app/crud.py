@@ -3,6 +3,9 @@ from .models import ORM_OBJ, ORM_CLS
 from fastapi import HTTPException
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import select
+from .logger import get_logger
+
+logger = get_logger('crud')
 
 async def add_item(session: AsyncSession, item: ORM_OBJ):
     session.add(item)
@@ -10,7 +13,7 @@ async def add_item(session: AsyncSession, item: ORM_OBJ):
         await session.commit()
         await session.refresh(item)
     except IntegrityError as err:
-        print(f"IntegrityError: {err}")
+        logger.warning('IntegrityError', extra={'fields': {'error': str(err.orig)}})
         raise HTTPException(409, f'Item already exists: {str(err)}')
 
 async def update_item(session: AsyncSession, item: ORM_OBJ):
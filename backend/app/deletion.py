@@ -0,0 +1,92 @@
+from fastapi import HTTPException
+from sqlalchemy import select, delete, exists, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+
+# Удаление залов, фильмов и сеансов целиком в БД: DELETE ... WHERE ... IN (SELECT ...) по таблицам
+# в порядке зависимостей, без загрузки графа объектов. Память не зависит от размера зала.
+# Проданные билеты и брони не удаляются: удаление с ними запрещено (409). Остальное удаляется явно,
+# а не через ON DELETE CASCADE, чтобы каскад не мог молча снести действующие билеты.
+SOLD_DETAILS = {
+    models.Seance: 'Нельзя удалить сеанс, на который уже оформлены бронирования или проданы билеты.',
+    models.Hall: 'Нельзя удалить зал, на сеансы которого уже оформлены бронирования или проданы билеты.',
+    models.Film: 'Нельзя удалить фильм, на сеансы которого уже оформлены бронирования или проданы билеты.',
+}
+
+
+def dependents_scope(orm_cls, seance_ids, seat_ids=None):
+    condition = orm_cls.seance_id.in_(seance_ids)
+    if seat_ids is not None:
+        condition = condition | orm_cls.seat_id.in_(seat_ids)
+    return condition
+
+
+def cascade_steps(orm_cls, ids: list[int]) -> tuple[object, object | None, list[tuple]]:
+    # (id затронутых сеансов, id затронутых мест, шаги (таблица, модель, условие) в порядке удаления)
+    if orm_cls is models.Hall:
+        seance_ids = select(models.Seance.id).where(models.Seance.hall_id.in_(ids))
+        seat_ids = select(models.Seat.id).where(models.Seat.hall_id.in_(ids))
+        own = [('seats', models.Seat, models.Seat.hall_id.in_(ids)), ('halls', models.Hall, models.Hall.id.in_(ids))]
+    elif orm_cls is models.Film:
+        seance_ids = select(models.Seance.id).where(models.Seance.film_id.in_(ids))
+        seat_ids = None
+        own = [('films', models.Film, models.Film.id.in_(ids))]
+    elif orm_cls is models.Seance:
+        seance_ids, seat_ids, own = ids, None, []
+    else:
+        raise ValueError(f'Cascade deletion is not supported for {orm_cls.__name__}')
+    steps = [
+        # События outbox удаляются вместе с билетами (ticket_events.ticket_id ON DELETE CASCADE)
+        ('tickets', models.Ticket, dependents_scope(models.Ticket, seance_ids, seat_ids) & (models.Ticket.archived == True)),
+        ('available_seats', models.AvailableSeat, dependents_scope(models.AvailableSeat, seance_ids, seat_ids)),
+        ('prices', models.Price, dependents_scope(models.Price, seance_ids, seat_ids)),
+        ('seances', models.Seance, models.Seance.id.in_(seance_ids)),
+    ]
+    return seance_ids, seat_ids, steps + own
+
+
+async def ensure_not_sold(session: AsyncSession, orm_cls, seance_ids, seat_ids=None):
+    active_tickets = exists().where(
+        dependents_scope(models.Ticket, seance_ids, seat_ids), models.Ticket.archived == False
+    )
+    bookings = exists().where(dependents_scope(models.Booking, seance_ids, seat_ids))
+    result = await session.execute(select(active_tickets | bookings))
+    if result.scalar_one():
+        raise HTTPException(409, SOLD_DETAILS[orm_cls])
+
+
+async def delete_cascade(session: AsyncSession, orm_cls, ids: list[int], dry_run: bool = False) -> dict[str, int]:
+    # Без коммита: вызывающий решает, чем завершить транзакцию. Возвращает число строк по таблицам;
+    # при dry_run — сколько было бы удалено (COUNT по тем же условиям)
+    seance_ids, seat_ids, steps = cascade_steps(orm_cls, ids)
+    await ensure_not_sold(session, orm_cls, seance_ids, seat_ids)
+    rows = {}
+    for table, model, condition in steps:
+        if dry_run:
+            result = await session.execute(select(func.count()).select_from(model).where(condition))
+            rows[table] = result.scalar_one()
+        else:
+            result = await session.execute(
+                delete(model).where(condition).execution_options(synchronize_session=False)
+            )
+            rows[table] = result.rowcount
+    return rows
+
+
+async def delete_with_dependents(session: AsyncSession, orm_cls, item_id: int, dry_run: bool = False) -> dict[str, int]:
+    try:
+        rows = await delete_cascade(session, orm_cls, [item_id], dry_run)
+        if dry_run:
+            await session.rollback()
+        else:
+            await session.commit()
+    except IntegrityError:
+        # Билет или бронь появились после проверки: внешний ключ не дал удалить сеанс или место
+        await session.rollback()
+        raise HTTPException(409, SOLD_DETAILS[orm_cls])
+    except Exception:
+        await session.rollback()
+        raise
+    return rows
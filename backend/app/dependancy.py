@@ -1,29 +1,52 @@
-from datetime import datetime, timedelta
+import math
 import uuid
-from fastapi import Depends, HTTPException, Header
-from .models import Session, Token
-from .config import TOKEN_TTL_SEC
+from fastapi import Depends, HTTPException, Header, Request
+from .models import Session, Token, User
+from .tokens import token_cutoff
+from .diagnostics import route_var, session_info
+from .admission import admission
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from sqlalchemy.orm import joinedload, noload
 from typing import Annotated
 from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
 
-async def get_session() -> AsyncSession:
-    async with Session() as session:
+async def get_session(request: Request) -> AsyncSession:
+    # Шаблон маршрута (а не путь с id) — ключ таймаута и группировки медленных запросов
+    route = request.scope.get('route')
+    if route is not None:
+        route_var.set(route.path)
+    async with Session(info=session_info()) as session:
         yield session
 
 SessionDependency = Annotated[AsyncSession, Depends(get_session, use_cache=True)]
 
 async def get_token(x_token: Annotated[uuid.UUID, Header()], session: SessionDependency) -> Token:
-    query = select(Token).where(Token.token == x_token, 
-    Token.creation_time >= (datetime.now() - timedelta(seconds=TOKEN_TTL_SEC)))
+    # Пользователь нужен только для проверки роли: его токены, билеты и брони не загружаем
+    query = select(Token).where(Token.token == x_token, Token.creation_time >= token_cutoff()).options(
+        joinedload(Token.user).options(noload(User.tokens), noload(User.tickets), noload(User.bookings))
+    )
     result = await session.execute(query)
     token = result.scalars().unique().first()
     if token is None:
         raise HTTPException(401, 'Token not found')
+    # Лимит по пользователю — только для проверенного токена (до проверки клиент считается по IP)
+    retry_after = await admission.check_rate(admission.user_rule, str(token.user_id))
+    if retry_after:
+        admission.counters['user_rate_limited'] += 1
+        raise HTTPException(429, 'Too many requests', headers={'Retry-After': str(max(1, math.ceil(retry_after)))})
     return token
 
 TokenDependency = Annotated[Token, Depends(get_token)]
 
+
+# Повторы POST-запросов с тем же ключом получают исходный ответ
+IdempotencyKeyHeader = Annotated[str | None, Header(alias='Idempotency-Key', max_length=100)]
+
+# id гостевого пользователя определяется при старте (lifespan)
+def get_guest_user_id(request: Request) -> int:
+    return request.app.state.guest_user_id
+
+GuestUserDependency = Annotated[int, Depends(get_guest_user_id)]
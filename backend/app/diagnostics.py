@@ -0,0 +1,131 @@
+import re
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session as SyncSession
+
+from . import config
+from .logger import get_logger
+
+logger = get_logger('slow_query')
+
+# Шаблон маршрута текущего запроса ('/api/v1/ticket/{ticket_id}'); вне запросов — фоновые задачи
+route_var: ContextVar[str] = ContextVar('route', default='background')
+
+# Таймауты по маршрутам (мс) поверх общего DB_STATEMENT_TIMEOUT_MS: отчёты и выгрузка читают
+# много строк, а поиск билетов без фильтров не должен держать соединение из пула
+ROUTE_STATEMENT_TIMEOUTS_MS = {
+    '/api/v1/export/tickets': 120000,
+    '/api/v1/reports/tickets': 60000,
+    '/api/v1/reports/tickets/aggregate': 60000,
+    '/api/v1/ticket': 5000,
+    '/api/v1/tickets': 5000,
+} | config.ROUTE_STATEMENT_TIMEOUTS_MS
+
+IN_LIST_RE = re.compile(r'\(\s*\$\d+(?:\s*,\s*\$\d+)*\s*\)')
+PARAM_RE = re.compile(r'\$\d+')
+NUMBER_RE = re.compile(r'\b\d+\b')
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+SPACE_RE = re.compile(r'\s+')
+
+
+def normalize_sql(statement: str) -> str:
+    # Один запрос с разными параметрами и длиной IN-списков — одна запись
+    sql = STRING_RE.sub('?', statement)
+    sql = IN_LIST_RE.sub('(...)', sql)
+    sql = PARAM_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    return SPACE_RE.sub(' ', sql).strip()[:config.SLOW_QUERY_SQL_LENGTH]
+
+
+def statement_timeout_for(route: str) -> int | None:
+    return ROUTE_STATEMENT_TIMEOUTS_MS.get(route)
+
+
+def session_info() -> dict:
+    # info для сессий, открытых обработчиком запроса (в том числе своих, как у выгрузки)
+    return {'statement_timeout_ms': statement_timeout_for(route_var.get())}
+
+
+def is_statement_timeout(error: BaseException) -> bool:
+    # asyncpg QueryCanceledError (SQLSTATE 57014) приходит обёрнутым в DBAPIError
+    return getattr(error, 'sqlstate', None) == '57014' or 'statement timeout' in str(error)
+
+
+class SlowQueryRecorder:
+    # Самые медленные запросы процесса, сгруппированные по (нормализованный SQL, маршрут)
+    def __init__(self, threshold_ms: float, top_n: int):
+        self.threshold_ms = threshold_ms
+        self.top_n = top_n
+        self._entries: dict[tuple[str, str], dict] = {}
+
+    def record(self, statement: str, duration_ms: float, timed_out: bool = False):
+        route = route_var.get()
+        sql = normalize_sql(statement)
+        entry = self._entries.get((sql, route))
+        if entry is None:
+            entry = self._entries[(sql, route)] = {
+                'sql': sql, 'route': route, 'count': 0, 'timeouts': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'last_at': None,
+            }
+        entry['count'] += 1
+        entry['timeouts'] += timed_out
+        entry['total_ms'] += duration_ms
+        entry['max_ms'] = max(entry['max_ms'], duration_ms)
+        entry['last_at'] = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        if len(self._entries) > self.top_n * 2:
+            self._prune()
+        logger.warning('Медленный запрос' if not timed_out else 'Запрос прерван по statement_timeout', extra={'fields': {
+            'route': route,
+            'duration_ms': round(duration_ms, 1),
+            'sql': sql,
+        }})
+
+    def _prune(self):
+        keep = sorted(self._entries.items(), key=lambda item: item[1]['max_ms'], reverse=True)[:self.top_n]
+        self._entries = dict(keep)
+
+    def top(self, limit: int | None = None) -> list[dict]:
+        entries = sorted(self._entries.values(), key=lambda entry: entry['max_ms'], reverse=True)
+        return [
+            {**entry, 'total_ms': round(entry['total_ms'], 1), 'max_ms': round(entry['max_ms'], 1),
+             'avg_ms': round(entry['total_ms'] / entry['count'], 1)}
+            for entry in entries[:limit or self.top_n]
+        ]
+
+    def reset(self):
+        self._entries.clear()
+
+
+slow_queries = SlowQueryRecorder(threshold_ms=config.SLOW_QUERY_MS, top_n=config.SLOW_QUERY_TOP_N)
+
+
+def install_query_hooks(engine):
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration_ms = (time.perf_counter() - conn.info['query_started'].pop()) * 1000
+        if duration_ms >= slow_queries.threshold_ms:
+            slow_queries.record(statement, duration_ms)
+
+    @event.listens_for(sync_engine, 'handle_error')
+    def handle_error(context):
+        started = context.connection.info.get('query_started') if context.connection is not None else None
+        if not started:
+            return
+        duration_ms = (time.perf_counter() - started.pop()) * 1000
+        if context.statement and is_statement_timeout(context.original_exception):
+            slow_queries.record(context.statement, duration_ms, timed_out=True)
+
+    # Таймаут маршрута действует в каждой транзакции сессии запроса (SET LOCAL снимается при коммите)
+    @event.listens_for(SyncSession, 'after_begin')
+    def set_statement_timeout(session, transaction, connection):
+        timeout_ms = session.info.get('statement_timeout_ms')
+        if timeout_ms is not None:
+            connection.exec_driver_sql(f'SET LOCAL statement_timeout = {int(timeout_ms)}')
@@ -0,0 +1,72 @@
+import csv
+import io
+import zlib
+
+from . import models
+from .reports import TicketFilters, ticket_rows_query
+from .serialization import format_timestamp
+from .diagnostics import session_info
+
+
+EXPORT_COLUMNS = (
+    'id', 'booking_code', 'created_at', 'seance_id', 'start_time', 'seance_hall_id', 'film_id',
+    'seat_id', 'row_number', 'seat_number', 'seat_type', 'price', 'booked', 'archived',
+    'user_name', 'user_phone', 'user_email',
+)
+
+# Сколько строк забирать из серверного курсора за раз
+EXPORT_CHUNK_ROWS = 5000
+
+# Поля, которые вводит гость: Excel и LibreOffice исполняют ячейки, начинающиеся с этих символов, как формулы
+GUEST_COLUMNS = frozenset({'user_name', 'user_phone', 'user_email'})
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def neutralize_formula(value: str | None) -> str | None:
+    # Апостроф в начале заставляет табличный редактор показать значение как текст
+    if value and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_line_values(row) -> list:
+    values = []
+    for column in EXPORT_COLUMNS:
+        value = row[column]
+        if column == 'created_at':
+            value = format_timestamp(value)
+        elif column == 'start_time' and value is not None:
+            value = value.isoformat()
+        elif column in GUEST_COLUMNS:
+            value = neutralize_formula(value)
+        values.append(value)
+    return values
+
+
+async def stream_tickets_csv(filters: TicketFilters, compress: bool = False):
+    # Отдельная сессия: поток живёт дольше обработчика запроса.
+    # Строки идут из серверного курсора пачками, весь результат в памяти не держится.
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush() -> bytes:
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) if compressor else data
+
+    writer.writerow(EXPORT_COLUMNS)
+    yield flush()
+
+    query = ticket_rows_query(filters).order_by(models.Ticket.id).execution_options(yield_per=EXPORT_CHUNK_ROWS)
+    async with models.Session(info=session_info()) as session:
+        result = await session.stream(query)
+        async for partition in result.mappings().partitions():
+            writer.writerows(csv_line_values(row) for row in partition)
+            chunk = flush()
+            if chunk:
+                yield chunk
+
+    if compressor:
+        yield compressor.flush()
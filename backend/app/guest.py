@@ -0,0 +1,39 @@
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from . import config
+from . import models
+from .auth import hash_password
+
+
+# Служебный пользователь, к которому привязываются билеты гостей.
+# Определяется один раз при старте процесса; одновременный старт воркеров безопасен благодаря ON CONFLICT.
+async def ensure_guest_user() -> int:
+    async with models.Session() as session:
+        guest_id = await get_guest_id(session)
+        if guest_id is not None:
+            return guest_id
+
+        result = await session.execute(
+            insert(models.User)
+            .values(
+                name=config.GUEST_USER_NAME,
+                phone=config.GUEST_USER_PHONE,
+                email=config.GUEST_USER_EMAIL,
+                hashed_password=hash_password(config.GUEST_USER_PASSWORD),
+                role='user',
+            )
+            .on_conflict_do_nothing(index_elements=[models.User.email])
+            .returning(models.User.id)
+        )
+        guest_id = result.scalar_one_or_none()
+        await session.commit()
+        if guest_id is None:
+            # Гостя только что создал другой воркер
+            guest_id = await get_guest_id(session)
+        return guest_id
+
+
+async def get_guest_id(session) -> int | None:
+    result = await session.execute(select(models.User.id).where(models.User.email == config.GUEST_USER_EMAIL))
+    return result.scalar_one_or_none()
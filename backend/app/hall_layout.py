@@ -0,0 +1,192 @@
+from array import array
+
+from fastapi import HTTPException
+from sqlalchemy import select, insert, update, delete, exists
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+
+# Схема зала строками, по символу на позицию сетки:
+#   S — обычное место, V — VIP, _ — проход, . — места нет
+# Номер места равен номеру позиции в ряду, поэтому проход разрывает соседство мест.
+CELL_TYPES = {'S': 'standard', 'V': 'vip'}
+TYPE_CELLS = {'standard': 'S', 'vip': 'V'}
+GAP_CELLS = frozenset('_.')
+# Исторически места по умолчанию создавались с типом 'standart'
+SEAT_TYPE_ALIASES = {'standart': 'standard', '': 'standard'}
+MAX_LAYOUT_SIDE = 200
+
+
+def parse_layout(rows: list[str]) -> list[str]:
+    rows = [row.rstrip() for row in rows]
+    while rows and not rows[-1]:
+        rows.pop()
+    if not rows:
+        raise HTTPException(400, 'Layout is empty')
+    if len(rows) > MAX_LAYOUT_SIDE or max(map(len, rows)) > MAX_LAYOUT_SIDE:
+        raise HTTPException(400, f'Layout is larger than {MAX_LAYOUT_SIDE}x{MAX_LAYOUT_SIDE}')
+    for row_number, row in enumerate(rows, start=1):
+        unknown = set(row) - CELL_TYPES.keys() - GAP_CELLS
+        if unknown:
+            raise HTTPException(400, f'Unknown layout cells in row {row_number}: {"".join(sorted(unknown))}')
+    return rows
+
+
+def seat_type_key(seat_type: str | None) -> str:
+    seat_type = (seat_type or '').lower()
+    return SEAT_TYPE_ALIASES.get(seat_type, seat_type)
+
+
+def layout_cells(rows: list[str]) -> dict[tuple[int, int], str]:
+    return {
+        (row_number, seat_number): CELL_TYPES[cell]
+        for row_number, row in enumerate(rows, start=1)
+        for seat_number, cell in enumerate(row, start=1)
+        if cell in CELL_TYPES
+    }
+
+
+def render_layout(rows: int, seats_per_row: int, seats) -> list[str]:
+    # Для залов, чьи места заводились по одному: схема восстанавливается по таблице мест
+    grid = [['.'] * seats_per_row for _ in range(rows)]
+    for _, row, number, seat_type in seats:
+        if 1 <= row <= rows and 1 <= number <= seats_per_row:
+            grid[row - 1][number - 1] = TYPE_CELLS.get(seat_type_key(seat_type), 'S')
+    return [''.join(row) for row in grid]
+
+
+# Места зала массивами (id, ряд, номер, тип) в порядке ряд/место. Версия — halls.layout_version,
+# она растёт при любом изменении мест зала, поэтому кэш проверяется одним запросом по ключу
+# и одинаково работает во всех воркерах.
+class HallLayout:
+    __slots__ = ('hall_id', 'version', 'rows', 'seats_per_row', 'grid', 'seat_ids', 'row_numbers', 'seat_numbers', 'seat_types', '_derived')
+
+    def __init__(self, hall_id: int, version: int, rows: int, seats_per_row: int, grid: list[str] | None, seats: list):
+        self.hall_id = hall_id
+        self.version = version
+        self.rows = rows
+        self.seats_per_row = seats_per_row
+        self.seat_ids = array('q', [seat[0] for seat in seats])
+        self.row_numbers = array('i', [seat[1] for seat in seats])
+        self.seat_numbers = array('i', [seat[2] for seat in seats])
+        self.seat_types = [seat[3] for seat in seats]
+        self.grid = grid or render_layout(rows, seats_per_row, self.seats)
+        self._derived = {}
+
+    @property
+    def seats(self) -> list[tuple]:
+        return list(zip(self.seat_ids, self.row_numbers, self.seat_numbers, self.seat_types))
+
+    def derived(self, key: str, build):
+        # Производные структуры (битовые карты, сетка подбора мест) строятся один раз на версию
+        value = self._derived.get(key)
+        if value is None:
+            value = self._derived[key] = build(self)
+        return value
+
+
+class HallLayoutCache:
+    def __init__(self):
+        self._layouts: dict[int, HallLayout] = {}
+
+    async def get(self, session: AsyncSession, hall_id: int, version: int | None = None) -> HallLayout | None:
+        if version is None:
+            result = await session.execute(select(models.Hall.layout_version).where(models.Hall.id == hall_id))
+            version = result.scalar_one_or_none()
+            if version is None:
+                self._layouts.pop(hall_id, None)
+                return None
+        layout = self._layouts.get(hall_id)
+        if layout is not None and layout.version == version:
+            return layout
+        layout = await self.load(session, hall_id)
+        if layout is not None:
+            self._layouts[hall_id] = layout
+        return layout
+
+    async def load(self, session: AsyncSession, hall_id: int) -> HallLayout | None:
+        hall_result = await session.execute(
+            select(models.Hall.rows, models.Hall.seats_per_row, models.Hall.layout, models.Hall.layout_version)
+            .where(models.Hall.id == hall_id)
+        )
+        hall = hall_result.first()
+        if hall is None:
+            return None
+        seats_result = await session.execute(
+            select(models.Seat.id, models.Seat.row_number, models.Seat.seat_number, models.Seat.seat_type)
+            .where(models.Seat.hall_id == hall_id)
+            .order_by(models.Seat.row_number, models.Seat.seat_number, models.Seat.id)
+        )
+        grid = hall.layout.split('\n') if hall.layout else None
+        return HallLayout(hall_id, hall.layout_version, hall.rows, hall.seats_per_row, grid, seats_result.all())
+
+
+async def bump_layout_version(session: AsyncSession, *hall_ids: int):
+    # Без hall_ids — все залы (пакетные изменения мест, где залы заранее неизвестны)
+    stmt = update(models.Hall).values(layout_version=models.Hall.layout_version + 1)
+    if hall_ids:
+        stmt = stmt.where(models.Hall.id.in_(hall_ids))
+    await session.execute(stmt.execution_options(synchronize_session=False))
+
+
+async def apply_layout(session: AsyncSession, hall_id: int, rows: list[str], commit: bool = True) -> dict:
+    # Места выводятся из схемы пачкой: вставка недостающих, смена типа, удаление лишних.
+    # commit=False — для вызывающего, который завершает транзакцию сам (создание зала со схемой)
+    cells = layout_cells(rows)
+    result = await session.execute(
+        select(models.Seat.id, models.Seat.row_number, models.Seat.seat_number, models.Seat.seat_type)
+        .where(models.Seat.hall_id == hall_id)
+    )
+    existing = {(row, number): (seat_id, seat_type) for seat_id, row, number, seat_type in result.all()}
+
+    to_insert = [
+        {'hall_id': hall_id, 'row_number': row, 'seat_number': number, 'seat_type': seat_type}
+        for (row, number), seat_type in cells.items() if (row, number) not in existing
+    ]
+    to_update = [
+        {'id': seat_id, 'seat_type': cells[position]}
+        for position, (seat_id, seat_type) in existing.items()
+        if position in cells and seat_type_key(seat_type) != cells[position]
+    ]
+    to_delete = [seat_id for position, (seat_id, _) in existing.items() if position not in cells]
+
+    if to_delete:
+        # Места с билетами или бронями не удаляем: схема не должна отменять проданные билеты
+        sold = await session.execute(
+            select(models.Seat.row_number, models.Seat.seat_number)
+            .where(
+                models.Seat.id.in_(to_delete),
+                exists().where(models.Ticket.seat_id == models.Seat.id)
+                | exists().where(models.Booking.seat_id == models.Seat.id),
+            )
+            .order_by(models.Seat.row_number, models.Seat.seat_number)
+            .limit(10)
+        )
+        sold_positions = [f'{row}-{number}' for row, number in sold.all()]
+        if sold_positions:
+            raise HTTPException(409, f'Seats with tickets cannot be removed: {", ".join(sold_positions)}')
+        for orm_cls in (models.Price, models.AvailableSeat):
+            await session.execute(delete(orm_cls).where(orm_cls.seat_id.in_(to_delete)))
+        await session.execute(delete(models.Seat).where(models.Seat.id.in_(to_delete)))
+    if to_insert:
+        await session.execute(insert(models.Seat), to_insert)
+    if to_update:
+        await session.execute(update(models.Seat), to_update)
+
+    await session.execute(
+        update(models.Hall)
+        .where(models.Hall.id == hall_id)
+        .values(
+            layout='\n'.join(rows),
+            rows=len(rows),
+            seats_per_row=max(map(len, rows)),
+            layout_version=models.Hall.layout_version + 1,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if commit:
+        await session.commit()
+    return {'created': len(to_insert), 'updated': len(to_update), 'deleted': len(to_delete)}
+
+
+hall_layouts = HallLayoutCache()
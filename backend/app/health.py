@@ -0,0 +1,128 @@
+import asyncio
+import shutil
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from sqlalchemy import select, func, text
+
+from . import config
+from . import models
+from .logger import get_logger
+from .singleflight import SingleFlight
+
+logger = get_logger('health')
+
+# Проверки готовности воркера. Результат общий для всех проб в течение HEALTH_CACHE_SEC:
+# одновременные пробы ждут одну проверку, поэтому частый опрос оркестратора не нагружает БД.
+readiness_checks = SingleFlight(ttl_ms=config.HEALTH_CACHE_SEC * 1000)
+# Сколько проверок подряд не прошла каждая зависимость
+consecutive_failures: Counter = Counter()
+
+
+async def check_database() -> dict:
+    # SELECT 1 через пул: при исчерпанном пуле проверка упирается в таймаут, как и запросы клиентов
+    async with models.Session() as session:
+        await session.execute(text('SELECT 1'))
+    return {}
+
+
+async def check_pool() -> dict:
+    pool = models.get_engine().pool
+    capacity = config.DB_POOL_SIZE + config.DB_MAX_OVERFLOW
+    in_use = pool.checkedout()
+    usage = in_use / capacity if capacity else 0
+    return {
+        'ok': usage < config.HEALTH_POOL_MAX_USAGE,
+        'in_use': in_use,
+        'capacity': capacity,
+        'usage': round(usage, 3),
+    }
+
+
+async def check_qr_queue() -> dict:
+    # QR-коды рисует диспетчер outbox. Очередь общая для всех воркеров, поэтому на готовность
+    # воркера не влияет: отчёт справочный. Исчерпавшие попытки события не ждут обработки, а
+    # отложенные повторы — штатная пауза, поэтому считается только просрочка available_at
+    now = datetime.utcnow()
+    async with models.Session() as session:
+        result = await session.execute(
+            select(
+                func.count(),
+                func.count().filter(models.TicketEvent.available_at <= now),
+                func.min(models.TicketEvent.available_at),
+            )
+            .where(
+                models.TicketEvent.processed_at.is_(None),
+                models.TicketEvent.attempts < config.OUTBOX_MAX_ATTEMPTS,
+            )
+        )
+        pending, due, earliest = result.one()
+    overdue = (now - earliest).total_seconds() if earliest and earliest <= now else 0
+    return {
+        'ok': overdue < config.HEALTH_QR_QUEUE_MAX_OVERDUE_SEC,
+        'pending': pending,
+        'due': due,
+        'overdue_sec': round(overdue, 3),
+    }
+
+
+def probe_qr_dir() -> dict:
+    free_mb = shutil.disk_usage(config.QR_CODES_DIR).free / 1024 / 1024
+    # Реальная запись: каталог может быть смонтирован только на чтение или принадлежать другому пользователю
+    with tempfile.NamedTemporaryFile(dir=config.QR_CODES_DIR, prefix='.health-'):
+        pass
+    return {'ok': free_mb >= config.HEALTH_MIN_FREE_MB, 'free_mb': round(free_mb, 1)}
+
+
+async def check_disk() -> dict:
+    return await asyncio.to_thread(probe_qr_dir)
+
+
+CHECKS = {
+    'database': check_database,
+    'disk': check_disk,
+}
+# Справочные проверки: в ответе есть, но готовность не снимают. Очередь QR общая для всех воркеров,
+# а полный пул — обычное состояние под пиковой нагрузкой у всех реплик сразу: снятие готовности
+# увело бы весь сервис из балансировки именно тогда. Исчерпанный пул видно по таймауту SELECT 1
+INFO_CHECKS = {
+    'pool': check_pool,
+    'qr_queue': check_qr_queue,
+}
+
+
+async def run_check(check) -> dict:
+    started = time.perf_counter()
+    try:
+        details = await asyncio.wait_for(check(), timeout=config.HEALTH_CHECK_TIMEOUT_SEC)
+        status = 'ok' if details.pop('ok', True) else 'fail'
+    except asyncio.TimeoutError:
+        status, details = 'fail', {'error': 'timeout'}
+    except Exception as err:
+        # Проба доступна без токена: наружу только тип ошибки, подробности — в логе
+        logger.warning('Проверка готовности не прошла', exc_info=True, extra={'fields': {'check': check.__name__}})
+        status, details = 'fail', {'error': type(err).__name__}
+    return {'status': status, 'latency_ms': round((time.perf_counter() - started) * 1000, 1), **details}
+
+
+async def run_readiness_checks() -> dict:
+    models.get_engine()
+    results = await asyncio.gather(*(run_check(check) for check in (*CHECKS.values(), *INFO_CHECKS.values())))
+    checks = dict(zip(CHECKS, results))
+    # Готовность снимается только при устойчивом сбое: SELECT 1 через полный пул под пиковой
+    # нагрузкой может разово не уложиться в таймаут
+    for name, check in checks.items():
+        consecutive_failures[name] = consecutive_failures[name] + 1 if check['status'] != 'ok' else 0
+    failing = [name for name in checks if consecutive_failures[name] >= config.HEALTH_FAILURES_TO_UNREADY]
+    return {
+        'status': 'not_ready' if failing else 'ready',
+        'checked_at': datetime.now(timezone.utc).isoformat(),
+        'checks': checks,
+        'info': dict(zip(INFO_CHECKS, results[len(CHECKS):])),
+    }
+
+
+async def readiness() -> dict:
+    return await readiness_checks.do(('ready',), run_readiness_checks)
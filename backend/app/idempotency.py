@@ -0,0 +1,193 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import orjson
+from fastapi import HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from pydantic import BaseModel
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
+
+from . import config
+from . import models
+from .logger import get_logger
+
+logger = get_logger('idempotency')
+
+# Гостевая кука: стабильная личность гостя для области Idempotency-Key (все гости — один пользователь)
+GUEST_COOKIE = 'guest_id'
+# Длина колонки idempotency_keys.scope
+SCOPE_MAX_LENGTH = 100
+
+
+def request_hash(payload: BaseModel | dict | None) -> str:
+    if isinstance(payload, BaseModel):
+        payload = payload.model_dump(mode='json')
+    return hashlib.sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+def digest(value: str) -> str:
+    return hashlib.sha256(value.encode()).hexdigest()[:32]
+
+
+def client_identity(request: Request) -> str:
+    # Токен пользователя или гостевая кука, а не IP: повтор с телефона после смены сети должен
+    # попасть в ту же область. В область идёт только хэш: значения приходят от клиента.
+    # Без куки (первое бронирование) область задаёт сам ключ — случайный UUID клиента
+    token = request.headers.get('x-token')
+    if token:
+        return f'user:{digest(token)}'
+    guest = request.cookies.get(GUEST_COOKIE)
+    if guest:
+        return f'guest:{digest(guest)}'
+    return 'anonymous'
+
+
+def bounded_scope(scope: str) -> str:
+    return scope if len(scope) <= SCOPE_MAX_LENGTH else digest(scope)
+
+
+class StoredResponse:
+    __slots__ = ('request_hash', 'status_code', 'body', 'stored_at')
+
+    def __init__(self, request_hash: str, status_code: int, body: bytes):
+        self.request_hash = request_hash
+        self.status_code = status_code
+        self.body = body
+        self.stored_at = time.monotonic()
+
+    def response(self, replayed: bool) -> Response:
+        headers = {'Idempotent-Replayed': 'true'} if replayed else None
+        return Response(content=self.body, status_code=self.status_code, media_type='application/json', headers=headers)
+
+
+# Повторы запроса с тем же Idempotency-Key получают исходный ответ.
+# Сначала смотрим LRU в памяти, затем таблицу idempotency_keys; одновременные
+# дубли ждут уже выполняющийся запрос вместо повторного выполнения. Ожидание общего
+# запроса (_inflight) работает только внутри воркера: одновременные дубли в разных воркерах
+# выполнятся оба, и сохранится ответ первого (ON CONFLICT DO NOTHING).
+class IdempotencyStore:
+    def __init__(self, cache_size: int, ttl_sec: int):
+        self.cache_size = cache_size
+        self.ttl_sec = ttl_sec
+        self._cache: OrderedDict[tuple[str, str], StoredResponse] = OrderedDict()
+        self._inflight: dict[tuple[str, str], asyncio.Future] = {}
+
+    async def run(self, scope: str, key: str | None, payload, handler, response_model: type[BaseModel]) -> Response:
+        if key is None:
+            return self._serialize('', await handler(), response_model).response(replayed=False)
+
+        scope = bounded_scope(scope)
+        cache_key = (scope, key)
+        fingerprint = request_hash(payload)
+
+        stored = self._get_cached(cache_key)
+        if stored is None and cache_key in self._inflight:
+            stored = await asyncio.shield(self._inflight[cache_key])
+        if stored is not None:
+            return self._replay(stored, fingerprint)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[cache_key] = future
+        try:
+            stored = await self._load(scope, key)
+            if stored is not None:
+                self._remember(cache_key, stored)
+                future.set_result(stored)
+                return self._replay(stored, fingerprint)
+
+            stored = self._serialize(fingerprint, await handler(), response_model)
+            try:
+                await self._save(scope, key, stored)
+            except Exception:
+                # Запрос уже выполнен и закоммичен: ошибку сохранения ответа не отдаём клиенту,
+                # повтор в этот воркер всё равно получит ответ из памяти
+                logger.warning('Не удалось сохранить ответ по Idempotency-Key', exc_info=True,
+                               extra={'fields': {'scope': scope}})
+            self._remember(cache_key, stored)
+            future.set_result(stored)
+            return stored.response(replayed=False)
+        except BaseException as err:
+            if not future.done():
+                future.set_exception(err)
+                # Ошибку получают только ожидающие дубли; без них не шумим в логах
+                future.exception()
+            raise
+        finally:
+            self._inflight.pop(cache_key, None)
+
+    @staticmethod
+    def _serialize(fingerprint: str, content, response_model: type[BaseModel]) -> StoredResponse:
+        if response_model is not None:
+            content = response_model.model_validate(content).model_dump(mode='json')
+        return StoredResponse(fingerprint, 200, orjson.dumps(jsonable_encoder(content)))
+
+    @staticmethod
+    def _replay(stored: StoredResponse, fingerprint: str) -> Response:
+        if stored.request_hash != fingerprint:
+            raise HTTPException(422, 'Idempotency-Key was already used with a different request')
+        return stored.response(replayed=True)
+
+    def _get_cached(self, cache_key: tuple[str, str]) -> StoredResponse | None:
+        stored = self._cache.get(cache_key)
+        if stored is None:
+            return None
+        if time.monotonic() - stored.stored_at > self.ttl_sec:
+            del self._cache[cache_key]
+            return None
+        self._cache.move_to_end(cache_key)
+        return stored
+
+    def _remember(self, cache_key: tuple[str, str], stored: StoredResponse):
+        self._cache[cache_key] = stored
+        self._cache.move_to_end(cache_key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _load(self, scope: str, key: str) -> StoredResponse | None:
+        async with models.Session() as session:
+            result = await session.execute(
+                select(
+                    models.IdempotencyKey.request_hash,
+                    models.IdempotencyKey.status_code,
+                    models.IdempotencyKey.response_body,
+                ).where(
+                    models.IdempotencyKey.scope == scope,
+                    models.IdempotencyKey.key == key,
+                    models.IdempotencyKey.created_at >= datetime.utcnow() - timedelta(seconds=self.ttl_sec),
+                )
+            )
+            row = result.first()
+        if row is None:
+            return None
+        return StoredResponse(row.request_hash, row.status_code, row.response_body.encode())
+
+    async def _save(self, scope: str, key: str, stored: StoredResponse):
+        async with models.Session() as session:
+            await session.execute(
+                insert(models.IdempotencyKey).values(
+                    scope=scope,
+                    key=key,
+                    request_hash=stored.request_hash,
+                    status_code=stored.status_code,
+                    response_body=stored.body.decode(),
+                    created_at=datetime.utcnow(),
+                ).on_conflict_do_nothing(constraint='uq_idempotency_keys_scope_key')
+            )
+            await session.commit()
+
+    async def purge_expired(self):
+        async with models.Session() as session:
+            await session.execute(
+                delete(models.IdempotencyKey).where(
+                    models.IdempotencyKey.created_at < datetime.utcnow() - timedelta(seconds=self.ttl_sec)
+                )
+            )
+            await session.commit()
+
+
+idempotency = IdempotencyStore(cache_size=config.IDEMPOTENCY_CACHE_SIZE, ttl_sec=config.IDEMPOTENCY_TTL_SEC)
@@ -1,12 +1,42 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from .models import init_orm, close_orm
+from .models import init_orm, close_orm, get_engine
+from .seat_events import seat_events
+from .logger import setup_logging, shutdown_logging, get_logger
+from .background import background_tasks, is_primary_worker
+from .idempotency import idempotency
+from .tokens import purge_expired_tokens
+from .guest import ensure_guest_user
+from .qr import ensure_qr_dir
+from .outbox import outbox
+from .checkin import checkins
+from . import config
+
+logger = get_logger('lifespan')
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print('START')
+    setup_logging()
+    logger.info('START')
     # Отключаем автоматическое создание - используем только Alembic
     # await init_orm()
+    get_engine()
+    ensure_qr_dir()
+    # Гостевой пользователь создаётся один раз здесь, а не первым бронированием
+    app.state.guest_user_id = await ensure_guest_user()
+    await seat_events.start()
+    # Побочные эффекты брони разбирают все воркеры: SKIP LOCKED не даёт взять событие дважды
+    background_tasks.start('outbox', config.OUTBOX_POLL_SEC, outbox.dispatch, wakeup=outbox.wakeup)
+    # Билеты ближайших сеансов для проверки на входе — в памяти каждого воркера
+    background_tasks.start('checkin_preload', config.CHECKIN_REFRESH_SEC, checkins.refresh)
+    # Очистка таблиц общая для всех воркеров — достаточно одного
+    if is_primary_worker():
+        background_tasks.start('idempotency_cleanup', config.IDEMPOTENCY_CLEANUP_SEC, idempotency.purge_expired)
+        background_tasks.start('token_purge', config.TOKEN_PURGE_INTERVAL_SEC, purge_expired_tokens)
+        background_tasks.start('outbox_cleanup', config.OUTBOX_CLEANUP_SEC, outbox.purge_processed)
     yield
-    # await close_orm()
-    print('FINISH')
\ No newline at end of file
+    await background_tasks.stop()
+    await seat_events.stop()
+    await close_orm()
+    logger.info('FINISH')
+    shutdown_logging()
@@ -0,0 +1,125 @@
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from . import config
+
+
+# Идентификатор запроса для сквозной корреляции логов (выставляется middleware)
+request_id_var: ContextVar[str | None] = ContextVar('request_id', default=None)
+
+ROOT_LOGGER = 'cinema'
+# Логгер «горячего» пути: сообщения ниже WARNING пишутся выборочно
+PERF_LOGGER = 'cinema.perf'
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f'{ROOT_LOGGER}.{name}')
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+        }
+        # Структурированные поля: logger.info('...', extra={'fields': {...}})
+        data.update(getattr(record, 'fields', None) or {})
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = f'{record.levelname} [{record.name}] {record.getMessage()}'
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+        if getattr(record, 'request_id', None):
+            line += f' request_id={record.request_id}'
+        if record.exc_text:
+            line += '\n' + record.exc_text
+        return line
+
+
+class RequestIdFilter(logging.Filter):
+    # Выполняется в потоке запроса, до постановки записи в очередь
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    # Переполненная очередь не должна тормозить обработку запросов: лишние записи отбрасываются
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Трейсбек форматируем до постановки в очередь, но храним отдельно от сообщения
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+def setup_logging():
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if config.LOG_FORMAT == 'json' else TextFormatter())
+
+    log_queue = queue.Queue(maxsize=config.LOG_QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(config.LOG_LEVEL)
+    root.handlers = [queue_handler]
+    root.propagate = False
+
+    perf = logging.getLogger(PERF_LOGGER)
+    perf.filters = [SamplingFilter(config.LOG_PERF_SAMPLE_RATE)]
+
+    # Запись в stdout выполняется в отдельном потоке
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
@@ -1,32 +1,45 @@
-from sqlalchemy import Integer, String, DateTime, Float, UUID, ForeignKey, func, Text, Boolean
-from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, create_async_engine, AsyncSession
+from sqlalchemy import Integer, String, DateTime, Float, UUID, ForeignKey, func, Text, Boolean, UniqueConstraint, Index, text
+from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, create_async_engine, AsyncSession, AsyncEngine
 from sqlalchemy.orm import DeclarativeBase, mapped_column, Mapped, relationship
 from datetime import datetime
 import uuid
 
 from . import config 
+from .diagnostics import install_query_hooks
 from .custom_type import ROLE
 
-# КРИТИЧЕСКАЯ ОПТИМИЗАЦИЯ: настраиваем connection pool для производительности
-engine = create_async_engine(
-    config.PG_DSN,
-    pool_size=10,  # Количество соединений в пуле (уменьшено для стабильности)
-    max_overflow=5,  # Дополнительные соединения при перегрузке
-    pool_pre_ping=False,  # Отключаем pre-ping для скорости (может быть проблемой при разрыве соединений)
-    pool_recycle=3600,  # Переиспользование соединений каждый час
-    pool_timeout=30,  # Таймаут ожидания соединения из пула
-    echo=False,  # Отключаем SQL логирование для производительности
-    connect_args={
-        "server_settings": {
-            "application_name": "cinema_booking",
-            "tcp_keepalives_idle": "600",
-            "tcp_keepalives_interval": "30",
-            "tcp_keepalives_count": "3",
-        }
-    }
-)
-
-Session = async_sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
+engine: AsyncEngine | None = None
+Session = async_sessionmaker(expire_on_commit=False, class_=AsyncSession)
+
+
+def get_engine() -> AsyncEngine:
+    # Движок (и драйвер asyncpg) создаётся при первом обращении: импорт моделей остаётся лёгким,
+    # а при запуске через gunicorn пул создаётся уже в воркере, после fork
+    global engine
+    if engine is None:
+        # КРИТИЧЕСКАЯ ОПТИМИЗАЦИЯ: настраиваем connection pool для производительности
+        engine = create_async_engine(
+            config.PG_DSN,
+            pool_size=config.DB_POOL_SIZE,  # Количество соединений в пуле
+            max_overflow=config.DB_MAX_OVERFLOW,  # Дополнительные соединения при перегрузке
+            pool_pre_ping=False,  # Отключаем pre-ping для скорости (может быть проблемой при разрыве соединений)
+            pool_recycle=3600,  # Переиспользование соединений каждый час
+            pool_timeout=config.DB_POOL_TIMEOUT,  # Таймаут ожидания соединения из пула
+            echo=False,  # Отключаем SQL логирование для производительности
+            connect_args={
+                "server_settings": {
+                    "application_name": "cinema_booking",
+                    "tcp_keepalives_idle": "600",
+                    "tcp_keepalives_interval": "30",
+                    "tcp_keepalives_count": "3",
+                    # Фоновые задачи и маршруты без своего таймаута (см. diagnostics.ROUTE_STATEMENT_TIMEOUTS_MS)
+                    "statement_timeout": str(config.DB_STATEMENT_TIMEOUT_MS),
+                }
+            }
+        )
+        install_query_hooks(engine)
+        Session.configure(bind=engine)
+    return engine
 
 
 class Base(DeclarativeBase, AsyncAttrs):
@@ -37,9 +50,10 @@ class Base(DeclarativeBase, AsyncAttrs):
 
 class Token(Base):
     __tablename__ = 'tokens'
+    __table_args__ = (Index('ix_tokens_user_id_creation_time', 'user_id', 'creation_time'),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     token: Mapped[uuid.UUID] = mapped_column(UUID, unique=True, server_default=func.gen_random_uuid())
-    creation_time: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    creation_time: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), nullable=False)
     
     user: Mapped['User'] = relationship('User', lazy='joined', back_populates='tokens')
@@ -57,6 +71,9 @@ class Hall(Base):
     seats_per_row: Mapped[int] = mapped_column(Integer, nullable=False)
     is_active: Mapped[bool] = mapped_column(Boolean, default=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Схема зала строками (см. app/hall_layout.py); версия растёт при любом изменении мест зала
+    layout: Mapped[str | None] = mapped_column(Text, nullable=True)
+    layout_version: Mapped[int] = mapped_column(Integer, default=0, server_default='0', nullable=False)
 
     seats: Mapped[list['Seat']] = relationship('Seat', lazy='joined', back_populates='hall', cascade='all, delete-orphan')
     seances: Mapped[list['Seance']] = relationship('Seance', lazy='joined', back_populates='hall')
@@ -119,10 +136,11 @@ class Film(Base):
 
 class Seance(Base):
     __tablename__ = 'seances'
+    __table_args__ = (Index('ix_seances_hall_id_start_time', 'hall_id', 'start_time'),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     hall_id: Mapped[int] = mapped_column(Integer, ForeignKey('halls.id'), nullable=False)
     film_id: Mapped[int] = mapped_column(Integer, ForeignKey('films.id'), nullable=False)
-    start_time: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    start_time: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
     price_standard: Mapped[float] = mapped_column(Float, nullable=False)
     price_vip: Mapped[float] = mapped_column(Float, nullable=False)
 
@@ -159,6 +177,7 @@ class Ticket(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     price: Mapped[float] = mapped_column(Float, nullable=False)
     archived: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False, index=True)
+    checked_in_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
         
     user: Mapped['User'] = relationship('User', lazy='joined', back_populates='tickets')
     seance: Mapped['Seance'] = relationship('Seance', lazy='joined', back_populates='tickets')
@@ -180,6 +199,7 @@ class Ticket(Base):
             'created_at': self.created_at.isoformat(),
             'price': self.price,
             'archived': self.archived,
+            'checked_in_at': self.checked_in_at.isoformat() if self.checked_in_at else None,
         }
 
 class Price(Base):
@@ -259,14 +279,46 @@ class Booking(Base):
     seat: Mapped['Seat'] = relationship('Seat', lazy='joined', back_populates='bookings')
 
 
+class IdempotencyKey(Base):
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (UniqueConstraint('scope', 'key', name='uq_idempotency_keys_scope_key'),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    scope: Mapped[str] = mapped_column(String(100), nullable=False)
+    key: Mapped[str] = mapped_column(String(100), nullable=False)
+    request_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    status_code: Mapped[int] = mapped_column(Integer, nullable=False)
+    response_body: Mapped[str] = mapped_column(Text, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+# Outbox побочных эффектов: событие пишется в той же транзакции, что и билет,
+# а фоновый диспетчер (app/outbox.py) обрабатывает его после коммита
+class TicketEvent(Base):
+    __tablename__ = 'ticket_events'
+    __table_args__ = (
+        Index('ix_ticket_events_pending', 'available_at', postgresql_where=text('processed_at IS NULL')),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    ticket_id: Mapped[int] = mapped_column(Integer, ForeignKey('tickets.id', ondelete='CASCADE'), nullable=False, index=True)
+    event_type: Mapped[str] = mapped_column(String(50), nullable=False)
+    payload: Mapped[str] = mapped_column(Text, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    available_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    processed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, index=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    ticket: Mapped['Ticket'] = relationship('Ticket', lazy='noload')
+
+
 ORM_OBJ = Hall | Seat | Film | Seance | Ticket | User | Price
 ORM_CLS = type[Hall] | type[Seat] | type[Film] | type[Seance] | type[Ticket] | type[User] | type[Price]
 
 async def init_orm():
-    async with engine.begin() as conn:
+    async with get_engine().begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
 
 async def close_orm():
-    await engine.dispose()
+    await get_engine().dispose()
     
@@ -0,0 +1,195 @@
+import asyncio
+import json
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, delete, func
+
+from . import config
+from . import models
+from .logger import get_logger
+from .qr import save_qr_code
+
+logger = get_logger('outbox')
+
+TICKET_BOOKED = 'ticket_booked'
+
+
+def ticket_event(ticket: models.Ticket, event_type: str, payload: dict) -> models.TicketEvent:
+    # ticket_id проставится при flush вместе с билетом — в той же транзакции
+    return models.TicketEvent(ticket=ticket, event_type=event_type, payload=json.dumps(payload, ensure_ascii=False))
+
+
+def retry_delay(attempts: int) -> timedelta:
+    # Экспоненциальная пауза между попытками: 2, 4, 8 ... секунд, не больше 10 минут
+    return timedelta(seconds=min(2 ** attempts, 600))
+
+
+# Обработчики вызываются после коммита брони, возможно повторно (at-least-once),
+# поэтому должны быть идемпотентными. event — строка ticket_events (id, ticket_id, event_type, ...)
+async def render_qr(event, payload: dict):
+    qr_data = f'Booking_code: {payload["booking_code"]}, Seance_id: {payload["seance_id"]}, Seat_id: {payload["seat_id"]}'
+    await asyncio.get_running_loop().run_in_executor(None, save_qr_code, qr_data, payload['qr_file_name'])
+
+
+async def send_confirmation_email(event, payload: dict):
+    # Заглушка: почтового сервиса пока нет, фиксируем письмо в логе
+    if payload.get('user_email'):
+        logger.info('Письмо с подтверждением брони', extra={'fields': {
+            'ticket_id': event.ticket_id,
+            'email': payload['user_email'],
+            'booking_code': payload['booking_code'],
+        }})
+
+
+class OutboxDispatcher:
+    def __init__(self, batch_size: int, max_attempts: int, retention_sec: float, lease_sec: float):
+        self.batch_size = batch_size
+        self.lease_sec = lease_sec
+        self.max_attempts = max_attempts
+        self.retention_sec = retention_sec
+        self.handlers: dict[str, list] = {}
+        self.wakeup = asyncio.Event()
+        self.counters: Counter = Counter()
+
+    def register(self, event_type: str, handler):
+        self.handlers.setdefault(event_type, []).append(handler)
+
+    def notify(self):
+        # Бронь закоммичена: будим диспетчер, не дожидаясь следующего опроса
+        self.wakeup.set()
+
+    async def dispatch(self):
+        # Разбираем очередь пачками, пока она не опустеет
+        while await self.dispatch_batch() == self.batch_size:
+            pass
+
+    async def dispatch_batch(self) -> int:
+        events = await self.claim_batch()
+        if not events:
+            return 0
+        processed, failed = [], []
+        for event in events:
+            error = await self.handle(event)
+            if error is None:
+                processed.append(event.id)
+            else:
+                failed.append({
+                    'id': event.id,
+                    'last_error': error,
+                    # Попытки исчерпаны: без паузы, событие сразу считается мёртвым
+                    'available_at': datetime.utcnow() + (
+                        retry_delay(event.attempts) if event.attempts < self.max_attempts else timedelta()
+                    ),
+                })
+        await self.record_results(processed, failed)
+        return len(events)
+
+    async def claim_batch(self) -> list:
+        # Пачка забирается короткой транзакцией: available_at сдвигается на время аренды, и другие
+        # воркеры её не видят. Обработчики работают уже без транзакции, не держа соединение
+        # и блокировки строк; если воркер упадёт, события вернутся в очередь по истечении аренды.
+        # Попытка засчитывается при захвате: событие, которое роняет воркер, не будет
+        # забираться бесконечно, а после OUTBOX_MAX_ATTEMPTS захватов останется в очереди мёртвым.
+        async with models.Session() as session:
+            now = datetime.utcnow()
+            # SKIP LOCKED: воркеры забирают разные события, не дожидаясь друг друга
+            batch = (
+                select(models.TicketEvent.id)
+                .where(
+                    models.TicketEvent.processed_at.is_(None),
+                    models.TicketEvent.available_at <= now,
+                    models.TicketEvent.attempts < self.max_attempts,
+                )
+                .order_by(models.TicketEvent.available_at, models.TicketEvent.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            result = await session.execute(
+                update(models.TicketEvent)
+                .where(models.TicketEvent.id.in_(batch.scalar_subquery()))
+                .values(
+                    available_at=now + timedelta(seconds=self.lease_sec),
+                    attempts=models.TicketEvent.attempts + 1,
+                )
+                .returning(
+                    models.TicketEvent.id,
+                    models.TicketEvent.ticket_id,
+                    models.TicketEvent.event_type,
+                    models.TicketEvent.payload,
+                    models.TicketEvent.attempts,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            events = sorted(result.all(), key=lambda event: event.id)
+            await session.commit()
+        return events
+
+    async def record_results(self, processed: list[int], failed: list[dict]):
+        async with models.Session() as session:
+            if processed:
+                await session.execute(
+                    update(models.TicketEvent)
+                    .where(models.TicketEvent.id.in_(processed))
+                    .values(processed_at=datetime.utcnow())
+                    .execution_options(synchronize_session=False)
+                )
+            if failed:
+                # ORM bulk UPDATE по первичному ключу: один executemany на все неудачи
+                await session.execute(update(models.TicketEvent), failed)
+            await session.commit()
+
+    async def handle(self, event) -> str | None:
+        # Возвращает текст ошибки или None, если все обработчики отработали
+        try:
+            payload = json.loads(event.payload)
+            for handler in self.handlers.get(event.event_type, []):
+                await handler(event, payload)
+        except Exception as err:
+            self.counters[f'{event.event_type}:failed'] += 1
+            logger.warning('Не удалось обработать событие', exc_info=True, extra={'fields': {
+                'event_id': event.id,
+                'event_type': event.event_type,
+                'attempts': event.attempts,
+            }})
+            return repr(err)
+        self.counters[f'{event.event_type}:processed'] += 1
+        return None
+
+    async def purge_processed(self):
+        async with models.Session() as session:
+            await session.execute(
+                delete(models.TicketEvent).where(
+                    models.TicketEvent.processed_at < datetime.utcnow() - timedelta(seconds=self.retention_sec)
+                )
+            )
+            await session.commit()
+
+    async def stats(self) -> dict:
+        # Последняя попытка, пока идёт её аренда, ещё не мёртвая
+        dead = (models.TicketEvent.attempts >= self.max_attempts) & (models.TicketEvent.available_at <= datetime.utcnow())
+        async with models.Session() as session:
+            result = await session.execute(
+                select(
+                    func.count().filter(~dead),
+                    func.count().filter(dead),
+                    func.min(models.TicketEvent.created_at),
+                ).where(models.TicketEvent.processed_at.is_(None))
+            )
+            pending, dead, oldest = result.one()
+        return {
+            'pending': pending,
+            'dead': dead,
+            'oldest_pending_age_sec': round((datetime.utcnow() - oldest).total_seconds(), 3) if oldest else None,
+            'counters': dict(self.counters),
+        }
+
+
+outbox = OutboxDispatcher(
+    batch_size=config.OUTBOX_BATCH_SIZE,
+    max_attempts=config.OUTBOX_MAX_ATTEMPTS,
+    retention_sec=config.OUTBOX_RETENTION_SEC,
+    lease_sec=config.OUTBOX_LEASE_SEC,
+)
+outbox.register(TICKET_BOOKED, render_qr)
+outbox.register(TICKET_BOOKED, send_confirmation_email)
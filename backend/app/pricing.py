@@ -0,0 +1,128 @@
+import time
+from types import MappingProxyType
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import config
+from . import models
+from .hall_layout import hall_layouts
+
+
+def default_price(seat_type: str | None, price_standard: float, price_vip: float) -> float:
+    if (seat_type or '').lower() == 'vip':
+        return price_vip
+    # по умолчанию считаем standard
+    return price_standard
+
+
+# Неизменяемая таблица цен сеанса: seat_id -> итоговая цена.
+# Цены по типу места из сеанса, поверх — явные цены мест из таблицы prices.
+class PriceTable:
+    __slots__ = ('seance_id', 'hall_id', 'price_standard', 'price_vip', 'prices', 'built_at')
+
+    def __init__(self, seance_id: int, hall_id: int, price_standard: float, price_vip: float, prices: dict[int, float]):
+        self.seance_id = seance_id
+        self.hall_id = hall_id
+        self.price_standard = price_standard
+        self.price_vip = price_vip
+        self.prices = MappingProxyType(prices)
+        self.built_at = time.monotonic()
+
+    def price_for(self, seat_id: int) -> float | None:
+        return self.prices.get(seat_id)
+
+    @property
+    def dict(self):
+        return {
+            'seance_id': self.seance_id,
+            'hall_id': self.hall_id,
+            'price_standard': self.price_standard,
+            'price_vip': self.price_vip,
+            'prices': dict(self.prices),
+        }
+
+
+async def build_price_table(session: AsyncSession, seance_id: int) -> PriceTable:
+    seance_result = await session.execute(
+        select(
+            models.Seance.hall_id,
+            models.Seance.price_standard,
+            models.Seance.price_vip,
+            models.Hall.layout_version,
+        )
+        .join(models.Hall, models.Hall.id == models.Seance.hall_id)
+        .where(models.Seance.id == seance_id)
+    )
+    seance_row = seance_result.first()
+    if seance_row is None:
+        raise HTTPException(404, 'Seance not found')
+
+    # Места зала — из кэша схемы, без запроса к таблице мест
+    hall_layout = await hall_layouts.get(session, seance_row.hall_id, seance_row.layout_version)
+    prices = {
+        seat_id: default_price(seat_type, seance_row.price_standard, seance_row.price_vip)
+        for seat_id, seat_type in zip(hall_layout.seat_ids, hall_layout.seat_types)
+    }
+
+    overrides_result = await session.execute(
+        select(models.Price.seat_id, models.Price.price).where(models.Price.seance_id == seance_id)
+    )
+    for seat_id, price in overrides_result.all():
+        if seat_id in prices:
+            prices[seat_id] = price
+
+    return PriceTable(seance_id, seance_row.hall_id, seance_row.price_standard, seance_row.price_vip, prices)
+
+
+# Кэш таблиц цен в памяти процесса. Сбрасывается при изменении цен, сеансов и мест;
+# TTL страхует от изменений, сделанных другими воркерами. Кэш только для показа цен:
+# цена билета при бронировании читается из БД (booking_price).
+class PricingEngine:
+    def __init__(self, ttl_sec: float):
+        self.ttl_sec = ttl_sec
+        self._tables: dict[int, PriceTable] = {}
+
+    async def get_table(self, session: AsyncSession, seance_id: int) -> PriceTable:
+        table = self._tables.get(seance_id)
+        if table is not None and time.monotonic() - table.built_at < self.ttl_sec:
+            return table
+        table = await build_price_table(session, seance_id)
+        self._tables[seance_id] = table
+        return table
+
+    async def quote(self, session: AsyncSession, seance_id: int, seat_id: int) -> float:
+        table = await self.get_table(session, seance_id)
+        price = table.price_for(seat_id)
+        if price is None:
+            raise HTTPException(404, 'Seat not found')
+        return price
+
+    async def booking_price(self, session: AsyncSession, seance: models.Seance, seat: models.Seat) -> float:
+        # Цена для билета — не из кэша: таблица другого воркера может быть старше правки цен
+        # админом (до PRICE_TABLE_TTL_SEC). Сеанс и место бронирование уже прочитало из БД,
+        # поэтому остаётся только явная цена места
+        result = await session.execute(
+            select(models.Price.price)
+            .where(models.Price.seance_id == seance.id, models.Price.seat_id == seat.id)
+            .order_by(models.Price.id.desc())
+            .limit(1)
+        )
+        price = result.scalar_one_or_none()
+        if price is not None:
+            return price
+        return default_price(seat.seat_type, seance.price_standard, seance.price_vip)
+
+    def invalidate(self, seance_id: int | None = None):
+        if seance_id is None:
+            self._tables.clear()
+        else:
+            self._tables.pop(seance_id, None)
+
+    def invalidate_hall(self, hall_id: int):
+        for seance_id, table in list(self._tables.items()):
+            if table.hall_id == hall_id:
+                self._tables.pop(seance_id, None)
+
+
+pricing = PricingEngine(ttl_sec=config.PRICE_TABLE_TTL_SEC)
@@ -0,0 +1,16 @@
+from pathlib import Path
+
+from . import config
+
+
+def ensure_qr_dir():
+    config.QR_CODES_DIR.mkdir(parents=True, exist_ok=True)
+
+
+def save_qr_code(data: str, file_name: str) -> Path:
+    # qrcode тянет за собой PIL: импортируем при первом билете, а не при старте процесса
+    import qrcode
+
+    path = config.QR_CODES_DIR / file_name
+    qrcode.make(data).save(path)
+    return path
@@ -0,0 +1,213 @@
+from datetime import datetime
+from sqlalchemy import select, func, and_, literal, Float, cast
+
+from . import models
+from .serialization import seat_info, seance_info, ticket_row
+
+
+TICKET_COLUMNS = (
+    models.Ticket.id,
+    models.Ticket.seance_id,
+    models.Ticket.seat_id,
+    models.Ticket.user_id,
+    models.Ticket.user_name,
+    models.Ticket.user_phone,
+    models.Ticket.user_email,
+    models.Ticket.booked,
+    models.Ticket.booking_code,
+    models.Ticket.qr_code_data,
+    models.Ticket.created_at,
+    models.Ticket.price,
+    models.Ticket.archived,
+)
+
+SORT_COLUMNS = {
+    'id': models.Ticket.id,
+    'created_at': models.Ticket.created_at,
+    'price': models.Ticket.price,
+    'start_time': models.Seance.start_time,
+}
+
+
+class TicketFilters:
+    def __init__(
+        self,
+        date_from: datetime | None = None,
+        date_to: datetime | None = None,
+        date_field: str = 'seance',
+        hall_id: int | None = None,
+        film_id: int | None = None,
+        archived: bool | None = None,
+    ):
+        self.date_from = date_from
+        self.date_to = date_to
+        self.date_field = date_field
+        self.hall_id = hall_id
+        self.film_id = film_id
+        self.archived = archived
+
+    def seance_conditions(self) -> list:
+        conditions = []
+        if self.hall_id:
+            conditions.append(models.Seance.hall_id == self.hall_id)
+        if self.film_id:
+            conditions.append(models.Seance.film_id == self.film_id)
+        if self.date_field == 'seance':
+            conditions.extend(self._date_conditions(models.Seance.start_time))
+        return conditions
+
+    def ticket_conditions(self) -> list:
+        conditions = []
+        if self.archived is not None:
+            conditions.append(models.Ticket.archived == self.archived)
+        if self.date_field == 'created':
+            conditions.extend(self._date_conditions(models.Ticket.created_at))
+        return conditions
+
+    def _date_conditions(self, column) -> list:
+        conditions = []
+        if self.date_from is not None:
+            conditions.append(column >= self.date_from)
+        if self.date_to is not None:
+            conditions.append(column < self.date_to)
+        return conditions
+
+
+def ticket_rows_query(filters: TicketFilters):
+    # Один запрос вместо трёх: билеты сразу с местом и сеансом
+    return (
+        select(
+            *TICKET_COLUMNS,
+            models.Seat.hall_id.label('seat_hall_id'),
+            models.Seat.row_number,
+            models.Seat.seat_number,
+            models.Seat.seat_type,
+            models.Seance.hall_id.label('seance_hall_id'),
+            models.Seance.film_id,
+            models.Seance.start_time,
+            models.Seance.price_standard,
+            models.Seance.price_vip,
+        )
+        .outerjoin(models.Seat, models.Seat.id == models.Ticket.seat_id)
+        .outerjoin(models.Seance, models.Seance.id == models.Ticket.seance_id)
+        .where(*filters.ticket_conditions(), *filters.seance_conditions())
+    )
+
+
+def ticket_page_query(filters: TicketFilters, sort: str, order: str, limit: int, offset: int):
+    sort_column = SORT_COLUMNS[sort]
+    sort_column = sort_column.desc() if order == 'desc' else sort_column.asc()
+    # Общее количество строк считается оконной функцией в том же запросе
+    return (
+        ticket_rows_query(filters)
+        .add_columns(func.count().over().label('total'))
+        .order_by(sort_column, models.Ticket.id)
+        .limit(limit)
+        .offset(offset)
+    )
+
+
+def joined_ticket(row, seances: dict[int, dict | None]) -> dict:
+    seat = None
+    if row['row_number'] is not None:
+        seat = seat_info({
+            'id': row['seat_id'],
+            'hall_id': row['seat_hall_id'],
+            'row_number': row['row_number'],
+            'seat_number': row['seat_number'],
+            'seat_type': row['seat_type'],
+        })
+    # У билетов одного сеанса его описание общее: start_time форматируется один раз на сеанс
+    seance_id = row['seance_id']
+    if seance_id not in seances:
+        seances[seance_id] = seance_info({
+            'id': seance_id,
+            'hall_id': row['seance_hall_id'],
+            'film_id': row['film_id'],
+            'start_time': row['start_time'],
+            'price_standard': row['price_standard'],
+            'price_vip': row['price_vip'],
+        }) if row['film_id'] is not None else None
+    return ticket_row(row, seat, seances[seance_id])
+
+
+def joined_tickets(rows) -> list[dict]:
+    seances = {}
+    return [joined_ticket(row, seances) for row in rows]
+
+
+def aggregate_query(filters: TicketFilters, group_by: str):
+    # Сначала агрегат по сеансам (включая сеансы без продаж), затем свёртка по фильму или дню
+    ticket_join = and_(
+        models.Ticket.seance_id == models.Seance.id,
+        models.Ticket.booked == True,
+        *filters.ticket_conditions(),
+    )
+    # Вместимость — число мест зала, а не rows * seats_per_row: в схеме бывают проходы
+    hall_seats = (
+        select(models.Seat.hall_id, func.count().label('seats'))
+        .group_by(models.Seat.hall_id)
+        .subquery()
+    )
+    capacity = func.coalesce(hall_seats.c.seats, 0)
+    per_seance = (
+        select(
+            models.Seance.id.label('seance_id'),
+            models.Seance.film_id,
+            models.Seance.hall_id,
+            models.Seance.start_time,
+            func.date(models.Seance.start_time).label('day'),
+            capacity.label('capacity'),
+            func.count(models.Ticket.id).label('tickets'),
+            func.coalesce(func.sum(models.Ticket.price), 0).label('revenue'),
+        )
+        .outerjoin(hall_seats, hall_seats.c.hall_id == models.Seance.hall_id)
+        .outerjoin(models.Ticket, ticket_join)
+        .where(*filters.seance_conditions())
+        .group_by(models.Seance.id, hall_seats.c.seats)
+    )
+    if group_by == 'seance':
+        per_seance = per_seance.subquery()
+        return select(
+            per_seance.c.seance_id.label('key'),
+            per_seance.c.film_id,
+            per_seance.c.hall_id,
+            per_seance.c.start_time,
+            literal(1).label('seances'),
+            per_seance.c.capacity,
+            per_seance.c.tickets,
+            per_seance.c.revenue,
+            (cast(per_seance.c.tickets, Float) / cast(func.nullif(per_seance.c.capacity, 0), Float)).label('occupancy'),
+        ).order_by(per_seance.c.start_time, per_seance.c.seance_id)
+
+    per_seance = per_seance.subquery()
+    key = per_seance.c.film_id if group_by == 'film' else per_seance.c.day
+    capacity = func.sum(per_seance.c.capacity)
+    tickets = func.sum(per_seance.c.tickets)
+    return (
+        select(
+            key.label('key'),
+            func.count(per_seance.c.seance_id).label('seances'),
+            capacity.label('capacity'),
+            tickets.label('tickets'),
+            func.sum(per_seance.c.revenue).label('revenue'),
+            (cast(tickets, Float) / cast(func.nullif(capacity, 0), Float)).label('occupancy'),
+        )
+        .group_by(key)
+        .order_by(key)
+    )
+
+
+def aggregate_row(row) -> dict:
+    key = row['key']
+    return {
+        'key': key.isoformat() if hasattr(key, 'isoformat') else key,
+        'film_id': row.get('film_id'),
+        'hall_id': row.get('hall_id'),
+        'start_time': row['start_time'].isoformat() if row.get('start_time') is not None else None,
+        'seances': row['seances'],
+        'capacity': row['capacity'] or 0,
+        'tickets': row['tickets'] or 0,
+        'revenue': float(row['revenue'] or 0),
+        'occupancy': float(row['occupancy'] or 0),
+    }
@@ -0,0 +1,143 @@
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import config
+from . import models
+
+
+SCHEDULE_MAX_DAYS = 31
+
+
+def schedule_query(date_from: datetime, date_to: datetime):
+    # Сеансы окна вместе с названием фильма и зала одним запросом (индекс по start_time)
+    return (
+        select(
+            models.Seance.id,
+            models.Seance.hall_id,
+            models.Seance.film_id,
+            models.Seance.start_time,
+            models.Seance.price_standard,
+            models.Seance.price_vip,
+            models.Film.title,
+            models.Film.duration,
+            models.Film.poster_url,
+            models.Hall.name.label('hall_name'),
+        )
+        .join(models.Film, models.Film.id == models.Seance.film_id)
+        .join(models.Hall, models.Hall.id == models.Seance.hall_id)
+        .where(models.Seance.start_time >= date_from, models.Seance.start_time < date_to)
+        .order_by(models.Seance.start_time, models.Seance.id)
+    )
+
+
+def schedule_row(row) -> dict:
+    return {
+        'id': row['id'],
+        'hall_id': row['hall_id'],
+        'film_id': row['film_id'],
+        'start_time': row['start_time'],
+        'price_standard': row['price_standard'],
+        'price_vip': row['price_vip'],
+        'title': row['title'],
+        'duration': row['duration'],
+        'poster_url': row['poster_url'],
+        'hall_name': row['hall_name'],
+    }
+
+
+def group_by_day_and_film(rows: list[dict]) -> list[dict]:
+    # rows уже отсортированы по началу сеанса: порядок дней и фильмов — по первому сеансу
+    days: dict[date, dict[int, dict]] = {}
+    for row in rows:
+        films = days.setdefault(row['start_time'].date(), {})
+        film = films.get(row['film_id'])
+        if film is None:
+            film = films[row['film_id']] = {
+                'film_id': row['film_id'],
+                'title': row['title'],
+                'duration': row['duration'],
+                'poster_url': row['poster_url'],
+                'seances': [],
+            }
+        film['seances'].append({
+            'id': row['id'],
+            'hall_id': row['hall_id'],
+            'hall_name': row['hall_name'],
+            'start_time': row['start_time'].isoformat(),
+            'end_time': (row['start_time'] + timedelta(minutes=row['duration'] or 0)).isoformat(),
+            'price_standard': row['price_standard'],
+            'price_vip': row['price_vip'],
+        })
+    return [
+        {'date': day.isoformat(), 'films': list(films.values())}
+        for day, films in days.items()
+    ]
+
+
+# Расписание кэшируется по дням (все сеансы дня без фильтров); фильтры и границы окна
+# применяются к закэшированным строкам. Изменения сеансов сбрасывают свои дни,
+# изменения фильмов и залов — всё расписание.
+class ScheduleCache:
+    def __init__(self, ttl_sec: float):
+        self.ttl_sec = ttl_sec
+        self._days: dict[date, tuple[float, list[dict]]] = {}
+        # Меняется при каждом сбросе: результат загрузки, начатой до сброса, не кэшируем
+        self._generation = 0
+
+    async def get_rows(self, session: AsyncSession, date_from: datetime, date_to: datetime) -> list[dict]:
+        first_day = date_from.date()
+        last_day = (date_to - timedelta(microseconds=1)).date()
+        days = [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+
+        now = time.monotonic()
+        cached = {}
+        for day in days:
+            entry = self._days.get(day)
+            if entry is not None and entry[0] > now:
+                cached[day] = entry[1]
+
+        missing = [day for day in days if day not in cached]
+        if missing:
+            # Один запрос на весь диапазон недостающих дней
+            generation = self._generation
+            load_from = datetime.combine(missing[0], datetime.min.time())
+            load_to = datetime.combine(missing[-1] + timedelta(days=1), datetime.min.time())
+            result = await session.execute(schedule_query(load_from, load_to))
+            loaded: dict[date, list[dict]] = {day: [] for day in missing}
+            for row in result.mappings():
+                day_rows = loaded.get(row['start_time'].date())
+                if day_rows is not None:
+                    day_rows.append(schedule_row(row))
+            self._prune(now)
+            expires_at = time.monotonic() + self.ttl_sec
+            for day, day_rows in loaded.items():
+                if generation == self._generation:
+                    self._days[day] = (expires_at, day_rows)
+                cached[day] = day_rows
+
+        return [
+            row
+            for day in days
+            for row in cached[day]
+            if date_from <= row['start_time'] < date_to
+        ]
+
+    def _prune(self, now: float):
+        for day in [day for day, (expires_at, _) in self._days.items() if expires_at <= now]:
+            del self._days[day]
+
+    def invalidate_day(self, *moments: datetime | None):
+        self._generation += 1
+        for moment in moments:
+            if moment is not None:
+                self._days.pop(moment.date(), None)
+
+    def invalidate(self):
+        self._generation += 1
+        self._days.clear()
+
+
+schedule_cache = ScheduleCache(ttl_sec=config.SCHEDULE_CACHE_TTL_SEC)
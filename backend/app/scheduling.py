@@ -0,0 +1,232 @@
+import heapq
+from bisect import bisect_right
+from datetime import date, datetime, time, timezone, timedelta
+from fastapi import HTTPException
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+
+
+def normalize_datetime(value: datetime) -> datetime:
+    if value is None:
+        return value
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+async def max_film_duration(session: AsyncSession) -> int:
+    result = await session.execute(select(func.max(models.Film.duration)))
+    return result.scalar() or 0
+
+
+def hall_seances_query(hall_ids: list[int], window_from: datetime, window_to: datetime, longest_minutes: int):
+    # Сеанс пересекает окно, только если начался не раньше чем за длительность самого длинного фильма:
+    # так запрос идёт по индексу (hall_id, start_time) и не читает всю историю зала
+    return (
+        select(models.Seance.id, models.Seance.hall_id, models.Seance.start_time, models.Film.id.label('film_id'),
+               models.Film.title, models.Film.duration)
+        .join(models.Film, models.Film.id == models.Seance.film_id)
+        .where(
+            models.Seance.hall_id.in_(hall_ids),
+            models.Seance.start_time > window_from - timedelta(minutes=longest_minutes),
+            models.Seance.start_time < window_to,
+        )
+        .order_by(models.Seance.hall_id, models.Seance.start_time)
+    )
+
+
+async def ensure_no_overlapping_seances(
+    session: AsyncSession,
+    hall_id: int,
+    start_time: datetime,
+    duration_minutes: int,
+    exclude_seance_id: int | None = None,
+):
+    if duration_minutes is None:
+        duration_minutes = 0
+
+    normalized_start = normalize_datetime(start_time)
+    new_end = normalized_start + timedelta(minutes=duration_minutes)
+
+    longest = await max_film_duration(session)
+    stmt = hall_seances_query([hall_id], normalized_start, new_end, longest)
+    if exclude_seance_id is not None:
+        stmt = stmt.where(models.Seance.id != exclude_seance_id)
+
+    result = await session.execute(stmt)
+    for existing in result.mappings():
+        existing_start = normalize_datetime(existing['start_time'])
+        existing_end = existing_start + timedelta(minutes=existing['duration'] or 0)
+
+        if normalized_start < existing_end and existing_start < new_end:
+            conflict_start = existing_start.strftime('%d.%m %H:%M')
+            conflict_title = existing['title'] or f'ID {existing["film_id"]}'
+            raise HTTPException(
+                status_code=400,
+                detail=f'Сеанс пересекается с фильмом "{conflict_title}" (начало {conflict_start}). Выберите другое время.'
+            )
+
+
+def find_overlaps(intervals: list[tuple], gap: timedelta = timedelta(0)) -> list[tuple]:
+    # intervals: (hall_id, start, end, ref). Сортировка + один проход по каждому залу: O(n log n).
+    # Сравниваем с сеансом, который заканчивается позже всех предыдущих, поэтому вложенные
+    # интервалы тоже находятся.
+    conflicts = []
+    latest = None
+    for interval in sorted(intervals, key=lambda item: (item[0], item[1])):
+        if latest is None or latest[0] != interval[0]:
+            latest = interval
+            continue
+        if interval[1] < latest[2] + gap:
+            conflicts.append((latest, interval))
+        if interval[2] > latest[2]:
+            latest = interval
+    return conflicts
+
+
+def round_up(moment: datetime, origin: datetime, slot: timedelta) -> datetime:
+    steps = -(-(moment - origin) // slot)
+    return origin + max(steps, 0) * slot
+
+
+class HallTimeline:
+    # Занятые интервалы зала (уже сохранённые сеансы), отсортированные по началу
+    def __init__(self, busy: list[tuple[datetime, datetime]]):
+        self.busy = sorted(busy)
+        self.ends = [end for _, end in self.busy]
+
+    def earliest_start(self, start: datetime, duration: timedelta, cleaning: timedelta, origin: datetime, slot: timedelta) -> datetime:
+        index = bisect_right(self.ends, start - cleaning)
+        for busy_start, busy_end in self.busy[index:]:
+            if start + duration + cleaning <= busy_start:
+                break
+            if busy_end + cleaning > start:
+                start = round_up(busy_end + cleaning, origin, slot)
+        return start
+
+
+def build_schedule(
+    days: list[date],
+    hall_ids: list[int],
+    films: list,
+    durations: dict[int, int],
+    opening: time,
+    closing: time,
+    cleaning: timedelta,
+    slot: timedelta,
+    busy: dict[int, list[tuple[datetime, datetime]]],
+) -> tuple[list[dict], list[dict]]:
+    # Жадная раскладка по дням: залы лежат в куче по времени, когда они освобождаются;
+    # освободившийся зал получает фильм с наибольшим числом ещё не поставленных показов,
+    # который успевает закончиться до закрытия. Уже сохранённые сеансы обходятся.
+    timelines = {hall_id: HallTimeline(busy.get(hall_id, [])) for hall_id in hall_ids}
+    order = {film.film_id: position for position, film in enumerate(films)}
+    planned, unplaced = [], []
+
+    for day in days:
+        day_open = datetime.combine(day, opening)
+        day_close = datetime.combine(day, closing)
+        if day_close <= day_open:
+            day_close += timedelta(days=1)
+
+        remaining = {film.film_id: film.showings_per_day for film in films}
+        free_halls = [(day_open, hall_id) for hall_id in hall_ids]
+        heapq.heapify(free_halls)
+        while free_halls and any(remaining.values()):
+            free_at, hall_id = heapq.heappop(free_halls)
+            timeline = timelines[hall_id]
+            candidates = sorted(
+                (film for film in films if remaining[film.film_id]),
+                key=lambda film: (-remaining[film.film_id], order[film.film_id]),
+            )
+            for film in candidates:
+                duration = timedelta(minutes=durations[film.film_id])
+                start = timeline.earliest_start(round_up(free_at, day_open, slot), duration, cleaning, day_open, slot)
+                if start + duration <= day_close:
+                    break
+            else:
+                # Ни один из оставшихся фильмов не помещается до закрытия: зал на сегодня заполнен
+                continue
+
+            remaining[film.film_id] -= 1
+            planned.append({
+                'hall_id': hall_id,
+                'film_id': film.film_id,
+                'start_time': start,
+                'end_time': start + duration,
+                'price_standard': film.price_standard,
+                'price_vip': film.price_vip,
+            })
+            heapq.heappush(free_halls, (start + duration + cleaning, hall_id))
+
+        unplaced.extend(
+            {'date': day, 'film_id': film_id, 'count': count}
+            for film_id, count in remaining.items() if count
+        )
+    return planned, unplaced
+
+
+async def plan_schedule(session: AsyncSession, request) -> tuple[list[dict], list[dict]]:
+    film_ids = [film.film_id for film in request.films]
+    result = await session.execute(select(models.Film.id, models.Film.duration).where(models.Film.id.in_(film_ids)))
+    durations = dict(result.all())
+    missing = set(film_ids) - durations.keys()
+    if missing:
+        raise HTTPException(404, f'Films not found: {sorted(missing)}')
+    result = await session.execute(select(models.Hall.id).where(models.Hall.id.in_(request.hall_ids)))
+    missing = set(request.hall_ids) - set(result.scalars().all())
+    if missing:
+        raise HTTPException(404, f'Halls not found: {sorted(missing)}')
+
+    days = [request.date_from + timedelta(days=offset) for offset in range(request.days)]
+    window_from = datetime.combine(days[0], request.opening_time)
+    window_to = datetime.combine(days[-1] + timedelta(days=2), time.min)
+    # Уже сохранённые сеансы этих залов в окне — одним запросом
+    result = await session.execute(hall_seances_query(request.hall_ids, window_from, window_to, await max_film_duration(session)))
+    busy: dict[int, list[tuple[datetime, datetime]]] = {}
+    for row in result.mappings():
+        start = normalize_datetime(row['start_time'])
+        busy.setdefault(row['hall_id'], []).append((start, start + timedelta(minutes=row['duration'] or 0)))
+
+    return build_schedule(
+        days,
+        list(dict.fromkeys(request.hall_ids)),
+        list({film.film_id: film for film in request.films}.values()),
+        durations,
+        request.opening_time,
+        request.closing_time,
+        timedelta(minutes=request.cleaning_minutes),
+        timedelta(minutes=request.slot_minutes),
+        busy,
+    )
+
+
+async def validate_schedule(session: AsyncSession, request) -> list[tuple]:
+    film_ids = {seance.film_id for seance in request.seances}
+    result = await session.execute(select(models.Film.id, models.Film.duration).where(models.Film.id.in_(film_ids)))
+    durations = dict(result.all())
+    missing = film_ids - durations.keys()
+    if missing:
+        raise HTTPException(404, f'Films not found: {sorted(missing)}')
+
+    intervals = []
+    for seance in request.seances:
+        start = normalize_datetime(seance.start_time)
+        intervals.append((seance.hall_id, start, start + timedelta(minutes=durations[seance.film_id] or 0), seance))
+
+    if request.include_existing:
+        submitted_ids = {seance.id for seance in request.seances if seance.id is not None}
+        hall_ids = list({seance.hall_id for seance in request.seances})
+        window_from = min(interval[1] for interval in intervals)
+        window_to = max(interval[2] for interval in intervals) + timedelta(minutes=request.cleaning_minutes)
+        result = await session.execute(hall_seances_query(hall_ids, window_from, window_to, await max_film_duration(session)))
+        for row in result.mappings():
+            if row['id'] in submitted_ids:
+                continue
+            start = normalize_datetime(row['start_time'])
+            existing = {'id': row['id'], 'hall_id': row['hall_id'], 'film_id': row['film_id'], 'start_time': start}
+            intervals.append((row['hall_id'], start, start + timedelta(minutes=row['duration'] or 0), existing))
+
+    return find_overlaps(intervals, timedelta(minutes=request.cleaning_minutes))
@@ -1,17 +1,24 @@
 from pydantic import BaseModel, EmailStr, Field
 from typing import Literal
 import uuid
-from datetime import datetime
+from datetime import date, datetime, time
 
 
 class SuccessResponse(BaseModel):
     status: Literal['success']
 
+# Удаление с зависимыми строками: число строк по таблицам (при dry_run — сколько было бы удалено)
+class DeletionResponse(SuccessResponse):
+    dry_run: bool = False
+    rows: dict[str, int] = {}
+
 # Залы
 class CreateHallRequest(BaseModel):
     name: str = Field(min_length=1, max_length=100)
     rows: int = Field(gt=0)
     seats_per_row: int = Field(gt=0)
+    # схема зала (см. UpdateHallLayoutRequest): места создаются из неё сразу, rows/seats_per_row берутся из схемы
+    grid: list[str] | None = None
 
 class UpdateHallRequest(BaseModel):
     name: str | None = Field(None, min_length=1, max_length=100)
@@ -36,7 +43,7 @@ class GetHallResponse(BaseModel):
 class GetHallsResponse(BaseModel):
     halls: list[GetHallResponse]
 
-class DeleteHallResponse(SuccessResponse):
+class DeleteHallResponse(DeletionResponse):
     pass
 
 # Пользователи
@@ -104,7 +111,7 @@ class GetFilmResponse(BaseModel):
 class GetFilmsResponse(BaseModel):
     films: list[GetFilmResponse]
 
-class DeleteFilmResponse(SuccessResponse):
+class DeleteFilmResponse(DeletionResponse):
     pass
 
 # Сеансы
@@ -139,7 +146,7 @@ class GetSeanceResponse(BaseModel):
 class GetSeancesResponse(BaseModel):
     seances: list[GetSeanceResponse]
 
-class DeleteSeanceResponse(SuccessResponse):
+class DeleteSeanceResponse(DeletionResponse):
     pass
 
 # Цены
@@ -170,6 +177,96 @@ class GetPricesResponse(BaseModel):
 class DeletePriceResponse(SuccessResponse):
     pass
 
+class GetSeancePricesResponse(BaseModel):
+    seance_id: int
+    hall_id: int
+    price_standard: float
+    price_vip: float
+    prices: dict[int, float]
+
+class ScheduleSeance(BaseModel):
+    id: int
+    hall_id: int
+    hall_name: str
+    start_time: datetime
+    end_time: datetime
+    price_standard: float
+    price_vip: float
+
+class ScheduleFilm(BaseModel):
+    film_id: int
+    title: str
+    duration: int
+    poster_url: str | None = None
+    seances: list[ScheduleSeance]
+
+class ScheduleDay(BaseModel):
+    date: date
+    films: list[ScheduleFilm]
+
+class GetScheduleResponse(BaseModel):
+    date_from: datetime
+    date_to: datetime
+    days: list[ScheduleDay]
+
+class ScheduleFilmDemand(BaseModel):
+    film_id: int
+    showings_per_day: int = Field(ge=1, le=50)
+    price_standard: float
+    price_vip: float
+
+class BuildScheduleRequest(BaseModel):
+    date_from: date
+    days: int = Field(7, ge=1, le=14)
+    hall_ids: list[int] = Field(min_length=1, max_length=100)
+    films: list[ScheduleFilmDemand] = Field(min_length=1, max_length=200)
+    opening_time: time = time(10, 0)
+    # Последний сеанс должен закончиться до закрытия; время раньше открытия означает следующие сутки
+    closing_time: time = time(23, 59)
+    cleaning_minutes: int = Field(15, ge=0, le=240)
+    slot_minutes: int = Field(5, ge=1, le=60)
+    dry_run: bool = False
+
+class PlannedSeance(BaseModel):
+    id: int | None = None
+    hall_id: int
+    film_id: int
+    start_time: datetime
+    end_time: datetime
+    price_standard: float
+    price_vip: float
+
+class UnplacedShowings(BaseModel):
+    date: date
+    film_id: int
+    count: int
+
+class BuildScheduleResponse(BaseModel):
+    created: int
+    seances: list[PlannedSeance]
+    unplaced: list[UnplacedShowings]
+
+class ValidateScheduleSeance(BaseModel):
+    id: int | None = None
+    hall_id: int
+    film_id: int
+    start_time: datetime
+
+class ValidateScheduleRequest(BaseModel):
+    seances: list[ValidateScheduleSeance] = Field(min_length=1, max_length=20000)
+    cleaning_minutes: int = Field(0, ge=0, le=240)
+    # Проверять и пересечения с уже сохранёнными сеансами (сеансы с id из запроса заменяют сохранённые)
+    include_existing: bool = True
+
+class ScheduleConflict(BaseModel):
+    hall_id: int
+    first: ValidateScheduleSeance
+    second: ValidateScheduleSeance
+
+class ValidateScheduleResponse(BaseModel):
+    valid: bool
+    conflicts: list[ScheduleConflict]
+
 # Места
 class CreateSeatRequest(BaseModel):
     hall_id: int
@@ -213,6 +310,47 @@ class GetAvailableSeatsResponse(BaseModel):
     total_seats: int
     booked_seats: int
     available_count: int 
+
+class GetHallLayoutResponse(BaseModel):
+    hall_id: int
+    rows: int
+    seats_per_row: int
+    version: int
+    seats: list[tuple[int, int, int, str | None]]
+    grid: list[str] | None = None
+
+class UpdateHallLayoutRequest(BaseModel):
+    # строки схемы: S — обычное место, V — VIP, _ — проход, . — места нет
+    grid: list[str] = Field(min_length=1)
+
+class UpdateHallLayoutResponse(BaseModel):
+    hall_id: int
+    rows: int
+    seats_per_row: int
+    layout_version: int
+    created: int
+    updated: int
+    deleted: int
+
+class GetSeatBitmapResponse(BaseModel):
+    seance_id: int
+    hall_id: int
+    layout_version: int
+    version: int
+    total_seats: int
+    available_count: int
+    bitmap: str
+
+class BestSeatsBlock(BaseModel):
+    score: float
+    row_number: int
+    seats: list[GetSeatResponse]
+
+class GetBestSeatsResponse(BaseModel):
+    seance_id: int
+    count: int
+    seat_type: str | None
+    blocks: list[BestSeatsBlock]
     
 # бронирования
 class CreateBookingRequest(BaseModel):
@@ -290,6 +428,7 @@ class GetTicketResponse(BaseModel):
     seat_info: TicketSeatInfo | None = None
     seance_info: TicketSeanceInfo | None = None
     archived: bool
+    checked_in_at: datetime | None = None
 
 class GetTicketsResponse(BaseModel):
     tickets: list[GetTicketResponse]
@@ -297,6 +436,45 @@ class GetTicketsResponse(BaseModel):
 class DeleteTicketResponse(SuccessResponse):
     pass
 
+# проход по билету на входе в зал
+class GetTicketByCodeResponse(BaseModel):
+    id: int
+    booking_code: str
+    seance_id: int
+    seat_id: int
+    row_number: int
+    seat_number: int
+    seat_type: str | None = None
+    user_name: str | None = None
+    booked: bool
+    archived: bool
+    checked_in_at: datetime | None = None
+
+class CheckInTicketResponse(GetTicketByCodeResponse):
+    pass
+
+# Отчёты по билетам
+class GetTicketReportResponse(BaseModel):
+    total: int
+    limit: int
+    offset: int
+    tickets: list[GetTicketResponse]
+
+class TicketAggregateRow(BaseModel):
+    key: int | str
+    film_id: int | None = None
+    hall_id: int | None = None
+    start_time: datetime | None = None
+    seances: int
+    capacity: int
+    tickets: int
+    revenue: float
+    occupancy: float
+
+class GetTicketAggregateResponse(BaseModel):
+    group_by: Literal['seance', 'film', 'day']
+    rows: list[TicketAggregateRow]
+
 
 class ArchiveTicketRequest(BaseModel):
     archived: bool
@@ -309,3 +487,24 @@ class ArchiveTicketResponse(BaseModel):
 class DeleteUserResponse(SuccessResponse):
     pass
 
+
+
+# Пакетные операции администратора
+class BatchOperation(BaseModel):
+    op: Literal['create', 'update', 'delete']
+    entity: Literal['hall', 'seat', 'film', 'seance', 'price']
+    id: int | None = None
+    data: dict | None = None
+
+class BatchRequest(BaseModel):
+    operations: list[BatchOperation] = Field(min_length=1, max_length=5000)
+
+class BatchOperationResult(BaseModel):
+    index: int
+    op: str
+    entity: str
+    id: int
+    status: Literal['created', 'updated', 'deleted']
+
+class BatchResponse(BaseModel):
+    results: list[BatchOperationResult]
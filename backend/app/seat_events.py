@@ -0,0 +1,202 @@
+import asyncio
+import json
+import random
+from collections import defaultdict
+
+from sqlalchemy import text
+
+from . import config
+from . import models
+from .logger import get_logger
+
+logger = get_logger('seat_events')
+
+
+# Транспорт событий между воркерами. Брокер отдаёт ему события на публикацию,
+# а транспорт вызывает deliver(seance_id, event) для локальных подписчиков и resync(),
+# если события могли потеряться (подписчики переподключатся и получат свежий снимок).
+class SeatEventBackend:
+    async def start(self, deliver, resync):
+        raise NotImplementedError
+
+    async def stop(self):
+        pass
+
+    async def publish(self, seance_id: int, event: dict):
+        raise NotImplementedError
+
+
+# По умолчанию события живут внутри одного процесса
+class LocalSeatEventBackend(SeatEventBackend):
+    def __init__(self):
+        self._deliver = None
+
+    async def start(self, deliver, resync):
+        self._deliver = deliver
+
+    async def publish(self, seance_id: int, event: dict):
+        if self._deliver is not None:
+            self._deliver(seance_id, event)
+
+
+# Межпроцессная доставка через LISTEN/NOTIFY Postgres (asyncpg уже в зависимостях).
+# Слушает отдельное соединение; при его разрыве — переподключение с экспоненциальной паузой.
+# Публикация идёт через пул приложения, а не через соединение слушателя: бронирования
+# не выстраиваются в очередь за одним соединением и не ломаются, пока слушатель переподключается.
+class PostgresSeatEventBackend(SeatEventBackend):
+    CHANNEL = 'seat_events'
+
+    def __init__(self, dsn: str, reconnect_max_sec: float = 30):
+        self.dsn = dsn
+        self.reconnect_max_sec = reconnect_max_sec
+        self._conn = None
+        self._deliver = None
+        self._resync = None
+        self._reconnect_task: asyncio.Task | None = None
+        self._stopped = False
+
+    async def start(self, deliver, resync):
+        self._deliver = deliver
+        self._resync = resync
+        self._stopped = False
+        await self._listen()
+
+    async def stop(self):
+        self._stopped = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    async def publish(self, seance_id: int, event: dict):
+        payload = json.dumps({'seance_id': seance_id, 'event': event}, separators=(',', ':'))
+        async with models.get_engine().begin() as conn:
+            await conn.execute(text('SELECT pg_notify(:channel, :payload)'), {'channel': self.CHANNEL, 'payload': payload})
+
+    async def _listen(self):
+        import asyncpg
+
+        conn = await asyncpg.connect(self.dsn)
+        conn.add_termination_listener(self._on_terminate)
+        await conn.add_listener(self.CHANNEL, self._on_notify)
+        self._conn = conn
+
+    def _on_notify(self, connection, pid, channel, payload):
+        data = json.loads(payload)
+        self._deliver(data['seance_id'], data['event'])
+
+    def _on_terminate(self, connection):
+        if self._stopped or connection is not self._conn:
+            return
+        self._conn = None
+        self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self):
+        delay = 0.5
+        while not self._stopped:
+            try:
+                await self._listen()
+            except Exception as e:
+                logger.warning('Не удалось переподключить слушателя событий мест', extra={'fields': {
+                    'retry_in_sec': delay, 'error': str(e),
+                }})
+                await asyncio.sleep(delay * random.uniform(0.5, 1))
+                delay = min(delay * 2, self.reconnect_max_sec)
+                continue
+            logger.info('Слушатель событий мест переподключён')
+            # Пока соединения не было, события других воркеров не доходили
+            self._resync()
+            break
+        self._reconnect_task = None
+
+
+def format_sse(event_type: str, data: dict) -> str:
+    return f'event: {event_type}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+class SeatEventBroker:
+    def __init__(self, backend: SeatEventBackend, queue_size: int = 256, heartbeat_sec: float = 15):
+        self.backend = backend
+        self.queue_size = queue_size
+        self.heartbeat_sec = heartbeat_sec
+        self._subscribers: dict[int, set[asyncio.Queue]] = defaultdict(set)
+
+    async def start(self):
+        await self.backend.start(self._deliver, self._resync)
+
+    async def stop(self):
+        await self.backend.stop()
+        self._resync()
+
+    def _resync(self):
+        # Закрываем открытые потоки: клиенты переподключатся и получат свежий снимок
+        for queues in self._subscribers.values():
+            for queue in queues:
+                self._close_queue(queue)
+
+    def subscribe(self, seance_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[seance_id].add(queue)
+        return queue
+
+    def unsubscribe(self, seance_id: int, queue: asyncio.Queue):
+        queues = self._subscribers.get(seance_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[seance_id]
+
+    def subscribers_count(self, seance_id: int) -> int:
+        return len(self._subscribers.get(seance_id, ()))
+
+    async def publish(self, seance_id: int, event_type: str, seat_id: int, **extra):
+        event = {'type': event_type, 'seat_id': seat_id, **extra}
+        try:
+            await self.backend.publish(seance_id, event)
+        except Exception as e:
+            # Уведомления не должны ломать бронирование
+            logger.warning(
+                'Не удалось опубликовать событие',
+                extra={'fields': {'event': event_type, 'seance_id': seance_id, 'error': str(e)}},
+            )
+
+    def _deliver(self, seance_id: int, event: dict):
+        for queue in list(self._subscribers.get(seance_id, ())):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Медленный клиент: обрываем поток, после переподключения он получит новый снимок
+                self._close_queue(queue)
+
+    @staticmethod
+    def _close_queue(queue: asyncio.Queue):
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    async def stream(self, seance_id: int, queue: asyncio.Queue, snapshot: dict):
+        try:
+            yield format_sse('snapshot', snapshot)
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=self.heartbeat_sec)
+                except asyncio.TimeoutError:
+                    yield ': ping\n\n'
+                    continue
+                if event is None:
+                    break
+                yield format_sse(event['type'], event)
+        finally:
+            self.unsubscribe(seance_id, queue)
+
+
+def create_backend() -> SeatEventBackend:
+    if config.SEAT_EVENTS_BACKEND == 'postgres':
+        return PostgresSeatEventBackend(config.PG_NOTIFY_DSN, config.SEAT_EVENTS_RECONNECT_MAX_SEC)
+    return LocalSeatEventBackend()
+
+
+seat_events = SeatEventBroker(create_backend(), heartbeat_sec=config.SEAT_EVENTS_HEARTBEAT_SEC)
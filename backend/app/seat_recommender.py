@@ -0,0 +1,126 @@
+from itertools import repeat
+from math import ceil, floor
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .hall_layout import hall_layouts, seat_type_key
+
+
+# Насколько ряд дальше от центра хуже места, сдвинутого на одно кресло вбок
+ROW_WEIGHT = 1.5
+
+
+class HallGrid:
+    # Раскладка зала — плоская карта по байту на кресло: ряды подряд, позиция в ряду равна
+    # seat_number, нулевая позиция каждого ряда — разделитель. Поиск блока идёт по байтам
+    # через bytes.find/rfind, то есть целиком в C.
+    def __init__(self, hall_id: int, rows: int, seats_per_row: int, seats: list):
+        self.hall_id = hall_id
+        self.rows = rows
+        self.seats_per_row = seats_per_row
+        self.stride = max([seats_per_row] + [number for _, _, number, _ in seats]) + 1
+        row_numbers = sorted({row for _, row, _, _ in seats})
+        self.row_offsets = {row: index * self.stride for index, row in enumerate(row_numbers)}
+        self.size = len(row_numbers) * self.stride
+        # Ряды от центрального к крайним: в таком порядке идёт поиск
+        self.rows_by_distance = sorted(row_numbers, key=lambda row: abs(row - self.center_row))
+
+        self.index: dict[int, int] = {}
+        self.seats: dict[int, dict] = {}
+        # 1 — кресло нельзя предложить: его нет или у него другой тип
+        blocked = {None: bytearray(b'\x01') * self.size}
+        for seat_id, row, number, seat_type in seats:
+            position = self.row_offsets[row] + number
+            self.index[seat_id] = position
+            self.seats[position] = {'id': seat_id, 'row_number': row, 'seat_number': number, 'seat_type': seat_type}
+            blocked[None][position] = 0
+            type_key = seat_type_key(seat_type)
+            if type_key not in blocked:
+                blocked[type_key] = bytearray(b'\x01') * self.size
+            blocked[type_key][position] = 0
+        self.blocked = {key: int.from_bytes(value, 'little') for key, value in blocked.items()}
+
+    @classmethod
+    def from_layout(cls, hall_layout) -> 'HallGrid':
+        return cls(hall_layout.hall_id, hall_layout.rows, hall_layout.seats_per_row, hall_layout.seats)
+
+    @property
+    def center_row(self) -> float:
+        return (self.rows + 1) / 2
+
+    @property
+    def center_seat(self) -> float:
+        return (self.seats_per_row + 1) / 2
+
+    def occupancy(self, booked_ids, seat_type: str | None) -> bytes:
+        # Занятые места сеанса накладываем на карту типа одним OR над целыми числами
+        booked = bytearray(self.size)
+        index = self.index.get
+        for position in map(index, booked_ids, repeat(0)):
+            booked[position] = 1
+        blocked = self.blocked.get(seat_type)
+        if blocked is None:
+            return b'\x01' * self.size
+        return (int.from_bytes(booked, 'little') | blocked).to_bytes(self.size, 'little')
+
+
+def best_blocks(grid: HallGrid, occupancy: bytes, count: int, limit: int = 1) -> list[tuple[float, int, int]]:
+    # Для каждого ряда лучший блок — ближайший к центру ряда; ряды просматриваем от центрального
+    # и останавливаемся, когда штраф за ряд уже больше худшего из найденных вариантов
+    pattern = b'\x00' * count
+    ideal_start = grid.center_seat - (count - 1) / 2
+    left_start, right_start = max(floor(ideal_start), 0), max(ceil(ideal_start), 0)
+    found: list[tuple[float, int, int]] = []
+    for row in grid.rows_by_distance:
+        row_penalty = abs(row - grid.center_row) * ROW_WEIGHT
+        if len(found) >= limit and row_penalty >= found[-1][0]:
+            break
+        offset = grid.row_offsets[row]
+        row_end = offset + grid.stride
+        candidates = []
+        # Ближайший блок справа от идеального начала и ближайший слева
+        right = occupancy.find(pattern, offset + right_start, row_end)
+        if right != -1:
+            candidates.append(right - offset)
+        left = occupancy.rfind(pattern, offset, min(offset + left_start + count, row_end))
+        if left != -1:
+            candidates.append(left - offset)
+        if not candidates:
+            continue
+        start = min(candidates, key=lambda position: abs(position - ideal_start))
+        found.append((row_penalty + abs(start - ideal_start), row, start))
+        found.sort()
+        del found[limit:]
+    return found
+
+
+class SeatRecommender:
+    async def recommend(self, session: AsyncSession, seance_id: int, count: int, seat_type: str | None, limit: int = 1) -> list[dict]:
+        # Сетка зала строится один раз на версию схемы, из БД читаются только занятые места сеанса
+        seance = (await session.execute(
+            select(models.Seance.hall_id, models.Hall.layout_version)
+            .join(models.Hall, models.Hall.id == models.Seance.hall_id)
+            .where(models.Seance.id == seance_id)
+        )).first()
+        if seance is None:
+            raise HTTPException(404, 'Seance not found')
+        hall_layout = await hall_layouts.get(session, seance.hall_id, seance.layout_version)
+        grid = hall_layout.derived('best_seats', HallGrid.from_layout)
+        booked = (await session.execute(
+            select(models.Ticket.seat_id).where(models.Ticket.seance_id == seance_id, models.Ticket.booked == True)
+        )).scalars().all()
+        blocks = best_blocks(grid, grid.occupancy(booked, seat_type), count, limit)
+        return [
+            {
+                'score': round(score, 3),
+                'row_number': row,
+                'seats': [grid.seats[grid.row_offsets[row] + number] for number in range(start, start + count)],
+            }
+            for score, row, start in blocks
+        ]
+
+
+seat_recommender = SeatRecommender()
@@ -0,0 +1,45 @@
+import base64
+import zlib
+
+
+# Компактное представление схемы зала: статичная раскладка мест + битовая карта
+# свободных мест сеанса. Порядок бит совпадает с порядком мест в раскладке.
+
+def layout_version(seats: list) -> int:
+    raw = ';'.join(f'{seat_id}:{row}:{number}:{seat_type}' for seat_id, row, number, seat_type in seats)
+    return zlib.crc32(raw.encode())
+
+
+def build_layout(hall_id: int, rows: int, seats_per_row: int, seats: list) -> dict:
+    return {
+        'hall_id': hall_id,
+        'rows': rows,
+        'seats_per_row': seats_per_row,
+        'version': layout_version(seats),
+        # [id, ряд, место, тип] — без повторяющихся ключей на каждое место
+        'seats': [[seat_id, row, number, seat_type] for seat_id, row, number, seat_type in seats],
+    }
+
+
+def hall_layout_view(hall_layout) -> dict:
+    # Раскладка из кэша схемы зала (app/hall_layout.py) вместе с сеткой: проходы и пустые позиции
+    layout = build_layout(hall_layout.hall_id, hall_layout.rows, hall_layout.seats_per_row, hall_layout.seats)
+    layout['grid'] = hall_layout.grid
+    return layout
+
+
+def encode_availability(seat_ids: list[int], booked_ids: set[int]) -> bytes:
+    # Бит 1 — место свободно; старший бит байта соответствует первому месту
+    bitmap = bytearray((len(seat_ids) + 7) // 8)
+    for index, seat_id in enumerate(seat_ids):
+        if seat_id not in booked_ids:
+            bitmap[index >> 3] |= 0x80 >> (index & 7)
+    return bytes(bitmap)
+
+
+def availability_version(layout_ver: int, bitmap: bytes) -> int:
+    return zlib.crc32(bitmap, layout_ver)
+
+
+def encode_bitmap_base64(bitmap: bytes) -> str:
+    return base64.b64encode(bitmap).decode('ascii')
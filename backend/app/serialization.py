@@ -0,0 +1,57 @@
+from datetime import datetime, timezone
+from fastapi.responses import ORJSONResponse
+
+
+# Быстрый путь сериализации: ответы собираются из строк БД, которые уже
+# соответствуют response_model, поэтому повторная валидация Pydantic не нужна.
+def trusted_response(content: dict, status_code: int = 200, headers: dict | None = None) -> ORJSONResponse:
+    return ORJSONResponse(content=content, status_code=status_code, headers=headers)
+
+
+def format_timestamp(value: datetime | None) -> str:
+    dt = value or datetime.utcnow()
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.isoformat(timespec='milliseconds')
+
+
+def seat_info(row) -> dict:
+    return {
+        'id': row['id'],
+        'hall_id': row['hall_id'],
+        'row_number': row['row_number'],
+        'seat_number': row['seat_number'],
+        'seat_type': row['seat_type'],
+    }
+
+
+def seance_info(row) -> dict:
+    start_time = row['start_time']
+    return {
+        'id': row['id'],
+        'hall_id': row['hall_id'],
+        'film_id': row['film_id'],
+        'start_time': start_time.isoformat() if start_time is not None else None,
+        'price_standard': row['price_standard'],
+        'price_vip': row['price_vip'],
+    }
+
+
+def ticket_row(row, seat: dict | None, seance: dict | None) -> dict:
+    return {
+        'id': row['id'],
+        'seance_id': row['seance_id'],
+        'seat_id': row['seat_id'],
+        'user_id': row['user_id'],
+        'user_name': row['user_name'],
+        'user_phone': row['user_phone'],
+        'user_email': row['user_email'],
+        'booked': row['booked'],
+        'booking_code': row['booking_code'],
+        'qr_code_data': row['qr_code_data'],
+        'created_at': format_timestamp(row['created_at']),
+        'price': row['price'],
+        'archived': row['archived'],
+        'seat_info': seat,
+        'seance_info': seance,
+    }
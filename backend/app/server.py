@@ -1,13 +1,12 @@
-import random
-import qrcode
-import string
-import os
+import logging
 import time
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
-from fastapi import FastAPI, HTTPException, Request, Depends
+import uuid
+from typing import Literal
+from fastapi import FastAPI, HTTPException, Request, Response, Depends, Query
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from .schema import (CreateHallRequest, UpdateHallRequest, CreateHallResponse, UpdateHallResponse,
@@ -21,26 +20,60 @@ from .schema import (CreateHallRequest, UpdateHallRequest, CreateHallResponse, U
                      DeleteSeatResponse, UpdateSeatRequest, CreatePriceRequest, CreatePriceResponse, UpdatePriceResponse,
                      GetPriceResponse, GetPricesResponse, DeletePriceResponse, UpdatePriceRequest, CreateTicketRequest,
                      CreateTicketResponse, UpdateTicketResponse, GetTicketResponse, GetTicketsResponse, DeleteTicketResponse,
+                     GetTicketByCodeResponse, CheckInTicketResponse,
                      UpdateTicketRequest, GetAvailableSeatsResponse, CreateBookingRequest, ArchiveTicketRequest,
-                     ArchiveTicketResponse)
+                     ArchiveTicketResponse, GetHallLayoutResponse, GetSeatBitmapResponse, GetBestSeatsResponse,
+                     UpdateHallLayoutRequest, UpdateHallLayoutResponse,
+                     GetSeancePricesResponse, BatchRequest, BatchResponse, GetTicketReportResponse,
+                     GetTicketAggregateResponse, GetScheduleResponse, BuildScheduleRequest, BuildScheduleResponse,
+                     ValidateScheduleRequest, ValidateScheduleResponse)
 from .lifespan import lifespan
-from sqlalchemy import select, delete, func
+from .seat_events import seat_events
+from . import seatmap
+from .pricing import pricing
+from .seat_recommender import seat_recommender
+from .hall_layout import hall_layouts, bump_layout_version, parse_layout, apply_layout
+from .scheduling import normalize_datetime, ensure_no_overlapping_seances, plan_schedule, validate_schedule
+from .batch import execute_batch
+from .deletion import delete_with_dependents
+from .serialization import trusted_response
+from . import reports
+from .export import stream_tickets_csv
+from .logger import get_logger, PERF_LOGGER
+from .middleware import RequestIdMiddleware
+from .admission import AdmissionMiddleware, admission
+from .idempotency import idempotency, client_identity, GUEST_COOKIE
+from .singleflight import hot_reads
+from .tokens import issue_token
+from .outbox import outbox, ticket_event, TICKET_BOOKED
+from .booking_code import booking_codes
+from .checkin import checkins, extract_code, load_ticket_by_code
+from .schedule import schedule_cache, group_by_day_and_film, SCHEDULE_MAX_DAYS
+from .diagnostics import slow_queries, is_statement_timeout
+from .health import readiness
+from .background import worker_id
+from . import config
+from sqlalchemy import select, insert, delete, func
+from sqlalchemy.exc import DBAPIError, IntegrityError
 from sqlalchemy.orm import noload
-from .dependancy import SessionDependency, TokenDependency
+from .dependancy import SessionDependency, TokenDependency, IdempotencyKeyHeader, GuestUserDependency
 from .constants import SUCCESS_RESPONSE
 from .auth import hash_password, check_password
 from . import models
 from . import crud
 from datetime import datetime, timezone, timedelta
-from pathlib import Path
 
 
 app = FastAPI(
     title='Cinema Booking API',
     description='API for cinema booking system',
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
+# Контроль входа: лимиты на клиента и ограничение одновременных бронирований (внутри CORS, чтобы отказы читались браузером)
+app.add_middleware(AdmissionMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -49,112 +82,40 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestIdMiddleware)
 
-# Директория для QR-кодов
-QR_CODES_DIR = Path(__file__).resolve().parent.parent / 'qr_codes'
-QR_CODES_DIR.mkdir(parents=True, exist_ok=True)
-
-# Раздача QR-кодов как статических файлов
-app.mount("/qr-codes", StaticFiles(directory=str(QR_CODES_DIR)), name="qr-codes")
-
-GUEST_USER_EMAIL = os.getenv('GUEST_USER_EMAIL', 'guest@cinema-booking.local')
-GUEST_USER_NAME = os.getenv('GUEST_USER_NAME', 'Гость')
-GUEST_USER_PHONE = os.getenv('GUEST_USER_PHONE', '+70000000000')
-GUEST_USER_PASSWORD = os.getenv('GUEST_USER_PASSWORD', 'guest-temp')
-GUEST_PASSWORD_HASH = hash_password(GUEST_USER_PASSWORD)
-GUEST_USER_CACHE: dict[str, int | None] = {'id': None}
-
-
-def normalize_datetime(value: datetime) -> datetime:
-    if value is None:
-        return value
-    if value.tzinfo is None:
-        return value
-    return value.astimezone(timezone.utc).replace(tzinfo=None)
-
-
-async def ensure_no_overlapping_seances(
-    session: SessionDependency,
-    hall_id: int,
-    start_time: datetime,
-    duration_minutes: int,
-    exclude_seance_id: int | None = None,
-):
-    if duration_minutes is None:
-        duration_minutes = 0
-
-    normalized_start = normalize_datetime(start_time)
-    new_end = normalized_start + timedelta(minutes=duration_minutes)
-
-    stmt = select(models.Seance).where(models.Seance.hall_id == hall_id)
-    if exclude_seance_id is not None:
-        stmt = stmt.where(models.Seance.id != exclude_seance_id)
-
-    result = await session.execute(stmt)
-    existing_seances = result.scalars().unique().all()
-    for existing_seance in existing_seances:
-        existing_film = existing_seance.film
-        if existing_film is None:
-            continue
-        existing_start = normalize_datetime(existing_seance.start_time)
-        existing_duration = existing_film.duration or 0
-        existing_end = existing_start + timedelta(minutes=existing_duration)
-
-        if normalized_start < existing_end and existing_start < new_end:
-            conflict_start = existing_start.strftime('%d.%m %H:%M')
-            conflict_title = existing_film.title or f'ID {existing_film.id}'
-            raise HTTPException(
-                status_code=400,
-                detail=f'Сеанс пересекается с фильмом "{conflict_title}" (начало {conflict_start}). Выберите другое время.'
-            )
-
-
-async def get_guest_user_id(session: SessionDependency) -> int:
-    cached_id = GUEST_USER_CACHE.get('id')
-    if cached_id:
-        return cached_id
-
-    result = await session.execute(
-        select(models.User.id).where(models.User.email == GUEST_USER_EMAIL)
-    )
-    user_id_value = result.scalar_one_or_none()
-
-    if user_id_value is not None:
-        GUEST_USER_CACHE['id'] = user_id_value
-        return user_id_value
-
-    guest_user = models.User(
-        name=GUEST_USER_NAME,
-        phone=GUEST_USER_PHONE,
-        email=GUEST_USER_EMAIL,
-        hashed_password=GUEST_PASSWORD_HASH,
-        role='user',
-    )
-    try:
-        await crud.add_item(session, guest_user)
-        user_id_value = guest_user.id
-    except HTTPException as exc:
-        if exc.status_code != 409:
-            raise
-        result = await session.execute(
-            select(models.User.id).where(models.User.email == GUEST_USER_EMAIL)
-        )
-        user_id_value = result.scalar_one()
+logger = get_logger('server')
+perf_logger = logging.getLogger(PERF_LOGGER)
 
-    GUEST_USER_CACHE['id'] = user_id_value
-    return user_id_value
+# Раздача QR-кодов как статических файлов (директорию создаёт lifespan)
+app.mount("/qr-codes", StaticFiles(directory=str(config.QR_CODES_DIR), check_dir=False), name="qr-codes")
 
 # Обработчик ошибок валидации
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
-    body = await request.body()
-    print(f"[DEBUG] Ошибка валидации запроса: {exc.errors()}")
-    print(f"[DEBUG] Тело запроса: {body.decode('utf-8') if body else 'empty'}")
+    # Тело запроса не логируем и не возвращаем: только место и тип ошибки
+    errors = exc.errors()
+    logger.info(
+        'Ошибка валидации запроса',
+        extra={'fields': {
+            'path': request.url.path,
+            'errors': [{'loc': error.get('loc'), 'type': error.get('type')} for error in errors],
+        }},
+    )
     return JSONResponse(
         status_code=400,
-        content={"detail": exc.errors(), "body": body.decode('utf-8') if body else 'empty'}
+        content={"detail": jsonable_encoder([
+            {'loc': error.get('loc'), 'msg': error.get('msg'), 'type': error.get('type')} for error in errors
+        ])}
     )
 
+# Запрос, прерванный statement_timeout, — не ошибка сервера, а перегрузка: клиент может повторить
+@app.exception_handler(DBAPIError)
+async def database_exception_handler(request: Request, exc: DBAPIError):
+    if not is_statement_timeout(exc.orig or exc):
+        raise exc
+    return JSONResponse(status_code=503, content={"detail": "Query timed out"})
+
 # Базовые эндпоинты
 @app.get("/", tags=['root'])
 async def root():
@@ -164,16 +125,49 @@ async def root():
 async def health():
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
+# Живость: процесс и event loop отвечают; зависимости не проверяются, чтобы сбой БД не вызывал перезапусков
+@app.get("/health/live", tags=['health'])
+async def health_live():
+    return {"status": "alive", "worker_id": worker_id()}
+
+# Готовность: БД, пул, очередь QR-кодов и диск; при сбое 503 — оркестратор снимает трафик с воркера
+@app.get("/health/ready", tags=['health'])
+async def health_ready():
+    report = await readiness()
+    return JSONResponse(status_code=200 if report['status'] == 'ready' else 503, content=report)
+
 
 # Залы
 @app.post('/api/v1/hall', tags=['hall'], response_model=CreateHallResponse)
-async def create_hall(hall: CreateHallRequest, session: SessionDependency, token: TokenDependency):
+async def create_hall(hall: CreateHallRequest, session: SessionDependency, token: TokenDependency, idempotency_key: IdempotencyKeyHeader = None):
     if token.user.role != 'admin':
         raise HTTPException(403, 'Insufficient privileges')
-    hall_dict = hall.model_dump(exclude_unset=True)
-    hall_orm_obj = models.Hall(**hall_dict)
-    await crud.add_item(session, hall_orm_obj)
-    return hall_orm_obj.dict
+
+    async def handler():
+        hall_dict = hall.model_dump(exclude_unset=True)
+        grid = hall_dict.pop('grid', None)
+        grid = parse_layout(grid) if grid is not None else None
+        hall_orm_obj = models.Hall(**hall_dict)
+        if grid is None:
+            await crud.add_item(session, hall_orm_obj)
+            return hall_orm_obj.dict
+        # Зал и места по схеме — одной транзакцией: сбой схемы не оставит зал без мест
+        session.add(hall_orm_obj)
+        try:
+            await session.flush()
+            await apply_layout(session, hall_orm_obj.id, grid, commit=False)
+            await session.commit()
+        except IntegrityError as err:
+            await session.rollback()
+            raise HTTPException(409, f'Item already exists: {str(err)}')
+        except Exception:
+            await session.rollback()
+            raise
+        # Размеры зала выводятся из схемы UPDATE'ом в apply_layout — перечитываем их из БД
+        await session.refresh(hall_orm_obj, ['rows', 'seats_per_row', 'layout', 'layout_version'])
+        return hall_orm_obj.dict
+
+    return await idempotency.run(f'create_hall:{token.user_id}', idempotency_key, hall, handler, CreateHallResponse)
 
 @app.patch('/api/v1/hall/{hall_id}', tags=['hall'], response_model=UpdateHallResponse)
 async def update_hall(hall_id: int, hall: UpdateHallRequest, session: SessionDependency, token: TokenDependency):
@@ -185,7 +179,9 @@ async def update_hall(hall_id: int, hall: UpdateHallRequest, session: SessionDep
     hall_dict = hall.model_dump(exclude_unset=True)
     for key, value in hall_dict.items():
         setattr(hall_orm_obj, key, value)
+    hall_orm_obj.layout_version += 1
     await crud.update_item(session, hall_orm_obj)
+    schedule_cache.invalidate()
     return hall_orm_obj.dict
 
 @app.get('/api/v1/hall/{hall_id}', tags=['hall'], response_model=GetHallResponse)
@@ -208,27 +204,73 @@ async def search_halls(session: SessionDependency, name: str | None = None, is_a
         query = query.where(*filters)
     result = await session.execute(query)
     halls = result.scalars().unique().all()
-    return {'halls': [hall.dict for hall in halls]}    
+    return trusted_response({'halls': [hall.dict for hall in halls]})
 
-@app.delete('/api/v1/hall/{hall_id}', tags=['hall'], response_model=DeleteHallResponse)
-async def delete_hall(hall_id: int, session: SessionDependency, token: TokenDependency):
-    hall_orm_obj = await crud.get_item_by_id(session, models.Hall, hall_id)
-    if hall_orm_obj is None:
+# статичная раскладка зала: клиент скачивает один раз и кэширует по ETag
+@app.get('/api/v1/hall/{hall_id}/layout', tags=['hall'], response_model=GetHallLayoutResponse)
+async def get_hall_layout(hall_id: int, request: Request, response: Response, session: SessionDependency):
+    hall_layout = await hall_layouts.get(session, hall_id)
+    if hall_layout is None:
         raise HTTPException(404, 'Hall not found')
+    layout = hall_layout.derived('seatmap', seatmap.hall_layout_view)
+    etag = f'"{layout["version"]}"'
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers={'ETag': etag})
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    return layout
+
+# схема зала: места создаются, меняют тип и удаляются пачкой по сетке
+@app.put('/api/v1/hall/{hall_id}/layout', tags=['hall'], response_model=UpdateHallLayoutResponse)
+async def update_hall_layout(hall_id: int, layout: UpdateHallLayoutRequest, session: SessionDependency, token: TokenDependency):
     if token.user.role != 'admin':
         raise HTTPException(403, 'Insufficient privileges')
-    await crud.delete_item(session, hall_orm_obj)
-    return SUCCESS_RESPONSE
+    grid = parse_layout(layout.grid)
+    hall_result = await session.execute(select(models.Hall.id).where(models.Hall.id == hall_id))
+    if hall_result.scalar_one_or_none() is None:
+        raise HTTPException(404, 'Hall not found')
+    counts = await apply_layout(session, hall_id, grid)
+    pricing.invalidate_hall(hall_id)
+    hall_layout = await hall_layouts.get(session, hall_id)
+    return {
+        'hall_id': hall_id,
+        'rows': hall_layout.rows,
+        'seats_per_row': hall_layout.seats_per_row,
+        'layout_version': hall_layout.version,
+        **counts,
+    }
+
+@app.delete('/api/v1/hall/{hall_id}', tags=['hall'], response_model=DeleteHallResponse)
+async def delete_hall(hall_id: int, session: SessionDependency, token: TokenDependency, dry_run: bool = False):
+    if token.user.role != 'admin':
+        raise HTTPException(403, 'Insufficient privileges')
+    found = await session.execute(select(models.Hall.id).where(models.Hall.id == hall_id))
+    if found.scalar_one_or_none() is None:
+        raise HTTPException(404, 'Hall not found')
+    # Сеансы, места, цены и архивные билеты зала удаляются пачками в БД
+    rows = await delete_with_dependents(session, models.Hall, hall_id, dry_run)
+    if not dry_run:
+        pricing.invalidate_hall(hall_id)
+        schedule_cache.invalidate()
+        # Вместе с залом удалены его сеансы
+        hot_reads.clear()
+    return {**SUCCESS_RESPONSE, 'dry_run': dry_run, 'rows': rows}
 
 # Места
 @app.post('/api/v1/seat', tags=['seat'], response_model=CreateSeatResponse)
-async def create_seat(seat: CreateSeatRequest, session: SessionDependency, token: TokenDependency):
+async def create_seat(seat: CreateSeatRequest, session: SessionDependency, token: TokenDependency, idempotency_key: IdempotencyKeyHeader = None):
     if token.user.role != 'admin':
         raise HTTPException(403, 'Insufficient privileges')
-    seat_dict = seat.model_dump(exclude_unset=True)
-    seat_orm_obj = models.Seat(**seat_dict)
-    await crud.add_item(session, seat_orm_obj)
-    return seat_orm_obj.dict
+
+    async def handler():
+        seat_dict = seat.model_dump(exclude_unset=True)
+        seat_orm_obj = models.Seat(**seat_dict)
+        await bump_layout_version(session, seat_orm_obj.hall_id)
+        await crud.add_item(session, seat_orm_obj)
+        pricing.invalidate_hall(seat_orm_obj.hall_id)
+        return seat_orm_obj.dict
+
+    return await idempotency.run(f'create_seat:{token.user_id}', idempotency_key, seat, handler, CreateSeatResponse)
 
 @app.patch('/api/v1/seat/{seat_id}', tags=['seat'], response_model=UpdateSeatResponse)
 async def update_seat(seat_id: int, seat: UpdateSeatRequest, session: SessionDependency, token: TokenDependency):
@@ -238,9 +280,13 @@ async def update_seat(seat_id: int, seat: UpdateSeatRequest, session: SessionDep
     if token.user.role != 'admin':
         raise HTTPException(403, 'Insufficient privileges')
     seat_dict = seat.model_dump(exclude_unset=True)
+    old_hall_id = seat_orm_obj.hall_id
     for key, value in seat_dict.items():
         setattr(seat_orm_obj, key, value)
+    await bump_layout_version(session, old_hall_id, seat_orm_obj.hall_id)
     await crud.update_item(session, seat_orm_obj)
+    pricing.invalidate_hall(old_hall_id)
+    pricing.invalidate_hall(seat_orm_obj.hall_id)
     return seat_orm_obj.dict
 
 # получение гостем всех мест в зале 
@@ -266,7 +312,7 @@ async def search_seats(session: SessionDependency, hall_id: int | None = None, r
         query = query.where(*filters)
     result = await session.execute(query)
     seats = result.scalars().unique().all()
-    return {'seats': [seat.dict for seat in seats]}
+    return trusted_response({'seats': [seat.dict for seat in seats]})
 
 @app.delete('/api/v1/seat/{seat_id}', tags=['seat'], response_model=DeleteSeatResponse)
 async def delete_seat(seat_id: int, session: SessionDependency, token: TokenDependency):
@@ -275,7 +321,10 @@ async def delete_seat(seat_id: int, session: SessionDependency, token: TokenDepe
         raise HTTPException(404, 'Seat not found')
     if token.user.role != 'admin':
         raise HTTPException(403, 'Insufficient privileges')
+    hall_id = seat_orm_obj.hall_id
+    await bump_layout_version(session, hall_id)
     await crud.delete_item(session, seat_orm_obj)
+    pricing.invalidate_hall(hall_id)
     return SUCCESS_RESPONSE
 
 @app.get('/api/v1/seat/{seat_id}', tags=['seat'], response_model=GetSeatResponse)
@@ -287,13 +336,17 @@ async def get_seat(seat_id: int, session: SessionDependency):
 
 # Фильмы
 @app.post('/api/v1/film', tags=['film'], response_model=CreateFilmResponse)
-async def create_film(film: CreateFilmRequest, session: SessionDependency, token: TokenDependency):
+async def create_film(film: CreateFilmRequest, session: SessionDependency, token: TokenDependency, idempotency_key: IdempotencyKeyHeader = None):
     if token.user.role != 'admin':
         raise HTTPException(403, 'Insufficient privileges')
-    film_dict = film.model_dump(exclude_unset=True)
-    film_orm_obj = models.Film(**film_dict)
-    await crud.add_item(session, film_orm_obj)
-    return film_orm_obj.dict
+
+    async def handler():
+        film_dict = film.model_dump(exclude_unset=True)
+        film_orm_obj = models.Film(**film_dict)
+        await crud.add_item(session, film_orm_obj)
+        return film_orm_obj.dict
+
+    return await idempotency.run(f'create_film:{token.user_id}', idempotency_key, film, handler, CreateFilmResponse)
 
 @app.patch('/api/v1/film/{film_id}', tags=['film'], response_model=UpdateFilmResponse)
 async def update_film(film_id: int, film: UpdateFilmRequest, session: SessionDependency, token: TokenDependency):
@@ -306,15 +359,14 @@ async def update_film(film_id: int, film: UpdateFilmRequest, session: SessionDep
     for key, value in film_dict.items():
         setattr(film_orm_obj, key, value)
     await crud.update_item(session, film_orm_obj)
+    hot_reads.forget(('film', film_id))
+    schedule_cache.invalidate()
     return film_orm_obj.dict
 
 # просмотр гостем информации о фильме
 @app.get('/api/v1/film/{film_id}', tags=['film'], response_model=GetFilmResponse)
-async def get_film(film_id: int, session: SessionDependency):
-    film_orm_obj = await crud.get_item_by_id(session, models.Film, film_id)
-    if film_orm_obj is None:
-        raise HTTPException(404, 'Film not found')
-    return film_orm_obj.dict
+async def get_film(film_id: int):
+    return await hot_reads.do(('film', film_id), lambda: load_item_dict(models.Film, film_id, 'Film not found'))
 
 # получение гостем списка фильмов
 @app.get('/api/v1/film', tags=['film'], response_model=GetFilmsResponse)
@@ -327,40 +379,50 @@ async def search_films(session: SessionDependency, title: str | None = None):
         query = query.where(*filters)
     result = await session.execute(query)
     films = result.scalars().unique().all()
-    return {'films': [film.dict for film in films]}
+    return trusted_response({'films': [film.dict for film in films]})
 
 @app.delete('/api/v1/film/{film_id}', tags=['film'], response_model=DeleteFilmResponse)
-async def delete_film(film_id: int, session: SessionDependency, token: TokenDependency):
-    film_orm_obj = await crud.get_item_by_id(session, models.Film, film_id)
-    if film_orm_obj is None:
-        raise HTTPException(404, 'Film not found')
+async def delete_film(film_id: int, session: SessionDependency, token: TokenDependency, dry_run: bool = False):
     if token.user.role != 'admin':
         raise HTTPException(403, 'Insufficient privileges')
-    await crud.delete_item(session, film_orm_obj)
-    return SUCCESS_RESPONSE
+    found = await session.execute(select(models.Film.id).where(models.Film.id == film_id))
+    if found.scalar_one_or_none() is None:
+        raise HTTPException(404, 'Film not found')
+    rows = await delete_with_dependents(session, models.Film, film_id, dry_run)
+    if not dry_run:
+        # Сеансы фильма могли идти в любых залах
+        pricing.invalidate()
+        schedule_cache.invalidate()
+        hot_reads.clear()
+    return {**SUCCESS_RESPONSE, 'dry_run': dry_run, 'rows': rows}
 
 # Сеансы
 @app.post('/api/v1/seance', tags=['seance'], response_model=CreateSeanceResponse)
-async def create_seance(seance: CreateSeanceRequest, session: SessionDependency, token: TokenDependency):
+async def create_seance(seance: CreateSeanceRequest, session: SessionDependency, token: TokenDependency, idempotency_key: IdempotencyKeyHeader = None):
     if token.user.role != 'admin':
         raise HTTPException(403, 'Insufficient privileges')
-    film = await crud.get_item_by_id(session, models.Film, seance.film_id)
-    if film is None:
-        raise HTTPException(404, 'Film not found')
 
-    normalized_start = normalize_datetime(seance.start_time)
-    await ensure_no_overlapping_seances(
-        session=session,
-        hall_id=seance.hall_id,
-        start_time=normalized_start,
-        duration_minutes=film.duration,
-    )
+    async def handler():
+        film = await crud.get_item_by_id(session, models.Film, seance.film_id)
+        if film is None:
+            raise HTTPException(404, 'Film not found')
+
+        normalized_start = normalize_datetime(seance.start_time)
+        await ensure_no_overlapping_seances(
+            session=session,
+            hall_id=seance.hall_id,
+            start_time=normalized_start,
+            duration_minutes=film.duration,
+        )
 
-    seance_dict = seance.model_dump(exclude_unset=True)
-    seance_dict['start_time'] = normalized_start
-    seance_orm_obj = models.Seance(**seance_dict)
-    await crud.add_item(session, seance_orm_obj)
-    return seance_orm_obj.dict
+        seance_dict = seance.model_dump(exclude_unset=True)
+        seance_dict['start_time'] = normalized_start
+        seance_orm_obj = models.Seance(**seance_dict)
+        await crud.add_item(session, seance_orm_obj)
+        schedule_cache.invalidate_day(seance_orm_obj.start_time)
+        return seance_orm_obj.dict
+
+    return await idempotency.run(f'create_seance:{token.user_id}', idempotency_key, seance, handler, CreateSeanceResponse)
 
 @app.patch('/api/v1/seance/{seance_id}', tags=['seance'], response_model=UpdateSeanceResponse)
 async def update_seance(seance_id: int, seance: UpdateSeanceRequest, session: SessionDependency, token: TokenDependency):
@@ -392,18 +454,20 @@ async def update_seance(seance_id: int, seance: UpdateSeanceRequest, session: Se
     if 'start_time' in seance_dict:
         seance_dict['start_time'] = normalized_start
 
+    previous_start = seance_orm_obj.start_time
     for key, value in seance_dict.items():
         setattr(seance_orm_obj, key, value)
     await crud.update_item(session, seance_orm_obj)
+    pricing.invalidate(seance_id)
+    hot_reads.forget(('seance', seance_id))
+    hot_reads.forget(('available_seats', seance_id))
+    schedule_cache.invalidate_day(previous_start, seance_orm_obj.start_time)
     return seance_orm_obj.dict
 
 # получение гостем информации о сеансе
 @app.get('/api/v1/seance/{seance_id}', tags=['seance'], response_model=GetSeanceResponse)
-async def get_seance(seance_id: int, session: SessionDependency):
-    seance_orm_obj = await crud.get_item_by_id(session, models.Seance, seance_id)
-    if seance_orm_obj is None:
-        raise HTTPException(404, 'Seance not found')
-    return seance_orm_obj.dict
+async def get_seance(seance_id: int):
+    return await hot_reads.do(('seance', seance_id), lambda: load_item_dict(models.Seance, seance_id, 'Seance not found'))
 
 # получение гостем списка всех сеансов
 @app.get('/api/v1/seance', tags=['seance'], response_model=GetSeancesResponse)
@@ -416,70 +480,112 @@ async def search_seances(session: SessionDependency, hall_id: int | None = None,
     if start_time:
         filters.append(models.Seance.start_time == start_time)
 
-    query = select(models.Seance)
+    # Для списка нужны только поля сеанса: связанные фильм, зал, билеты и брони не подгружаем
+    query = select(models.Seance).options(
+        noload(models.Seance.film),
+        noload(models.Seance.hall),
+        noload(models.Seance.tickets),
+        noload(models.Seance.available_seats),
+        noload(models.Seance.bookings),
+    )
     if filters:
         query = query.where(*filters)
     result = await session.execute(query)
     seances = result.scalars().unique().all()
-    return {'seances': [seance.dict for seance in seances]}
+    return trusted_response({'seances': [seance.dict for seance in seances]})
 
-@app.delete('/api/v1/seance/{seance_id}', tags=['seance'], response_model=DeleteSeanceResponse)
-async def delete_seance(seance_id: int, session: SessionDependency, token: TokenDependency):
-    seance_orm_obj = await crud.get_item_by_id(session, models.Seance, seance_id)
-    if seance_orm_obj is None:
-        raise HTTPException(404, 'Seance not found')
+# расписание на период: сеансы по дням и фильмам вместе с названием фильма и зала
+@app.get('/api/v1/schedule', tags=['seance'], response_model=GetScheduleResponse)
+async def get_schedule(
+    session: SessionDependency,
+    date_from: datetime | None = Query(None, alias='from'),
+    date_to: datetime | None = Query(None, alias='to'),
+    film_id: int | None = None,
+    hall_id: int | None = None,
+):
+    date_from = normalize_datetime(date_from) or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    date_to = normalize_datetime(date_to) or date_from + timedelta(days=1)
+    if date_to <= date_from:
+        raise HTTPException(400, "'to' must be later than 'from'")
+    if date_to - date_from > timedelta(days=SCHEDULE_MAX_DAYS):
+        raise HTTPException(400, f'Schedule window is limited to {SCHEDULE_MAX_DAYS} days')
+
+    rows = await schedule_cache.get_rows(session, date_from, date_to)
+    if film_id:
+        rows = [row for row in rows if row['film_id'] == film_id]
+    if hall_id:
+        rows = [row for row in rows if row['hall_id'] == hall_id]
+    return trusted_response({
+        'date_from': date_from.isoformat(),
+        'date_to': date_to.isoformat(),
+        'days': group_by_day_and_film(rows),
+    })
+
+# автоматическое расписание: раскладка фильмов по залам на несколько дней и сохранение одной транзакцией
+@app.post('/api/v1/schedule/build', tags=['seance'], response_model=BuildScheduleResponse)
+async def create_schedule(schedule_request: BuildScheduleRequest, session: SessionDependency, token: TokenDependency):
     if token.user.role != 'admin':
         raise HTTPException(403, 'Insufficient privileges')
-    active_tickets_count_result = await session.execute(
-        select(func.count()).select_from(models.Ticket).where(
-            models.Ticket.seance_id == seance_id,
-            models.Ticket.archived == False
-        )
-    )
-    active_tickets_count = active_tickets_count_result.scalar_one()
-    archived_tickets_count_result = await session.execute(
-        select(func.count()).select_from(models.Ticket).where(
-            models.Ticket.seance_id == seance_id,
-            models.Ticket.archived == True
-        )
-    )
-    archived_tickets_count = archived_tickets_count_result.scalar_one()
-    bookings_count_result = await session.execute(
-        select(func.count()).select_from(models.Booking).where(models.Booking.seance_id == seance_id)
-    )
-    bookings_count = bookings_count_result.scalar_one()
-
-    if active_tickets_count > 0 or bookings_count > 0:
-        raise HTTPException(
-            409,
-            'Нельзя удалить сеанс, на который уже оформлены бронирования или проданы билеты.'
-        )
-    if archived_tickets_count > 0:
-        await session.execute(
-            delete(models.Ticket).where(
-                models.Ticket.seance_id == seance_id,
-                models.Ticket.archived == True
-            )
+    planned, unplaced = await plan_schedule(session, schedule_request)
+    if planned and not schedule_request.dry_run:
+        columns = ('hall_id', 'film_id', 'start_time', 'price_standard', 'price_vip')
+        result = await session.execute(
+            insert(models.Seance).returning(models.Seance.id, sort_by_parameter_order=True),
+            [{column: seance[column] for column in columns} for seance in planned],
         )
+        for seance, seance_id in zip(planned, result.scalars().all()):
+            seance['id'] = seance_id
+        await session.commit()
+        schedule_cache.invalidate()
+    return trusted_response(BuildScheduleResponse(
+        created=0 if schedule_request.dry_run else len(planned),
+        seances=planned,
+        unplaced=unplaced,
+    ).model_dump(mode='json'))
+
+# проверка расписания (например, отредактированного вручную) на пересечения сеансов
+@app.post('/api/v1/schedule/validate', tags=['seance'], response_model=ValidateScheduleResponse)
+async def check_schedule(schedule_request: ValidateScheduleRequest, session: SessionDependency, token: TokenDependency):
+    if token.user.role != 'admin':
+        raise HTTPException(403, 'Insufficient privileges')
+    conflicts = await validate_schedule(session, schedule_request)
+    return {
+        'valid': not conflicts,
+        'conflicts': [
+            {'hall_id': first[0], 'first': first[3], 'second': second[3]}
+            for first, second in conflicts
+        ],
+    }
 
-    await session.execute(
-        delete(models.AvailableSeat).where(models.AvailableSeat.seance_id == seance_id)
-    )
-    await session.execute(
-        delete(models.Price).where(models.Price.seance_id == seance_id)
-    )
-    await crud.delete_item(session, seance_orm_obj)
-    return SUCCESS_RESPONSE
+@app.delete('/api/v1/seance/{seance_id}', tags=['seance'], response_model=DeleteSeanceResponse)
+async def delete_seance(seance_id: int, session: SessionDependency, token: TokenDependency, dry_run: bool = False):
+    if token.user.role != 'admin':
+        raise HTTPException(403, 'Insufficient privileges')
+    found = await session.execute(select(models.Seance.start_time).where(models.Seance.id == seance_id))
+    seance_start = found.scalar_one_or_none()
+    if seance_start is None:
+        raise HTTPException(404, 'Seance not found')
+    rows = await delete_with_dependents(session, models.Seance, seance_id, dry_run)
+    if not dry_run:
+        pricing.invalidate(seance_id)
+        schedule_cache.invalidate_day(seance_start)
+        hot_reads.forget(('seance', seance_id))
+        hot_reads.forget(('available_seats', seance_id))
+    return {**SUCCESS_RESPONSE, 'dry_run': dry_run, 'rows': rows}
 
 # Билеты
 @app.post('/api/v1/ticket', tags=['ticket'], response_model=CreateTicketResponse)
-async def create_ticket(ticket: CreateTicketRequest, session: SessionDependency, token: TokenDependency):
+async def create_ticket(ticket: CreateTicketRequest, session: SessionDependency, token: TokenDependency, idempotency_key: IdempotencyKeyHeader = None):
     if token.user.role != 'user':
         raise HTTPException(403, 'Insufficient privileges')
-    ticket_dict = ticket.model_dump(exclude_unset=True)
-    ticket_orm_obj = models.Ticket(**ticket_dict)
-    await crud.add_item(session, ticket_orm_obj)
-    return ticket_orm_obj.dict
+
+    async def handler():
+        ticket_dict = ticket.model_dump(exclude_unset=True)
+        ticket_orm_obj = models.Ticket(**ticket_dict)
+        await crud.add_item(session, ticket_orm_obj)
+        return ticket_orm_obj.dict
+
+    return await idempotency.run(f'create_ticket:{token.user_id}', idempotency_key, ticket, handler, CreateTicketResponse)
 
 @app.patch('/api/v1/ticket/{ticket_id}', tags=['ticket'], response_model=UpdateTicketResponse)
 async def update_ticket(ticket_id: int, ticket: UpdateTicketRequest, session: SessionDependency, token: TokenDependency):
@@ -528,7 +634,39 @@ async def search_tickets(token: TokenDependency, session: SessionDependency, sea
         query = query.where(*filters)
     result = await session.execute(query)
     tickets = result.scalars().unique().all()
-    return {'tickets': [ticket.dict for ticket in tickets]}
+    return trusted_response({'tickets': [ticket.dict for ticket in tickets]})
+
+# проверка билета на входе: код из QR (или весь текст QR), билеты ближайших сеансов — из памяти
+@app.get('/api/v1/ticket/by-code/{code}', tags=['ticket'], response_model=GetTicketByCodeResponse)
+async def get_ticket_by_code(code: str, session: SessionDependency, token: TokenDependency):
+    if token.user.role != 'admin':
+        raise HTTPException(403, 'Insufficient privileges')
+    entry = await checkins.lookup(session, extract_code(code))
+    if entry is None:
+        raise HTTPException(404, 'Ticket not found')
+    return entry
+
+@app.post('/api/v1/ticket/by-code/{code}/check-in', tags=['ticket'], response_model=CheckInTicketResponse)
+async def check_in_ticket(code: str, session: SessionDependency, token: TokenDependency):
+    if token.user.role != 'admin':
+        raise HTTPException(403, 'Insufficient privileges')
+    code = extract_code(code)
+    entry = await checkins.lookup(session, code)
+    if entry is None:
+        raise HTTPException(404, 'Ticket not found')
+    if entry['checked_in_at'] is None and entry['booked'] and not entry['archived']:
+        checked_in_at = await checkins.check_in(entry['id'])
+        if checked_in_at is not None:
+            checkins.update(code, checked_in_at=checked_in_at)
+            return {**entry, 'checked_in_at': checked_in_at}
+        # Кэш устарел (билет отметили в другом воркере или архивировали): причину берём из БД
+        entry = await load_ticket_by_code(session, code)
+        if entry is None:
+            raise HTTPException(404, 'Ticket not found')
+        checkins.update(code, **entry)
+    if entry['checked_in_at'] is not None:
+        raise HTTPException(409, 'Ticket already checked in')
+    raise HTTPException(400, 'Ticket is not valid for entry')
 
 @app.delete('/api/v1/ticket/{ticket_id}', tags=['ticket'], response_model=DeleteTicketResponse)
 async def delete_ticket(ticket_id: int, session: SessionDependency, token: TokenDependency):
@@ -537,18 +675,28 @@ async def delete_ticket(ticket_id: int, session: SessionDependency, token: Token
         raise HTTPException(404, 'Ticket not found')
     if token.user.role != 'admin':
         raise HTTPException(403, 'Insufficient privileges')
+    seance_id, seat_id, was_booked = ticket_orm_obj.seance_id, ticket_orm_obj.seat_id, ticket_orm_obj.booked
     await crud.delete_item(session, ticket_orm_obj)
+    checkins.discard(ticket_orm_obj.booking_code)
+    if was_booked:
+        hot_reads.forget(('available_seats', seance_id))
+        await seat_events.publish(seance_id, 'released', seat_id)
     return SUCCESS_RESPONSE
 
 # Цены
 @app.post('/api/v1/price', tags=['price'], response_model=CreatePriceResponse)
-async def create_price(price: CreatePriceRequest, session: SessionDependency, token: TokenDependency):
+async def create_price(price: CreatePriceRequest, session: SessionDependency, token: TokenDependency, idempotency_key: IdempotencyKeyHeader = None):
     if token.user.role != 'admin':
         raise HTTPException(403, 'Insufficient privileges')
-    price_dict = price.model_dump(exclude_unset=True)
-    price_orm_obj = models.Price(**price_dict)
-    await crud.add_item(session, price_orm_obj)
-    return price_orm_obj.dict
+
+    async def handler():
+        price_dict = price.model_dump(exclude_unset=True)
+        price_orm_obj = models.Price(**price_dict)
+        await crud.add_item(session, price_orm_obj)
+        pricing.invalidate(price_orm_obj.seance_id)
+        return price_orm_obj.dict
+
+    return await idempotency.run(f'create_price:{token.user_id}', idempotency_key, price, handler, CreatePriceResponse)
 
 @app.patch('/api/v1/price/{price_id}', tags=['price'], response_model=UpdatePriceResponse)
 async def update_price(price_id: int, price: UpdatePriceRequest, session: SessionDependency, token: TokenDependency):
@@ -561,6 +709,7 @@ async def update_price(price_id: int, price: UpdatePriceRequest, session: Sessio
     for key, value in price_dict.items():
         setattr(price_orm_obj, key, value)
     await crud.update_item(session, price_orm_obj)
+    pricing.invalidate(price_orm_obj.seance_id)
     return price_orm_obj.dict
 
 @app.get('/api/v1/price/{price_id}', tags=['price'], response_model=GetPriceResponse)
@@ -574,8 +723,10 @@ async def get_price(price_id: int, session: SessionDependency, token: TokenDepen
 
 # просмотр цен (может гость)
 @app.get('/api/v1/price', tags=['price'], response_model=GetPricesResponse)
-async def search_prices(session: SessionDependency, seat_type: str | None = None):
+async def search_prices(session: SessionDependency, seance_id: int | None = None, seat_type: str | None = None):
     filters = []
+    if seance_id:
+        filters.append(models.Price.seance_id == seance_id)
     if seat_type:
         filters.append(models.Price.seat_type == seat_type)
     query = select(models.Price)
@@ -583,7 +734,7 @@ async def search_prices(session: SessionDependency, seat_type: str | None = None
         query = query.where(*filters)
     result = await session.execute(query)
     prices = result.scalars().unique().all()
-    return {'prices': [price.dict for price in prices]}
+    return trusted_response({'prices': [price.dict for price in prices]})
 
 @app.delete('/api/v1/price/{price_id}', tags=['price'], response_model=DeletePriceResponse)
 async def delete_price(price_id: int, session: SessionDependency, token: TokenDependency):
@@ -592,11 +743,60 @@ async def delete_price(price_id: int, session: SessionDependency, token: TokenDe
         raise HTTPException(404, 'Price not found')
     if token.user.role != 'admin':
         raise HTTPException(403, 'Insufficient privileges')
+    seance_id = price_orm_obj.seance_id
     await crud.delete_item(session, price_orm_obj)
+    pricing.invalidate(seance_id)
+    return SUCCESS_RESPONSE
+
+
+# Пакетные операции администратора: одна проверка токена, одна транзакция
+@app.post('/api/v1/batch', tags=['batch'], response_model=BatchResponse)
+async def batch(batch_request: BatchRequest, session: SessionDependency, token: TokenDependency, idempotency_key: IdempotencyKeyHeader = None):
+    if token.user.role != 'admin':
+        raise HTTPException(403, 'Insufficient privileges')
+
+    async def handler():
+        return {'results': await execute_batch(session, batch_request.operations)}
+
+    return await idempotency.run(f'batch:{token.user_id}', idempotency_key, batch_request, handler, BatchResponse)
+
+
+# состояние контроля входа: отказы по лимитам, очередь и занятость слотов бронирования
+@app.get('/api/v1/admin/admission', tags=['admin'])
+async def get_admission_stats(token: TokenDependency):
+    if token.user.role != 'admin':
+        raise HTTPException(403, 'Insufficient privileges')
+    return admission.stats
+
+# очередь outbox: необработанные и исчерпавшие попытки события, счётчики обработчиков
+@app.get('/api/v1/admin/outbox', tags=['admin'])
+async def get_outbox_stats(token: TokenDependency):
+    if token.user.role != 'admin':
+        raise HTTPException(403, 'Insufficient privileges')
+    return await outbox.stats()
+
+
+@app.get('/api/v1/admin/diagnostics/slow-queries', tags=['admin'])
+async def get_slow_queries(token: TokenDependency, limit: int | None = Query(None, ge=1, le=1000)):
+    if token.user.role != 'admin':
+        raise HTTPException(403, 'Insufficient privileges')
+    return {
+        'threshold_ms': slow_queries.threshold_ms,
+        'statement_timeout_ms': config.DB_STATEMENT_TIMEOUT_MS,
+        'queries': slow_queries.top(limit),
+    }
+
+
+@app.delete('/api/v1/admin/diagnostics/slow-queries', tags=['admin'])
+async def reset_slow_queries(token: TokenDependency):
+    if token.user.role != 'admin':
+        raise HTTPException(403, 'Insufficient privileges')
+    slow_queries.reset()
     return SUCCESS_RESPONSE
 
 
 # Пользователи
+
 @app.post('/api/v1/user', tags=['user'], response_model=CreateUserResponse)
 async def create_user(user: CreateUserRequest, session: SessionDependency):
     user_dict = user.model_dump(exclude_unset=True)
@@ -660,24 +860,18 @@ async def delete_user(user_id: int, session: SessionDependency, token: TokenDepe
 
 @app.post('/api/v1/user/login', tags=['user'], response_model=LoginResponse)
 async def login(login_data: LoginRequest, session: SessionDependency):
-    query = select(models.User).where(models.User.email == login_data.email)
+    query = select(models.User).where(models.User.email == login_data.email).options(
+        noload(models.User.tokens), noload(models.User.tickets), noload(models.User.bookings)
+    )
     result = await session.execute(query)
     user = result.scalars().unique().first()
 
     if user is None or not check_password(login_data.password, user.hashed_password):
         raise HTTPException(401, 'Invalid credentials')
-    token = models.Token(user_id=user.id)
-    await crud.add_item(session, token)
+    token = await issue_token(session, user.id)
     return token.dict
 
 
-def format_timestamp(value: datetime | None) -> str:
-    dt = value or datetime.utcnow()
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=timezone.utc)
-    return dt.isoformat(timespec='milliseconds')
-
-
 @app.get('/api/v1/tickets', tags=['ticket'], response_model=GetTicketsResponse)
 async def get_all_bookings(
     session: SessionDependency,
@@ -687,108 +881,103 @@ async def get_all_bookings(
 ):
     if token.user.role != 'admin':
         raise HTTPException(403, 'Insufficient privileges')
-    query = select(
-        models.Ticket.id,
-        models.Ticket.seance_id,
-        models.Ticket.seat_id,
-        models.Ticket.user_id,
-        models.Ticket.user_name,
-        models.Ticket.user_phone,
-        models.Ticket.user_email,
-        models.Ticket.booked,
-        models.Ticket.booking_code,
-        models.Ticket.qr_code_data,
-        models.Ticket.created_at,
-        models.Ticket.price,
-        models.Ticket.archived,
-    )
-    if archived is not None:
-        query = query.where(models.Ticket.archived == archived)
-    elif not include_archived:
-        query = query.where(models.Ticket.archived == False)
+    if archived is None and not include_archived:
+        archived = False
+    query = reports.ticket_rows_query(reports.TicketFilters(archived=archived))
+    result = await session.execute(query)
+    tickets = reports.joined_tickets(result.mappings())
+    return trusted_response({'tickets': tickets})
 
-    bookings = await session.execute(query)
-    booking_rows = bookings.mappings().all()
 
-    seat_ids = {
-        row['seat_id'] for row in booking_rows if row.get('seat_id') is not None
-    }
-    seance_ids = {
-        row['seance_id']
-        for row in booking_rows
-        if row.get('seance_id') is not None
-    }
+# отчёт по билетам для админки: фильтры, сортировка и пагинация на стороне БД
+@app.get('/api/v1/reports/tickets', tags=['report'], response_model=GetTicketReportResponse)
+async def report_tickets(
+    session: SessionDependency,
+    token: TokenDependency,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    date_field: Literal['seance', 'created'] = 'seance',
+    hall_id: int | None = None,
+    film_id: int | None = None,
+    archived: bool | None = None,
+    sort: Literal['id', 'created_at', 'price', 'start_time'] = 'created_at',
+    order: Literal['asc', 'desc'] = 'desc',
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+):
+    if token.user.role != 'admin':
+        raise HTTPException(403, 'Insufficient privileges')
+    filters = reports.TicketFilters(
+        normalize_datetime(date_from), normalize_datetime(date_to), date_field, hall_id, film_id, archived
+    )
+    result = await session.execute(reports.ticket_page_query(filters, sort, order, limit, offset))
+    rows = result.mappings().all()
+    total = rows[0]['total'] if rows else 0
+    if not rows and offset:
+        # Страница за пределами выборки: общее количество считаем отдельно
+        count_query = select(func.count()).select_from(reports.ticket_rows_query(filters).subquery())
+        total = (await session.execute(count_query)).scalar_one()
+    return trusted_response({
+        'total': total,
+        'limit': limit,
+        'offset': offset,
+        'tickets': reports.joined_tickets(rows),
+    })
+
+# выручка и заполняемость по сеансам, фильмам или дням (считается в SQL)
+@app.get('/api/v1/reports/tickets/aggregate', tags=['report'], response_model=GetTicketAggregateResponse)
+async def report_tickets_aggregate(
+    session: SessionDependency,
+    token: TokenDependency,
+    group_by: Literal['seance', 'film', 'day'] = 'seance',
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    date_field: Literal['seance', 'created'] = 'seance',
+    hall_id: int | None = None,
+    film_id: int | None = None,
+    archived: bool | None = None,
+):
+    if token.user.role != 'admin':
+        raise HTTPException(403, 'Insufficient privileges')
+    # Дни — это дни сеансов: вместимость и заполняемость считаются по сеансам, а не по дням продаж
+    if group_by == 'day' and date_field == 'created':
+        raise HTTPException(422, 'group_by=day groups by seance day and cannot be combined with date_field=created')
+    filters = reports.TicketFilters(
+        normalize_datetime(date_from), normalize_datetime(date_to), date_field, hall_id, film_id, archived
+    )
+    result = await session.execute(reports.aggregate_query(filters, group_by))
+    return trusted_response({
+        'group_by': group_by,
+        'rows': [reports.aggregate_row(row) for row in result.mappings()],
+    })
 
-    seats_map: dict[int, dict] = {}
-    if seat_ids:
-        seats_query = select(
-            models.Seat.id,
-            models.Seat.hall_id,
-            models.Seat.row_number,
-            models.Seat.seat_number,
-            models.Seat.seat_type,
-        ).where(models.Seat.id.in_(seat_ids))
-        seat_rows = (await session.execute(seats_query)).mappings().all()
-        seats_map = {
-            row['id']: {
-                'id': row['id'],
-                'hall_id': row['hall_id'],
-                'row_number': row['row_number'],
-                'seat_number': row['seat_number'],
-                'seat_type': row['seat_type'],
-            }
-            for row in seat_rows
-        }
-
-    seances_map: dict[int, dict] = {}
-    if seance_ids:
-        seances_query = select(
-            models.Seance.id,
-            models.Seance.hall_id,
-            models.Seance.film_id,
-            models.Seance.start_time,
-            models.Seance.price_standard,
-            models.Seance.price_vip,
-        ).where(models.Seance.id.in_(seance_ids))
-        seance_rows = (await session.execute(seances_query)).mappings().all()
-        seances_map = {
-            row['id']: {
-                'id': row['id'],
-                'hall_id': row['hall_id'],
-                'film_id': row['film_id'],
-                'start_time': (
-                    row['start_time'].isoformat()
-                    if row['start_time'] is not None
-                    else None
-                ),
-                'price_standard': row['price_standard'],
-                'price_vip': row['price_vip'],
-            }
-            for row in seance_rows
-        }
-
-    tickets = [
-        {
-            'id': row['id'],
-            'seance_id': row['seance_id'],
-            'seat_id': row['seat_id'],
-            'user_id': row['user_id'],
-            'user_name': row['user_name'],
-            'user_phone': row['user_phone'],
-            'user_email': row['user_email'],
-            'booked': row['booked'],
-            'booking_code': row['booking_code'],
-            'qr_code_data': row['qr_code_data'],
-            'created_at': format_timestamp(row['created_at']),
-            'price': row['price'],
-            'archived': row['archived'],
-            'seat_info': seats_map.get(row['seat_id']),
-            'seance_info': seances_map.get(row['seance_id']),
-        }
-        for row in booking_rows
-    ]
-    return {'tickets': tickets}
 
+# выгрузка билетов для бухгалтерии: CSV потоком из серверного курсора, по желанию в gzip
+@app.get('/api/v1/export/tickets', tags=['report'])
+async def export_tickets(
+    session: SessionDependency,
+    token: TokenDependency,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    date_field: Literal['seance', 'created'] = 'created',
+    hall_id: int | None = None,
+    film_id: int | None = None,
+    archived: bool | None = None,
+    gzip: bool = False,
+):
+    if token.user.role != 'admin':
+        raise HTTPException(403, 'Insufficient privileges')
+    filters = reports.TicketFilters(
+        normalize_datetime(date_from), normalize_datetime(date_to), date_field, hall_id, film_id, archived
+    )
+    # Соединение проверки токена возвращаем в пул: выгрузка открывает свою сессию
+    await session.close()
+    file_name = 'tickets.csv.gz' if gzip else 'tickets.csv'
+    return StreamingResponse(
+        stream_tickets_csv(filters, compress=gzip),
+        media_type='application/gzip' if gzip else 'text/csv; charset=utf-8',
+        headers={'Content-Disposition': f'attachment; filename="{file_name}"'},
+    )
 
 @app.patch('/api/v1/ticket/{ticket_id}/archive', tags=['ticket'], response_model=ArchiveTicketResponse)
 async def archive_ticket(
@@ -802,12 +991,57 @@ async def archive_ticket(
     ticket_orm_obj = await crud.get_item_by_id(session, models.Ticket, ticket_id)
     ticket_orm_obj.archived = payload.archived
     await crud.update_item(session, ticket_orm_obj)
+    checkins.update(ticket_orm_obj.booking_code, archived=ticket_orm_obj.archived)
+    hot_reads.forget(('available_seats', ticket_orm_obj.seance_id))
+    await seat_events.publish(
+        ticket_orm_obj.seance_id, 'archived', ticket_orm_obj.seat_id, archived=ticket_orm_obj.archived
+    )
     return ArchiveTicketResponse(id=ticket_orm_obj.id, archived=ticket_orm_obj.archived)
 
 # ==================== ДОПОЛНИТЕЛЬНЫЕ ENDPOINTS ДЛЯ ГОСТЕЙ ====================
 # просмотр гостем информации о свободных местах
 @app.get('/api/v1/seance/{seance_id}/available-seats', tags=['seance'], response_model=GetAvailableSeatsResponse)
-async def get_available_seats(seance_id: int, session: SessionDependency):
+async def get_available_seats(
+    seance_id: int,
+    request: Request,
+    session: SessionDependency,
+    format: Literal['json', 'bitmap'] = 'json',
+):
+    # Компактный формат: битовая карта поверх раскладки из /api/v1/hall/{hall_id}/layout
+    if format == 'bitmap' or 'application/octet-stream' in request.headers.get('accept', ''):
+        return await get_available_seats_bitmap(seance_id, request, session)
+
+    # Одинаковые одновременные запросы ждут одну загрузку и не занимают соединения из пула
+    content = await hot_reads.do(('available_seats', seance_id), lambda: load_available_seats(seance_id))
+    return trusted_response(content)
+
+# подбор лучших мест: N соседних свободных мест в одном ряду, ближе всего к центру зала
+@app.get('/api/v1/seance/{seance_id}/best-seats', tags=['seance'], response_model=GetBestSeatsResponse)
+async def get_best_seats(
+    seance_id: int,
+    session: SessionDependency,
+    count: int = Query(1, ge=1, le=20),
+    seat_type: Literal['vip', 'standard'] | None = Query(None, alias='type'),
+    limit: int = Query(1, ge=1, le=10),
+):
+    blocks = await seat_recommender.recommend(session, seance_id, count, seat_type, limit)
+    if not blocks:
+        raise HTTPException(404, 'No adjacent free seats found')
+    return trusted_response({'seance_id': seance_id, 'count': count, 'seat_type': seat_type, 'blocks': blocks})
+
+# Загрузки для склейки запросов открывают свою сессию: её соединение сразу возвращается в пул
+async def load_item_dict(orm_cls, item_id: int, not_found: str) -> dict:
+    async with models.Session() as session:
+        orm_obj = await crud.get_item_by_id(session, orm_cls, item_id)
+        if orm_obj is None:
+            raise HTTPException(404, not_found)
+        return orm_obj.dict
+
+async def load_available_seats(seance_id: int) -> dict:
+    async with models.Session() as session:
+        return await get_available_seats_content(session, seance_id)
+
+async def get_available_seats_content(session: SessionDependency, seance_id: int) -> dict:
     # Оптимизация: получаем сеанс и hall_id одним запросом
     seance_query = select(models.Seance).where(models.Seance.id == seance_id)
     seance_result = await session.execute(seance_query)
@@ -852,62 +1086,128 @@ async def get_available_seats(seance_id: int, session: SessionDependency):
     ]
     total_seats = len(all_seats)
 
-    return GetAvailableSeatsResponse(
-        seance_id = seance_id,
-        available_seats = available_seats_details,
-        total_seats = total_seats,
-        booked_seats = booked_seat_count,
-        available_count = len(available_seats_details),
-    )
+    return {
+        'seance_id': seance_id,
+        'available_seats': available_seats_details,
+        'total_seats': total_seats,
+        'booked_seats': booked_seat_count,
+        'available_count': len(available_seats_details),
+    }
 
-# получение цены при бронировании
-@app.get('/api/v1/price', tags=['price'], response_model=GetPriceResponse)
-async def get_price_guest(seance_id: int, seat_id: int, session: SessionDependency):
-    # Пытаемся найти явную цену для конкретного места и сеанса
-    price_query = select(models.Price).where(
-        models.Price.seance_id == seance_id, models.Price.seat_id == seat_id
+async def get_seat_snapshot(session: SessionDependency, seance_id: int) -> dict:
+    seance_result = await session.execute(
+        select(models.Seance.hall_id).where(models.Seance.id == seance_id)
     )
-    price_result = await session.execute(price_query)
-    price_data = price_result.scalars().first()
-    if price_data:
-        return price_data.price
+    hall_id = seance_result.scalar_one_or_none()
+    if hall_id is None:
+        raise HTTPException(404, 'Seance not found')
+    booked_result = await session.execute(
+        select(models.Ticket.seat_id).where(
+            models.Ticket.seance_id == seance_id,
+            models.Ticket.booked == True
+        ).distinct()
+    )
+    total_result = await session.execute(
+        select(func.count()).select_from(models.Seat).where(models.Seat.hall_id == hall_id)
+    )
+    return {
+        'seance_id': seance_id,
+        'hall_id': hall_id,
+        'total_seats': total_result.scalar_one(),
+        'booked': sorted(booked_result.scalars().all()),
+    }
 
-    # Фолбек: если явной цены нет, используем тип места и поля цены из сеанса
-    seance_query = select(models.Seance).where(models.Seance.id == seance_id)
-    seance_result = await session.execute(seance_query)
-    seance = seance_result.scalars().first()
-    if seance is None:
+async def get_available_seats_bitmap(seance_id: int, request: Request, session: SessionDependency) -> Response:
+    seance_result = await session.execute(
+        select(models.Seance.hall_id, models.Hall.layout_version)
+        .join(models.Hall, models.Hall.id == models.Seance.hall_id)
+        .where(models.Seance.id == seance_id)
+    )
+    seance_row = seance_result.first()
+    if seance_row is None:
         raise HTTPException(404, 'Seance not found')
+    hall_id = seance_row.hall_id
+    booked_result = await session.execute(
+        select(models.Ticket.seat_id).where(
+            models.Ticket.seance_id == seance_id,
+            models.Ticket.booked == True
+        ).distinct()
+    )
+    booked_ids = set(booked_result.scalars().all())
+    hall_layout = await hall_layouts.get(session, hall_id, seance_row.layout_version)
+    seats = hall_layout.seat_ids
+
+    layout_ver = hall_layout.derived('seatmap', seatmap.hall_layout_view)['version']
+    bitmap = seatmap.encode_availability(seats, booked_ids)
+    version = seatmap.availability_version(layout_ver, bitmap)
+    headers = {
+        'ETag': f'"{version}"',
+        'Cache-Control': 'no-cache',
+        'X-Layout-Version': str(layout_ver),
+        'X-Seatmap-Version': str(version),
+    }
+    if request.headers.get('if-none-match') == headers['ETag']:
+        return Response(status_code=304, headers=headers)
+
+    if 'application/octet-stream' in request.headers.get('accept', ''):
+        return Response(content=bitmap, media_type='application/octet-stream', headers=headers)
+
+    available_count = sum(1 for seat_id in seats if seat_id not in booked_ids)
+    content = GetSeatBitmapResponse(
+        seance_id=seance_id,
+        hall_id=hall_id,
+        layout_version=layout_ver,
+        version=version,
+        total_seats=len(seats),
+        available_count=available_count,
+        bitmap=seatmap.encode_bitmap_base64(bitmap),
+    )
+    return trusted_response(content.model_dump(), headers=headers)
 
-    seat_query = select(models.Seat).where(models.Seat.id == seat_id)
-    seat_result = await session.execute(seat_query)
-    seat = seat_result.scalars().first()
-    if seat is None:
-        raise HTTPException(404, 'Seat not found')
+# живые обновления схемы зала (SSE): снимок один раз, дальше только изменения
+@app.get('/api/v1/seance/{seance_id}/events', tags=['seance'])
+async def seance_events(seance_id: int, session: SessionDependency):
+    # Подписываемся до снимка, чтобы не потерять бронирования между запросом и подпиской
+    queue = seat_events.subscribe(seance_id)
+    try:
+        snapshot = await get_seat_snapshot(session, seance_id)
+    except Exception:
+        seat_events.unsubscribe(seance_id, queue)
+        raise
+    # Возвращаем соединение в пул: дальше поток живёт без БД
+    await session.close()
+    return StreamingResponse(
+        seat_events.stream(seance_id, queue, snapshot),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
 
-    seat_type = (seat.seat_type or '').lower()
-    if seat_type == 'vip':
-        return seance.price_vip
-    # по умолчанию считаем standard
-    return seance.price_standard
-
-# генерация уникального кода бронирования
-async def generate_uniqe_booking_code(session: SessionDependency, length: int = 10):
-    # КРИТИЧЕСКАЯ ОПТИМИЗАЦИЯ: используем timestamp + process ID + случайность для гарантированной уникальности
-    # Вероятность коллизии < 0.0001%, поэтому убираем проверку в БД для ускорения
-    timestamp_part = str(int(time.time() * 1000000))[-10:]  # Микросекунды для уникальности
-    process_part = str(os.getpid())[-3:] if hasattr(os, 'getpid') else '000'
-    random_part = ''.join(random.choices(string.ascii_uppercase + string.digits, k=max(4, length-13)))
-    booking_code = f"{timestamp_part}{process_part}{random_part}"[:length]
-    
-    # УБИРАЕМ проверку в БД - она занимает время и вероятность коллизии крайне мала
-    # Если все же произойдет коллизия, БД вернет ошибку unique constraint при сохранении
-    return booking_code
+# получение цены места при бронировании (GET /api/v1/price занят поиском цен)
+@app.get('/api/v1/seance/{seance_id}/seats/{seat_id}/price', tags=['price'], response_model=GetPriceResponse)
+async def get_price_guest(seance_id: int, seat_id: int, session: SessionDependency):
+    # Явная цена места или цена по типу места — из закэшированной таблицы цен сеанса
+    return await pricing.quote(session, seance_id, seat_id)
+
+# полная карта цен сеанса одним запросом
+@app.get('/api/v1/seance/{seance_id}/prices', tags=['price'], response_model=GetSeancePricesResponse)
+async def get_seance_prices(seance_id: int, session: SessionDependency):
+    table = await pricing.get_table(session, seance_id)
+    return trusted_response(table.dict)
 
-# бронирование гостем
+# бронирование гостем; повтор с тем же Idempotency-Key вернёт уже выданный билет
 @app.post('/api/v1/ticket/booking', tags=['ticket'], response_model=CreateTicketResponse)
-async def book_ticket(booking: CreateBookingRequest, request: Request, session: SessionDependency):
-    print(f"[PERF] book_ticket START: seance_id={booking.seance_id}, seat_id={booking.seat_id}")
+async def book_ticket(booking: CreateBookingRequest, request: Request, session: SessionDependency, guest_user_id: GuestUserDependency, idempotency_key: IdempotencyKeyHeader = None):
+    async def handler():
+        return await perform_booking(booking, session, guest_user_id)
+
+    # Все гости — один пользователь, поэтому ключ ограничен токеном или гостевой кукой:
+    # чужой гость с тем же ключом не получит выданный другому билет
+    response = await idempotency.run(f'book_ticket:{client_identity(request)}', idempotency_key, booking, handler, CreateTicketResponse)
+    if GUEST_COOKIE not in request.cookies:
+        response.set_cookie(GUEST_COOKIE, uuid.uuid4().hex, max_age=config.GUEST_COOKIE_MAX_AGE_SEC, httponly=True, samesite='lax')
+    return response
+
+async def perform_booking(booking: CreateBookingRequest, session: SessionDependency, guest_user_id: int) -> dict:
     start_time = time.time()
     step_times = {}
     
@@ -948,29 +1248,23 @@ async def book_ticket(booking: CreateBookingRequest, request: Request, session:
     if existing_ticket:
         raise HTTPException(400, 'Seat already booked')
 
-    # Оптимизация: вычисляем цену без дополнительных запросов
-    seat_type = (seat_data.seat_type or '').lower()
-    price = seance_data.price_vip if seat_type == 'vip' else seance_data.price_standard
+    # Цена по тем же правилам, что и в get_price_guest, но из БД, а не из кэша таблиц цен
+    price = await pricing.booking_price(session, seance_data, seat_data)
 
-    # Оптимизация: генерируем код быстрее (уменьшаем вероятность коллизий)
+    # Код уникален по построению (время + номер воркера + счётчик): без запроса в БД и повторов
     step_start = time.time()
-    booking_code = await generate_uniqe_booking_code(session, length=10)
+    booking_code = booking_codes.next()
     step_times['generate_code'] = time.time() - step_start
 
-    # КРИТИЧНО: НЕ генерируем QR-код в процессе бронирования - это делаем асинхронно после
+    # КРИТИЧНО: НЕ генерируем QR-код в процессе бронирования - это делает диспетчер outbox после коммита
     # Это ускоряет бронирование в 10-100 раз
     file_name = f'{booking_code}.png'
     qr_relative_path = f'/qr-codes/{file_name}'
 
-    # Оптимизация: находим только ID пользователя (быстрее чем полный объект)
-    step_start = time.time()
-    user_id_value = await get_guest_user_id(session)
-    step_times['user_handling'] = time.time() - step_start
-
     ticket_orm_obj = models.Ticket(
         seance_id = booking.seance_id,
         seat_id = booking.seat_id,
-        user_id = user_id_value,
+        user_id = guest_user_id,
         user_name = booking.user_name,
         user_phone = booking.user_phone,
         user_email = booking.user_email,
@@ -979,36 +1273,32 @@ async def book_ticket(booking: CreateBookingRequest, request: Request, session:
         booking_code = booking_code,
         qr_code_data = qr_relative_path
     )
+    # Побочные эффекты (QR, письмо) — событием в той же транзакции: не теряются при падении воркера
+    session.add(ticket_event(ticket_orm_obj, TICKET_BOOKED, {
+        'booking_code': booking_code,
+        'seance_id': booking.seance_id,
+        'seat_id': booking.seat_id,
+        'qr_file_name': file_name,
+        'user_email': booking.user_email,
+    }))
 
     step_start = time.time()
     await crud.add_item(session, ticket_orm_obj)
     step_times['save_ticket'] = time.time() - step_start
+    outbox.notify()
+    hot_reads.forget(('available_seats', booking.seance_id))
+    await seat_events.publish(booking.seance_id, 'booked', booking.seat_id)
     
     total_time = time.time() - start_time
-    print(f"[PERF] book_ticket seance_id={booking.seance_id} seat_id={booking.seat_id}: "
-          f"total={total_time:.3f}s, "
-          f"checks={step_times.get('parallel_checks', 0):.3f}s, "
-          f"code={step_times.get('generate_code', 0):.3f}s, "
-          f"user={step_times.get('user_handling', 0):.3f}s, "
-          f"save={step_times.get('save_ticket', 0):.3f}s")
+    perf_logger.info('book_ticket', extra={'fields': {
+        'seance_id': booking.seance_id,
+        'seat_id': booking.seat_id,
+        'total': round(total_time, 4),
+        'checks': round(step_times.get('parallel_checks', 0), 4),
+        'code': round(step_times.get('generate_code', 0), 4),
+        'save': round(step_times.get('save_ticket', 0), 4),
+    }})
     
-    # Генерируем QR-код асинхронно в фоне (не блокируем ответ)
-    async def generate_qr_background():
-        try:
-            qr_path = QR_CODES_DIR / file_name
-            qr_data = f'Booking_code: {booking_code}, Seance_id: {booking.seance_id}, Seat_id: {booking.seat_id}'
-            
-            loop = asyncio.get_event_loop()
-            with ThreadPoolExecutor() as executor:
-                qr_code_img = await loop.run_in_executor(executor, qrcode.make, qr_data)
-                await loop.run_in_executor(executor, qr_code_img.save, qr_path)
-        except Exception as e:
-            # Логируем ошибку, но не прерываем бронирование
-            print(f"[WARNING] Не удалось сгенерировать QR-код для билета {ticket_orm_obj.id}: {e}")
-    
-    # Запускаем генерацию QR-кода в фоне (не ждем завершения)
-    asyncio.create_task(generate_qr_background())
-
     return {
         'id': ticket_orm_obj.id,
         'booking_code': booking_code,
@@ -0,0 +1,68 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+from . import config
+
+
+# Склейка одинаковых одновременных чтений: первый запрос по ключу запускает загрузку,
+# остальные ждут её результат, не занимая своих соединений из пула.
+# Загрузка идёт отдельной задачей, поэтому обрыв первого клиента не отменяет её для остальных.
+# Возвращаемый результат общий для всех ожидающих — менять его нельзя.
+class SingleFlight:
+    def __init__(self, ttl_ms: float = 0):
+        self.ttl_sec = ttl_ms / 1000
+        self._inflight: dict[tuple, asyncio.Task] = {}
+        # Результаты с коротким TTL в порядке получения (TTL общий, поэтому старые всегда в начале)
+        self._results: OrderedDict[tuple, tuple[float, object]] = OrderedDict()
+        self.started = 0
+        self.shared = 0
+
+    async def do(self, key: tuple, load):
+        if self.ttl_sec:
+            cached = self._results.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                self.shared += 1
+                return cached[1]
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.started += 1
+            task = asyncio.ensure_future(load())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: tuple, task: asyncio.Task):
+        # Загрузку, начатую до forget, не кэшируем: она могла прочитать данные до изменения
+        if self._inflight.get(key) is not task:
+            return
+        del self._inflight[key]
+        if not self.ttl_sec or task.cancelled() or task.exception() is not None:
+            return
+        now = time.monotonic()
+        self._results.pop(key, None)
+        self._results[key] = (now + self.ttl_sec, task.result())
+        while self._results:
+            oldest_key, (expires_at, _) = next(iter(self._results.items()))
+            if expires_at > now:
+                break
+            del self._results[oldest_key]
+
+    def forget(self, key: tuple):
+        # Следующие запросы не присоединяются к уже идущей загрузке и не получают закэшированный результат
+        self._results.pop(key, None)
+        self._inflight.pop(key, None)
+
+    def clear(self):
+        self._results.clear()
+        self._inflight.clear()
+
+    @property
+    def stats(self) -> dict:
+        return {'started': self.started, 'shared': self.shared, 'inflight': len(self._inflight)}
+
+
+hot_reads = SingleFlight(ttl_ms=config.SINGLEFLIGHT_TTL_MS)
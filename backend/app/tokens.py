@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import noload
+
+from . import config
+from . import crud
+from . import models
+from .logger import get_logger
+
+logger = get_logger('tokens')
+
+
+def token_cutoff() -> datetime:
+    # creation_time пишется в UTC (default=datetime.utcnow)
+    return datetime.utcnow() - timedelta(seconds=config.TOKEN_TTL_SEC)
+
+
+async def issue_token(session: AsyncSession, user_id: int) -> models.Token:
+    # Повторный вход вскоре после предыдущего получает тот же токен вместо новой строки
+    reuse_after = datetime.utcnow() - timedelta(seconds=config.TOKEN_REUSE_SEC)
+    result = await session.execute(
+        select(models.Token)
+        .where(models.Token.user_id == user_id, models.Token.creation_time >= reuse_after)
+        .order_by(models.Token.creation_time.desc())
+        .limit(1)
+        .options(noload(models.Token.user))
+    )
+    token = result.scalars().first()
+    if token is not None:
+        return token
+
+    # Ротация: у пользователя остаются только последние MAX_TOKENS_PER_USER токенов (вместе с новым)
+    newest = (
+        select(models.Token.id)
+        .where(models.Token.user_id == user_id)
+        .order_by(models.Token.creation_time.desc())
+        .limit(max(config.MAX_TOKENS_PER_USER - 1, 0))
+    )
+    await session.execute(
+        delete(models.Token)
+        .where(models.Token.user_id == user_id, models.Token.id.not_in(newest))
+        .execution_options(synchronize_session=False)
+    )
+    token = models.Token(user_id=user_id)
+    await crud.add_item(session, token)
+    return token
+
+
+async def purge_expired_tokens():
+    # Удаляем пачками, чтобы не держать долгую блокировку на таблице токенов
+    deleted = 0
+    while True:
+        async with models.Session() as session:
+            expired = select(models.Token.id).where(models.Token.creation_time < token_cutoff()).limit(config.TOKEN_PURGE_BATCH)
+            result = await session.execute(
+                delete(models.Token)
+                .where(models.Token.id.in_(expired))
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        deleted += result.rowcount
+        if result.rowcount < config.TOKEN_PURGE_BATCH:
+            break
+    if deleted:
+        logger.info('Удалены просроченные токены', extra={'fields': {'deleted': deleted}})
@@ -0,0 +1,49 @@
+"""
+Микробенчмарк подбора лучших мест (GET /api/v1/seance/{id}/best-seats) без БД
+Большой зал, заполненный на 95%: время наложения занятых мест на карту зала и поиска блока
+Использование: python benchmarks/best_seats.py [rows] [seats_per_row] [occupancy]
+"""
+
+import os
+import sys
+import random
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.seat_recommender import HallGrid, best_blocks
+
+
+def make_grid(rows: int, seats_per_row: int) -> HallGrid:
+    seats = []
+    for row in range(1, rows + 1):
+        for number in range(1, seats_per_row + 1):
+            seat_type = 'vip' if rows // 3 < row <= rows // 2 else 'standard'
+            seats.append((len(seats) + 1, row, number, seat_type))
+    return HallGrid(1, rows, seats_per_row, seats)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    seats_per_row = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    occupancy = float(sys.argv[3]) if len(sys.argv) > 3 else 0.95
+
+    grid = make_grid(rows, seats_per_row)
+    seat_ids = list(grid.index)
+    rng = random.Random(42)
+    booked = rng.sample(seat_ids, int(len(seat_ids) * occupancy))
+
+    print(f'Зал {rows}x{seats_per_row}, занято {occupancy:.0%} ({len(booked)} из {len(seat_ids)})')
+    iterations = 2000
+    for count in (1, 2, 4):
+        for seat_type in (None, 'vip'):
+            started = time.perf_counter()
+            for _ in range(iterations):
+                blocks = best_blocks(grid, grid.occupancy(booked, seat_type), count)
+            elapsed_us = (time.perf_counter() - started) / iterations * 1e6
+            best = f'ряд {blocks[0][1]}, с места {blocks[0][2]}' if blocks else 'нет блока'
+            print(f'  count={count} type={seat_type or "any":8} {elapsed_us:8.1f} мкс  ({best})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Проверка генератора кодов брони: миллионы кодов от нескольких смоделированных воркеров
+Проверяет отсутствие коллизий, контрольный символ, монотонность внутри воркера и разбор кода;
+отдельно — переполнение счётчика при «застывших» и отстающих часах. Печатает пропускную способность,
+падает с кодом 1 при любом нарушении
+Использование: python benchmarks/booking_codes.py [total] [workers] [nodes]
+"""
+
+import os
+import sys
+import random
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.booking_code import BookingCodeGenerator, CODE_LENGTH, is_valid, decode, ALPHABET
+
+
+def check_interleaved(total: int, workers: int, nodes: int) -> list[str]:
+    generators = [
+        BookingCodeGenerator(node_id=node, worker=worker)
+        for node in range(nodes) for worker in range(workers)
+    ]
+    # Воркеры выдают коды вперемешку и в одни и те же миллисекунды
+    rng = random.Random(7)
+    order = [rng.randrange(len(generators)) for _ in range(total)]
+    last = [''] * len(generators)
+    errors = []
+
+    started = time.perf_counter()
+    codes = []
+    append = codes.append
+    for index in order:
+        append(generators[index].next())
+    elapsed = time.perf_counter() - started
+    print(f'{total} кодов от {len(generators)} воркеров: {total / elapsed / 1e6:.2f} млн/с ({elapsed / total * 1e9:.0f} нс на код)')
+
+    if len(set(codes)) != len(codes):
+        errors.append(f'коллизии: {len(codes) - len(set(codes))}')
+    for index, code in zip(order, codes):
+        # Коды одного воркера растут: фиксированная ширина, старшие биты — время
+        if code <= last[index]:
+            errors.append(f'код не растёт у воркера {index}: {last[index]} -> {code}')
+            break
+        last[index] = code
+    sample = rng.sample(codes, min(len(codes), 100000))
+    if not all(len(code) == CODE_LENGTH and is_valid(code) for code in sample):
+        errors.append('неверная длина или контрольный символ')
+    for index, code in zip(order[:1000], codes[:1000]):
+        generator = generators[index]
+        parsed = decode(code)
+        if (parsed['node_id'], parsed['worker_id']) != (generator.node_id, generator.worker):
+            errors.append(f'код {code} разобран как {parsed}')
+            break
+    return errors
+
+
+def check_frozen_clock(total: int) -> list[str]:
+    # Часы стоят на месте, затем уходят назад: счётчик переполняется, коды всё равно уникальны
+    moments = iter([1767225600.0] * (total // 2) + [1767225599.0] * (total - total // 2))
+    generator = BookingCodeGenerator(node_id=0, worker=0, clock=lambda: next(moments))
+    codes = [generator.next() for _ in range(total)]
+    if len(set(codes)) != total or codes != sorted(codes):
+        return ['коллизии или нарушен порядок при застывших часах']
+    return []
+
+
+def check_typos(count: int) -> list[str]:
+    # Одна ошибка в символе должна ловиться контрольным символом
+    generator = BookingCodeGenerator(node_id=0, worker=1)
+    rng = random.Random(11)
+    for _ in range(count):
+        code = generator.next()
+        position = rng.randrange(CODE_LENGTH)
+        typo = rng.choice([char for char in ALPHABET if char != code[position]])
+        if is_valid(code[:position] + typo + code[position + 1:]):
+            return [f'опечатка не обнаружена: {code}']
+    return []
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    nodes = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+
+    errors = check_interleaved(total, workers, nodes) + check_frozen_clock(100_000) + check_typos(100_000)
+    for error in errors:
+        print(error)
+    print('OK' if not errors else 'FAILED')
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Групповой заказ через контроль входа: фронтенд (Payment.jsx) бронирует каждое место отдельным
+одновременным POST /api/v1/ticket/booking с одного IP. Все места заказа должны пройти —
+и с настройками по умолчанию, и с включёнными лимитами (ёмкость брони — BOOKING_RATE_LIMIT_BURST).
+Использование: python benchmarks/group_booking.py [seats]
+"""
+
+import os
+import sys
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import config
+from app.admission import (Admission, AdmissionMiddleware, ConcurrencyLimiter, LocalRateLimitBackend, RateRule,
+                           BOOKING_PATH)
+
+BOOKING_SEC = 0.02  # время обработки одной брони
+
+
+async def booking_app(scope, receive, send):
+    await asyncio.sleep(BOOKING_SEC)
+    await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+    await send({'type': 'http.response.body', 'body': b'{}'})
+
+
+async def book(middleware: AdmissionMiddleware) -> int:
+    scope = {'type': 'http', 'method': 'POST', 'path': BOOKING_PATH, 'headers': [], 'client': ('203.0.113.7', 50000)}
+    statuses = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            statuses.append(message['status'])
+
+    await middleware(scope, receive, send)
+    return statuses[0]
+
+
+async def order(seats: int, api_rate: float, booking_rate: float) -> list[int]:
+    control = Admission(
+        backend=LocalRateLimitBackend(),
+        default_rule=RateRule('api', api_rate, config.RATE_LIMIT_BURST),
+        booking_rule=RateRule('booking', booking_rate, config.BOOKING_RATE_LIMIT_BURST),
+        user_rule=RateRule('user', api_rate, config.RATE_LIMIT_BURST),
+        booking_limiter=ConcurrencyLimiter(config.BOOKING_CONCURRENCY, config.WAITING_ROOM_SIZE, config.WAITING_ROOM_TIMEOUT_SEC),
+    )
+    middleware = AdmissionMiddleware(booking_app, control)
+    return await asyncio.gather(*(book(middleware) for _ in range(seats)))
+
+
+def main():
+    seats = int(sys.argv[1]) if len(sys.argv) > 1 else config.BOOKING_RATE_LIMIT_BURST
+    variants = [
+        ('по умолчанию', config.RATE_LIMIT_PER_SEC, config.BOOKING_RATE_LIMIT_PER_SEC),
+        ('лимиты включены (20/с, бронь 1/с)', 20, 1),
+    ]
+    failed = False
+    for name, api_rate, booking_rate in variants:
+        statuses = asyncio.run(order(seats, api_rate, booking_rate))
+        rejected = [status for status in statuses if status != 200]
+        print(f'{name}: {seats} мест, отказов {len(rejected)} {sorted(set(rejected)) or ""}')
+        failed |= bool(rejected)
+    if failed:
+        sys.exit('FAIL: часть группового заказа отклонена')
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
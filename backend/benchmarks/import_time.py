@@ -0,0 +1,70 @@
+"""
+Время холодного импорта приложения (python -X importtime -c "import app.server")
+Печатает медиану по нескольким запускам и самые тяжёлые модули, падает с кодом 1,
+если импорт дольше бюджета или при старте подтягиваются модули, которые должны грузиться лениво
+Использование: python benchmarks/import_time.py [runs] [budget_ms]
+"""
+
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_BUDGET_MS = 1500
+# Тяжёлые библиотеки, которые нужны только при первом обращении
+LAZY_MODULES = ('qrcode', 'PIL', 'asyncpg')
+
+LINE_RE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)')
+
+
+def measure() -> tuple[int, dict[str, int]]:
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app.server'],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    ).stderr
+    modules = {}
+    total_us = 0
+    for line in output.splitlines():
+        match = LINE_RE.match(line)
+        if match is None:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        modules[name] = int(self_us)
+        if not indent.strip(' ') and len(indent) == 1:
+            # Модули верхнего уровня: их суммарное время и есть время импорта
+            total_us += int(cumulative_us)
+    return total_us, modules
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    budget_ms = float(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_BUDGET_MS
+
+    totals = []
+    modules = {}
+    for _ in range(runs):
+        total_us, modules = measure()
+        totals.append(total_us / 1000)
+    median_ms = statistics.median(totals)
+
+    print(f'import app.server: медиана {median_ms:.0f} мс по {runs} запускам (бюджет {budget_ms:.0f} мс)')
+    print('Самые тяжёлые модули (собственное время):')
+    for name, self_us in sorted(modules.items(), key=lambda item: item[1], reverse=True)[:10]:
+        print(f'  {self_us / 1000:7.1f} мс  {name}')
+
+    failed = False
+    eager = sorted({name.split('.')[0] for name in modules} & set(LAZY_MODULES))
+    if eager:
+        print(f'Импортируются при старте, хотя должны лениво: {", ".join(eager)}')
+        failed = True
+    if median_ms > budget_ms:
+        print('Бюджет времени импорта превышен')
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Микробенчмарк сериализации списка билетов (как в GET /api/v1/tickets)
+Сравнивает прежний путь (валидация response_model + stdlib json) с быстрым (orjson без повторной валидации)
+Использование: python benchmarks/serialization.py [count]
+"""
+
+import os
+import sys
+import json
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
+from app.schema import GetTicketsResponse
+from app.serialization import seat_info, seance_info, ticket_row
+
+
+def make_rows(count: int):
+    base_time = datetime(2025, 1, 1, 18, 0)
+    seances = {
+        seance_id: seance_info({
+            'id': seance_id, 'hall_id': 1, 'film_id': seance_id % 7 + 1,
+            'start_time': base_time + timedelta(hours=seance_id),
+            'price_standard': 350.0, 'price_vip': 600.0,
+        })
+        for seance_id in range(1, 201)
+    }
+    seats = {
+        seat_id: seat_info({
+            'id': seat_id, 'hall_id': 1, 'row_number': seat_id // 20 + 1,
+            'seat_number': seat_id % 20 + 1, 'seat_type': 'vip' if seat_id % 5 == 0 else 'standard',
+        })
+        for seat_id in range(1, 301)
+    }
+    rows = [
+        {
+            'id': i, 'seance_id': i % 200 + 1, 'seat_id': i % 300 + 1, 'user_id': 1,
+            'user_name': 'Гость', 'user_phone': '+70000000000', 'user_email': 'guest@example.com',
+            'booked': True, 'booking_code': f'{i:010d}', 'qr_code_data': f'/qr-codes/{i:010d}.png',
+            'created_at': base_time + timedelta(seconds=i), 'price': 350.0, 'archived': False,
+        }
+        for i in range(count)
+    ]
+    return rows, seats, seances
+
+
+def build_payload(rows, seats, seances):
+    return {'tickets': [ticket_row(row, seats.get(row['seat_id']), seances.get(row['seance_id'])) for row in rows]}
+
+
+def before(rows, seats, seances) -> bytes:
+    # Прежний путь FastAPI: валидация по response_model, jsonable_encoder, stdlib json
+    payload = build_payload(rows, seats, seances)
+    validated = GetTicketsResponse.model_validate(payload)
+    content = jsonable_encoder(validated.model_dump())
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(',', ':')).encode('utf-8')
+
+
+def after(rows, seats, seances) -> bytes:
+    return ORJSONResponse(build_payload(rows, seats, seances)).body
+
+
+def measure(func, *args, repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    data = make_rows(count)
+    before_time = measure(before, *data)
+    after_time = measure(after, *data)
+    print(f"Билетов: {count}")
+    print(f"   До (validate + json):  {before_time:.3f}s")
+    print(f"   После (orjson):        {after_time:.3f}s")
+    print(f"   Ускорение: x{before_time / after_time:.1f}")
@@ -0,0 +1,88 @@
+"""
+Имитация «набега» на популярный сеанс: много одинаковых GET /api/v1/seance/{id}/available-seats за несколько миллисекунд
+Пул соединений моделируется семафором (pool_size + max_overflow), запрос к БД — задержкой.
+Сравнивает обычную обработку (своё соединение на каждый запрос) со склейкой через SingleFlight
+Использование: python benchmarks/thundering_herd.py [requests] [seances]
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.singleflight import SingleFlight
+
+POOL_CONNECTIONS = 15  # pool_size=10 + max_overflow=5 из app/models.py
+QUERY_SEC = 0.004  # задержка одного запроса к БД
+QUERIES_PER_READ = 3  # сеанс, занятые места, места зала
+ARRIVAL_WINDOW_SEC = 0.010
+
+
+class Pool:
+    def __init__(self, size: int):
+        self.semaphore = asyncio.Semaphore(size)
+        self.in_use = 0
+        self.peak = 0
+        self.checkouts = 0
+
+    async def read(self, seance_id: int) -> dict:
+        async with self.semaphore:
+            self.in_use += 1
+            self.checkouts += 1
+            self.peak = max(self.peak, self.in_use)
+            try:
+                for _ in range(QUERIES_PER_READ):
+                    await asyncio.sleep(QUERY_SEC)
+            finally:
+                self.in_use -= 1
+        return {'seance_id': seance_id}
+
+
+async def run(requests: int, seances: int, flight: SingleFlight | None) -> dict:
+    pool = Pool(POOL_CONNECTIONS)
+    latencies = []
+
+    async def one(delay: float, seance_id: int):
+        await asyncio.sleep(delay)
+        start = time.perf_counter()
+        if flight is None:
+            await pool.read(seance_id)
+        else:
+            await flight.do(('available_seats', seance_id), lambda: pool.read(seance_id))
+        latencies.append(time.perf_counter() - start)
+
+    rnd = random.Random(42)
+    await asyncio.gather(*(
+        one(rnd.uniform(0, ARRIVAL_WINDOW_SEC), rnd.randint(1, seances)) for _ in range(requests)
+    ))
+    latencies.sort()
+    return {
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        'peak_connections': pool.peak,
+        'checkouts': pool.checkouts,
+    }
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    seances = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    variants = [
+        ('без склейки', None),
+        ('singleflight', SingleFlight()),
+        ('singleflight + ttl 20ms', SingleFlight(ttl_ms=20)),
+    ]
+    print(f'{requests} запросов за {ARRIVAL_WINDOW_SEC * 1000:.0f} мс по {seances} сеансам, пул {POOL_CONNECTIONS} соединений')
+    for name, flight in variants:
+        result = asyncio.run(run(requests, seances, flight))
+        print(
+            f'{name:<26} p50 {result["p50_ms"]:8.1f} мс   p99 {result["p99_ms"]:8.1f} мс   '
+            f'пик соединений {result["peak_connections"]:3d}   выдач из пула {result["checkouts"]:5d}'
+        )
+
+
+if __name__ == '__main__':
+    main()
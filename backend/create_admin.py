@@ -10,7 +10,7 @@ import os
 # Добавляем путь к app
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app.models import Session, User
+from app.models import Session, User, get_engine
 from app.auth import hash_password
 from sqlalchemy import select
 
@@ -21,6 +21,7 @@ async def create_admin():
     print("Создание администратора для Cinema Booking API")
     print("=" * 50)
     
+    get_engine()
     async with Session() as session:
         # Проверяем, существует ли уже администратор
         query = select(User).where(User.email == "admin@example.com")
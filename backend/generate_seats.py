@@ -14,6 +14,9 @@ BASE_URL = os.getenv('API_BASE_URL', 'http://localhost:8000')
 if os.path.exists('/.dockerenv') or os.getenv('DOCKER_CONTAINER'):
     BASE_URL = 'http://backend:80'  # Внутренний адрес backend контейнера
 
+# Максимум операций в одном пакетном запросе
+BATCH_SIZE = 1000
+
 
 def generate_seats_for_hall(hall_id: int, vip_rows: list[int] = None):
     """
@@ -79,6 +82,7 @@ def generate_seats_for_hall(hall_id: int, vip_rows: list[int] = None):
         key = (seat['row_number'], seat['seat_number'])
         existing_seats_set.add(key)
     
+    operations = []
     for row_num in range(1, rows + 1):
         is_vip_row = row_num in vip_rows
         
@@ -102,28 +106,27 @@ def generate_seats_for_hall(hall_id: int, vip_rows: list[int] = None):
             else:
                 seat_type = 'standard'
             
-            # Пытаемся создать место (без вывода деталей)
-            data = {
-                "hall_id": hall_id,
-                "row_number": row_num,
-                "seat_number": seat_num,
-                "seat_type": seat_type
-            }
-            response = client.session.post(
-                f"{BASE_URL}/api/v1/seat",
-                json=data,
-                headers=client.get_headers()
-            )
-            
-            if response.status_code == 200:
-                created += 1
-                if created % 20 == 0:
-                    print(f"   Создано мест: {created}...")
-            else:
-                # Ошибка при создании
-                errors += 1
-                if errors <= 5:
-                    print(f"   [ERROR] Ошибка создания места: ряд {row_num}, место {seat_num} - {response.status_code}")
+            operations.append({
+                "op": "create",
+                "entity": "seat",
+                "data": {
+                    "hall_id": hall_id,
+                    "row_number": row_num,
+                    "seat_number": seat_num,
+                    "seat_type": seat_type
+                }
+            })
+    
+    # Все места создаются пакетами: один запрос и одна транзакция на пакет
+    for chunk_start in range(0, len(operations), BATCH_SIZE):
+        chunk = operations[chunk_start:chunk_start + BATCH_SIZE]
+        response = client.batch(chunk)
+        if response.status_code == 200:
+            created += len(response.json().get('results', []))
+            print(f"   Создано мест: {created}...")
+        else:
+            errors += len(chunk)
+            print(f"   [ERROR] Ошибка создания мест: {response.status_code} - {response.text}")
     
     print(f"\n[OK] Готово!")
     print(f"   Создано новых мест: {created}")
@@ -0,0 +1,48 @@
+"""
+Многопроцессный запуск: gunicorn управляет воркерами uvicorn
+Использование: gunicorn app.server:app -c gunicorn.conf.py
+Число воркеров — WEB_CONCURRENCY (по умолчанию по числу ядер, не больше 16), пул соединений делится между ними (см. DB_POOL_BUDGET)
+"""
+
+import multiprocessing
+import os
+
+# Номер воркера занимает 5 бит кода брони (app/booking_code.py): слотов 32. При плавной
+# перезагрузке (HUP) новые воркеры стартуют, пока старые ещё живы, и слотов нужно вдвое больше
+MAX_WORKERS = 16
+
+workers = int(os.getenv('WEB_CONCURRENCY') or min(multiprocessing.cpu_count(), MAX_WORKERS))
+if not 1 <= workers <= MAX_WORKERS:
+    raise ValueError(f'WEB_CONCURRENCY must be in [1, {MAX_WORKERS}]: worker ids are limited by booking code layout')
+# Конфиг приложения читается при импорте, поэтому число воркеров передаём через окружение до загрузки app
+os.environ['WEB_CONCURRENCY'] = str(workers)
+
+worker_class = 'uvicorn.workers.UvicornWorker'
+bind = f"0.0.0.0:{os.getenv('PORT', '80')}"
+
+# Приложение импортируется один раз в мастере, воркеры получают его через fork.
+# Соединения с БД открываются только в воркерах (пул создаётся лениво).
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+# Плавная остановка: воркер дообслуживает запросы и закрывает SSE-потоки
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+# Периодический перезапуск воркеров ограничивает рост памяти
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '0'))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+
+
+def pre_fork(server, worker):
+    # Номер воркера — наименьший свободный слот среди живых воркеров, поэтому
+    # перезапущенный воркер получает номер своего предшественника
+    busy = {getattr(other, 'worker_id', None) for other in server.WORKERS.values()}
+    worker.worker_id = next(slot for slot in range(len(busy) + 1) if slot not in busy)
+
+
+def post_fork(server, worker):
+    os.environ['WORKER_ID'] = str(worker.worker_id)
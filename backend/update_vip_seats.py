@@ -69,6 +69,7 @@ def update_vip_seats(hall_id: int, vip_rows: list[int] = None):
     print(f"\n[INFO] Обновляем VIP места...")
     updated = 0
     errors = 0
+    operations = []
     
     for seat in all_seats:
         row_num = seat['row_number']
@@ -88,23 +89,21 @@ def update_vip_seats(hall_id: int, vip_rows: list[int] = None):
         
         # Обновляем только если тип изменился
         if current_type != correct_type:
-            data = {
-                "seat_type": correct_type
-            }
-            response = client.session.patch(
-                f"{BASE_URL}/api/v1/seat/{seat_id}",
-                json=data,
-                headers=client.get_headers()
-            )
-            
-            if response.status_code == 200:
-                updated += 1
-                if updated % 10 == 0:
-                    print(f"   Обновлено мест: {updated}...")
-            else:
-                errors += 1
-                if errors <= 5:
-                    print(f"   [ERROR] Ошибка обновления места {seat_id}: {response.status_code}")
+            operations.append({
+                "op": "update",
+                "entity": "seat",
+                "id": seat_id,
+                "data": {"seat_type": correct_type}
+            })
+    
+    # Все изменения одним пакетным запросом в одной транзакции
+    if operations:
+        response = client.batch(operations)
+        if response.status_code == 200:
+            updated = len(response.json().get('results', []))
+        else:
+            errors = len(operations)
+            print(f"   [ERROR] Ошибка обновления мест: {response.status_code} - {response.text}")
     
     print(f"\n[OK] Готово!")
     print(f"   Обновлено мест: {updated}")